@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict
+from uuid import UUID
+from fastapi import HTTPException
+
+"""
+ADMISSION.PY
+------------
+Cola de admisión en memoria por clase para POST /gym-classes/{id}/book.
+
+Cuando abren las clases de la semana, decenas de alumnos reservan las mismas pocas
+clases a la vez. Antes cada request esperaba el lock de la fila de la clase con una
+conexión del pool tomada, y el pool se agotaba para el resto de los endpoints.
+
+Ahora, por worker:
+- Cada clase admite a lo sumo ADMISSION_CLASS_CONCURRENCY reservas en curso contra la
+  DB; el resto espera en orden FIFO SIN conexión tomada.
+- Cuando una reserva devuelve "full", la clase queda marcada como llena durante
+  ADMISSION_FULL_TTL_SECONDS: los que esperan y los que llegan fallan de inmediato
+  con "Clase llena" sin tocar la DB. Una cancelación en este worker reabre la clase;
+  las de otros workers se ven al vencer el TTL.
+- Más de ADMISSION_MAX_WAITING en espera para una clase → 503 (backpressure).
+- Métricas: en espera, en curso, rechazos y tiempo de espera (ver /metrics).
+"""
+
+logger = logging.getLogger("uvicorn")
+
+ADMISSION_CLASS_CONCURRENCY = int(os.getenv("ADMISSION_CLASS_CONCURRENCY", "1"))
+ADMISSION_FULL_TTL_SECONDS = float(os.getenv("ADMISSION_FULL_TTL_SECONDS", "5"))
+ADMISSION_MAX_WAITING = int(os.getenv("ADMISSION_MAX_WAITING", "200"))
+
+
+class ClassFullError(Exception):
+    """La clase está marcada como llena: no hace falta consultar la DB."""
+
+
+def _key(class_id: Any) -> str:
+    """Misma clave para el id recibido en la URL (str) y el de la DB (UUID)."""
+    try:
+        return str(UUID(str(class_id)))
+    except ValueError:
+        return str(class_id)
+
+
+class _ClassQueue:
+    __slots__ = ("waiters", "active", "full_until")
+
+    def __init__(self):
+        self.waiters: Deque[asyncio.Future] = deque()
+        self.active = 0
+        self.full_until = 0.0
+
+    def is_full(self, now: float) -> bool:
+        return now < self.full_until
+
+    def idle(self, now: float) -> bool:
+        return not self.active and not self.waiters and not self.is_full(now)
+
+
+class AdmissionController:
+    def __init__(self, concurrency: int, full_ttl: float, max_waiting: int):
+        self.concurrency = max(concurrency, 1)
+        self.full_ttl = full_ttl
+        self.max_waiting = max_waiting
+        self._queues: Dict[str, _ClassQueue] = {}
+
+        # Acumulados
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_overflow = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    @asynccontextmanager
+    async def admit(self, class_id: Any) -> AsyncIterator[None]:
+        """
+        Espera turno (FIFO) para reservar en la clase. Lanza ClassFullError si la clase
+        está (o queda, mientras se espera) marcada como llena, y 503 si la cola desborda.
+        """
+        key = _key(class_id)
+        now = time.monotonic()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ClassQueue()
+
+        if queue.is_full(now):
+            self.rejected_full += 1
+            raise ClassFullError()
+
+        if queue.active < self.concurrency and not queue.waiters:
+            queue.active += 1
+        else:
+            if len(queue.waiters) >= self.max_waiting:
+                self.rejected_overflow += 1
+                raise HTTPException(
+                    503,
+                    detail="Demasiadas solicitudes para esta clase, reintenta en unos segundos",
+                    headers={"Retry-After": "2"},
+                )
+            waiter = asyncio.get_running_loop().create_future()
+            queue.waiters.append(waiter)
+            try:
+                await waiter
+            except ClassFullError:
+                self.rejected_full += 1
+                raise
+            except asyncio.CancelledError:
+                # Cliente cortó la conexión: si ya se le había cedido el turno, pasarlo
+                if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                    self._release(key)
+                else:
+                    try:
+                        queue.waiters.remove(waiter)
+                    except ValueError:
+                        pass
+                raise
+
+        waited = time.monotonic() - now
+        self.admitted += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    def _release(self, key: str) -> None:
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        queue.active -= 1
+        # El turno pasa al siguiente que sigue esperando (FIFO)
+        while queue.waiters and queue.active < self.concurrency:
+            waiter = queue.waiters.popleft()
+            if not waiter.done():
+                queue.active += 1
+                waiter.set_result(None)
+        if queue.idle(time.monotonic()):
+            del self._queues[key]
+
+    def mark_full(self, class_id: Any) -> None:
+        """La DB respondió "full": rechaza a los que esperan y a los próximos (TTL)."""
+        key = _key(class_id)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _ClassQueue()  # Reserva por lote (sin cola)
+        queue.full_until = time.monotonic() + self.full_ttl
+        while queue.waiters:
+            waiter = queue.waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(ClassFullError())
+
+    def is_marked_full(self, class_id: Any) -> bool:
+        """Consulta sin hacer cola (reserva por lote)."""
+        queue = self._queues.get(_key(class_id))
+        return queue is not None and queue.is_full(time.monotonic())
+
+    def reopen(self, class_id: Any) -> None:
+        """Se liberó un cupo (o cambió max_slots): la clase vuelve a admitir reservas."""
+        key = _key(class_id)
+        queue = self._queues.get(key)
+        if queue is None:
+            return
+        queue.full_until = 0.0
+        if queue.idle(time.monotonic()):
+            del self._queues[key]
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key in [k for k, q in self._queues.items() if q.idle(now)]:
+            del self._queues[key]
+
+    def snapshot(self, top: int = 5) -> Dict[str, Any]:
+        self._prune()
+        now = time.monotonic()
+        busiest = sorted(
+            self._queues.items(), key=lambda item: len(item[1].waiters), reverse=True
+        )[:top]
+        return {
+            "concurrency_per_class": self.concurrency,
+            "classes_tracked": len(self._queues),
+            "classes_marked_full": sum(q.is_full(now) for q in self._queues.values()),
+            "waiting": sum(len(q.waiters) for q in self._queues.values()),
+            "active": sum(q.active for q in self._queues.values()),
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_overflow": self.rejected_overflow,
+            "avg_wait_ms": (
+                round(self._wait_total / self.admitted * 1000, 2) if self.admitted else 0.0
+            ),
+            "max_wait_ms": round(self._wait_max * 1000, 2),
+            "busiest": {k: len(q.waiters) for k, q in busiest if q.waiters},
+        }
+
+
+admission = AdmissionController(
+    ADMISSION_CLASS_CONCURRENCY, ADMISSION_FULL_TTL_SECONDS, ADMISSION_MAX_WAITING
+)
@@ -19,15 +19,15 @@ from fastapi import (
 )
 from app.notifications import send_multicast_notification
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import select, func
+from sqlmodel import select
 from typing import Optional, List
 from datetime import datetime, timedelta, timezone, time
 from uuid import uuid4, UUID
 
 from app.database import get_session
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 from app.models import (
     GymClass,
     Instructor,
@@ -35,14 +35,51 @@ from app.models import (
     BookingStatus,
     User,
     Setting,
-    Credit,
     FixedSchedule,
     DayOfWeek,
     Announcement,
     ProviderType,
 )
 from app.auth.dependencies import get_current_admin
+from app.auth.session_tokens import revocations
+from app.executors import image_executor, executors_snapshot, ExecutorSaturatedError
 from app.api.schemas import CreditUpdate, UserUpdate
+from app.utils import add_credit, calculate_credit_balance, get_credit_balances
+from app.maintenance import (
+    compact_credit_ledger,
+    reconcile_confirmed_counts,
+    purge_idempotency_keys,
+)
+from app.partitioning import (
+    PARTITION_MONTHS_AHEAD,
+    PARTITION_RETENTION_MONTHS,
+    PARTITIONING_ENABLED,
+    convert_gym_classes,
+    get_gym_class,
+    maintain_partitions,
+)
+from app.admission import admission
+from app.caching import grid_cache, mark_grid_dirty
+from app.live import slot_hub
+from app.serialization import FastJSONResponse
+from app.idempotency import (
+    IDEMPOTENCY_TTL_HOURS,
+    get_idempotency_key,
+    run_idempotent,
+    save_response,
+)
+from app.booking import (
+    ADMIN_BOOKING_ERRORS,
+    BOOKING_REACTIVATED,
+    admin_book_class_atomic,
+    auto_book_fixed_schedules,
+    booking_stats,
+    bump_confirmed_counts,
+    cancel_bookings,
+    raise_for_booking_status,
+    refund_fixed_schedules,
+    run_booking_transaction,
+)
 import logging
 
 """
@@ -151,107 +188,57 @@ async def create_gym_class(
 
     recurrence_group = uuid4() if recurrence else None
     weeks = 12 if recurrence else 1
-    created_classes = []
-
-    current_time = start_time
-    for i in range(weeks):
-        gym_class = GymClass(
-            name=name,
-            instructor=instructor,
-            start_time=current_time,
-            max_slots=max_slots,
-            duration_minutes=duration_minutes,
-            recurrence=recurrence if i == 0 else False,
-            recurrence_group=recurrence_group,
-        )
-        session.add(gym_class)
-        created_classes.append(gym_class)
-        current_time += timedelta(weeks=1)
+    now = datetime.utcnow()
 
+    # Serie completa en un único INSERT multi-fila
+    classes = [
+        {
+            "id": uuid4(),
+            "name": name,
+            "instructor": instructor,
+            "start_time": start_time + timedelta(weeks=i),
+            "max_slots": max_slots,
+            "duration_minutes": duration_minutes,
+            "confirmed_count": 0,
+            "recurrence": recurrence if i == 0 else False,
+            "recurrence_group": recurrence_group,
+            "created_at": now,
+            "cancelled_at": None,
+        }
+        for i in range(weeks)
+    ]
+    await session.execute(insert(GymClass).values(classes))
+    for c in classes:
+        mark_grid_dirty(session, c["id"], c["start_time"])
+
+    # Auto-booking de abonos fijos. HOLIDAY LOGIC: en feriados se devuelve el crédito
+    # y NO se reserva. Statements constantes, sin importar semanas ni abonados.
+    holiday_ids = [
+        c["id"] for c in classes if c["start_time"].strftime("%Y-%m-%d") in HOLIDAYS_2026
+    ]
+    bookable_ids = [c["id"] for c in classes if c["id"] not in holiday_ids]
+    auto_booked = await auto_book_fixed_schedules(session, bookable_ids, now)
+    refunds_given = await refund_fixed_schedules(session, holiday_ids, now)
     await session.commit()
-    for c in created_classes:
-        await session.refresh(c)
-
-    # Auto-booking de abonos fijos
-    bookings_created = 0
-    refunds_given = 0
 
-    for gym_class in created_classes:
-        day_num = gym_class.start_time.weekday()
-        target_day_enum = INT_TO_DAY_MAP[day_num]
-        class_time = gym_class.start_time.time()
-
-        # Check if it is holiday
-        date_str = gym_class.start_time.strftime("%Y-%m-%d")
-        is_holiday = date_str in HOLIDAYS_2026
-
-        # Buscar abonos fijos activos para este día y hora
-        logger.info(
-            f"[AUTO-BOOKING] Searching fixed schedules for day={target_day_enum.value}, time={class_time}"
-        )
-        fixed_matches = await session.execute(
-            select(FixedSchedule)
-            .join(User)
-            .where(
-                FixedSchedule.cancelled_at.is_(None),
-                FixedSchedule.day_of_week == target_day_enum,
-                FixedSchedule.start_time == class_time,
-                User.is_deleted == False,
-            )
-        )
-        fixed_list = fixed_matches.scalars().all()
-        logger.info(f"[AUTO-BOOKING] Found {len(fixed_list)} fixed schedules matching")
-
-        for fixed in fixed_list:
-
-            # HOLIDAY LOGIC: Si es feriado, devolvemos crédito y NO reservamos
-            if is_holiday:
-                # Crear crédito de reembolso
-                refund_credit = Credit(amount=1, user_id=fixed.user_id)
-                session.add(refund_credit)
-                refunds_given += 1
-                user = await session.get(User, fixed.user_id)
-                logger.info(
-                    f"[HOLIDAY] Refunded 1 credit to user {user.email if user else fixed.user_id} for {date_str} (Class skipped)"
-                )
-                continue
-
-            # Evitar duplicados si ya existe reserva manual
-            existing = await session.scalar(
-                select(Booking).where(
-                    Booking.gym_class_id == gym_class.id,
-                    Booking.user_id == fixed.user_id,
-                )
-            )
-            if existing:
-                continue
-
-            booking = Booking(
-                user_id=fixed.user_id,
-                gym_class_id=gym_class.id,
-                status=BookingStatus.CONFIRMED,
-            )
-            session.add(booking)
-            bookings_created += 1
-
-    if bookings_created > 0 or refunds_given > 0:
-        await session.commit()
+    logger.info(
+        f"[AUTO-BOOKING] {weeks} clase(s): {sum(auto_booked.values())} reservas de abonos fijos, "
+        f"{refunds_given} créditos reembolsados por feriado"
+    )
 
     # Return the first class as a properly formatted dict
-    first_class = created_classes[0]
+    first_class = classes[0]
     return {
-        "id": str(first_class.id),
-        "name": first_class.name,
-        "instructor": first_class.instructor,
-        "start_time": first_class.start_time,
-        "max_slots": first_class.max_slots,
-        "duration_minutes": first_class.duration_minutes,
-        "confirmed_count": 0,
+        "id": str(first_class["id"]),
+        "name": first_class["name"],
+        "instructor": first_class["instructor"],
+        "start_time": first_class["start_time"],
+        "max_slots": first_class["max_slots"],
+        "duration_minutes": first_class["duration_minutes"],
+        "confirmed_count": auto_booked.get(first_class["id"], 0),
         "my_status": False,
-        "recurrence": first_class.recurrence,
-        "recurrence_group": (
-            str(first_class.recurrence_group) if first_class.recurrence_group else None
-        ),
+        "recurrence": first_class["recurrence"],
+        "recurrence_group": str(recurrence_group) if recurrence_group else None,
     }
 
 
@@ -264,7 +251,7 @@ async def update_gym_class(
     duration_minutes: Optional[int] = Body(None),
     session: AsyncSession = Depends(get_session),
 ):
-    gym_class = await session.get(GymClass, class_id)
+    gym_class = await get_gym_class(session, class_id)
     if not gym_class:
         raise HTTPException(404, detail="Clase no encontrada")
 
@@ -272,6 +259,7 @@ async def update_gym_class(
         gym_class.name = name
     if max_slots is not None:
         gym_class.max_slots = max_slots
+        admission.reopen(gym_class.id)
     if duration_minutes is not None:
         gym_class.duration_minutes = duration_minutes
 
@@ -296,7 +284,7 @@ async def get_gym_class_detail(
     class_id: str = Path(...),
     session: AsyncSession = Depends(get_session),
 ):
-    gym_class = await session.get(GymClass, class_id)
+    gym_class = await get_gym_class(session, class_id)
     if not gym_class:
         raise HTTPException(404, detail="Clase no encontrada")
 
@@ -323,11 +311,7 @@ async def get_gym_class_detail(
             }
         )
 
-    confirmed_count = await session.scalar(
-        select(func.count(Booking.id)).where(
-            Booking.gym_class_id == class_id, Booking.status == BookingStatus.CONFIRMED
-        )
-    )
+    confirmed_count = gym_class.confirmed_count
 
     # Return flattened structure to match Frontend GymClassDetail
     return {
@@ -353,99 +337,92 @@ async def manual_book(
     dni: Optional[str] = Body(None, embed=True),
     full_name: Optional[str] = Body(None, embed=True),
     is_trial: bool = Body(False, embed=True),  # Configurable por Admin
+    admin: User = Depends(get_current_admin),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     session: AsyncSession = Depends(get_session),
 ):
     """
     Reserva manual por Admin.
     Si se provee DNI y no existe usuario, crea un 'Shadow User' automáticamente.
+    Admite header Idempotency-Key (los reintentos reciben la primera respuesta).
     """
-    gym_class = await session.get(GymClass, class_id)
-    if not gym_class:
-        raise HTTPException(404, detail="Clase no encontrada")
-
-    target_user = None
-
-    # Lógica de resolución de usuario
-    if user_id:
-        target_user = await session.get(User, user_id)
-        if not target_user:
-            raise HTTPException(404, detail="Usuario no encontrado")
-
-    elif dni:
-        dni = dni.strip()
-        # Buscar existencia previa por DNI
-        result = await session.execute(select(User).where(User.dni == dni))
-        target_user = result.scalar_one_or_none()
-
-        # Si no existe por DNI, verificar por Email generado (Safety check)
-        if not target_user:
-            generated_email = f"{dni}@local.placeholder"
-            result_email = await session.execute(
-                select(User).where(User.email == generated_email)
-            )
-            target_user = result_email.scalar_one_or_none()
-
-        # Si no existe, crear Shadow User
-        if not target_user:
-            if not full_name:
-                raise HTTPException(400, detail="Nombre requerido para usuario nuevo")
-
-            target_user = User(
-                email=f"{dni}@local.placeholder",  # Email interno único
-                full_name=full_name,
-                dni=dni,
-                provider=ProviderType.LOCAL,
-                social_id=f"local_{dni}",  # Ensure uniqueness for (provider, social_id)
-                is_trial=is_trial,
-                is_admin=False,
-            )
-            session.add(target_user)
-            try:
-                await session.commit()
-                await session.refresh(target_user)
-            except IntegrityError:
-                await session.rollback()
-                raise HTTPException(
-                    400, detail="Error creando usuario. DNI posiblemente duplicado."
+    admin_id = admin.id
+    scope = f"manual_book:{class_id}:{user_id or (dni or '').strip()}"
+
+    async def book():
+        gym_class = await get_gym_class(session, class_id)
+        if not gym_class:
+            raise HTTPException(404, detail="Clase no encontrada")
+
+        target_user = None
+
+        # Lógica de resolución de usuario
+        if user_id:
+            target_user = await session.get(User, user_id)
+            if not target_user:
+                raise HTTPException(404, detail="Usuario no encontrado")
+
+        elif dni:
+            target_dni = dni.strip()
+            # Buscar existencia previa por DNI
+            result = await session.execute(select(User).where(User.dni == target_dni))
+            target_user = result.scalar_one_or_none()
+
+            # Si no existe por DNI, verificar por Email generado (Safety check)
+            if not target_user:
+                generated_email = f"{target_dni}@local.placeholder"
+                result_email = await session.execute(
+                    select(User).where(User.email == generated_email)
                 )
+                target_user = result_email.scalar_one_or_none()
+
+            # Si no existe, crear Shadow User
+            if not target_user:
+                if not full_name:
+                    raise HTTPException(400, detail="Nombre requerido para usuario nuevo")
+
+                target_user = User(
+                    email=f"{target_dni}@local.placeholder",  # Email interno único
+                    full_name=full_name,
+                    dni=target_dni,
+                    provider=ProviderType.LOCAL,
+                    social_id=f"local_{target_dni}",  # Ensure uniqueness for (provider, social_id)
+                    is_trial=is_trial,
+                    is_admin=False,
+                )
+                session.add(target_user)
+                try:
+                    await session.commit()
+                    await session.refresh(target_user)
+                except IntegrityError:
+                    await session.rollback()
+                    raise HTTPException(
+                        400, detail="Error creando usuario. DNI posiblemente duplicado."
+                    )
 
-    if not target_user:
-        raise HTTPException(400, detail="Faltan datos de usuario")
-
-    # Validación de Cupos
-    confirmed_count = await session.scalar(
-        select(func.count(Booking.id)).where(
-            Booking.gym_class_id == class_id, Booking.status == BookingStatus.CONFIRMED
-        )
-    )
-    if confirmed_count >= gym_class.max_slots:
-        raise HTTPException(400, detail="La clase está completa (0 cupos disponibles)")
-
-    # Validación de negocio
-    existing = await session.scalar(
-        select(Booking).where(
-            Booking.user_id == target_user.id, Booking.gym_class_id == class_id
-        )
-    )
-    if existing:
-        if existing.status == BookingStatus.CONFIRMED:
-            raise HTTPException(400, detail="Usuario ya inscripto en esta clase")
-
-        # Si estaba cancelada, REACTIVAR
-        existing.status = BookingStatus.CONFIRMED
-        existing.cancelled_at = None
-        session.add(existing)
-        await session.commit()
-        return {"status": "booked (reactivated)", "user_created": user_id is None}
+        if not target_user:
+            raise HTTPException(400, detail="Faltan datos de usuario")
+
+        # Cupo (UPDATE condicional), doble reserva y alta/reactivación en un único
+        # round trip, con la misma estrategia de concurrencia que book_class
+        target_id = target_user.id
+        await session.commit()  # Sin transacción abierta antes del motor de reservas
+
+        async def work():
+            status = await admin_book_class_atomic(session, target_id, class_id)
+            raise_for_booking_status(status, ADMIN_BOOKING_ERRORS)
+            response = {
+                "status": (
+                    "booked (reactivated)" if status == BOOKING_REACTIVATED else "booked"
+                ),
+                "user_created": user_id is None,
+            }
+            await save_response(session, admin_id, idempotency_key, scope, response)
+            return response
 
-    # Crear reserva
-    booking = Booking(
-        user_id=target_user.id, gym_class_id=class_id, status=BookingStatus.CONFIRMED
-    )
-    session.add(booking)
-    await session.commit()
+        return await run_booking_transaction(session, work)
 
-    return {"status": "booked", "user_created": user_id is None}
+    return await run_idempotent(session, admin_id, idempotency_key, scope, book)
 
 
 @router.delete("/gym-classes/{class_id}")
@@ -458,7 +435,7 @@ async def delete_gym_class(
     Cancela clase o serie futuras (soft-delete).
     Cancela bookings CONFIRMED asociados + reembolso crédito (reservas normales).
     """
-    gym_class = await session.get(GymClass, class_id)
+    gym_class = await get_gym_class(session, class_id)
     if not gym_class:
         raise HTTPException(404, detail="Clase no encontrada")
     if gym_class.cancelled_at:
@@ -480,26 +457,21 @@ async def delete_gym_class(
     cancelled_count = 0
     refunded_count = 0
     for cid in class_ids:
-        to_cancel = await session.get(GymClass, cid)
+        to_cancel = await get_gym_class(session, cid)
         to_cancel.cancelled_at = now
         session.add(to_cancel)
         cancelled_count += 1
 
         # Cancelar bookings CONFIRMED + reembolso (reservas normales)
         bookings = await session.execute(
-            select(Booking).where(
+            select(Booking.id).where(
                 Booking.gym_class_id == cid, Booking.status == BookingStatus.CONFIRMED
             )
         )
-        for b in bookings.scalars().all():
-            b.status = BookingStatus.CANCELLED
-            b.cancelled_at = now
-            session.add(b)
-
+        for b in await cancel_bookings(session, bookings.scalars().all(), now):
             # Reembolso solo si es cancelación individual (NO serie completa)
             if b.user_id and not cancel_series:
-                refund = Credit(amount=1, user_id=b.user_id)
-                session.add(refund)
+                await add_credit(session, b.user_id, 1)
                 refunded_count += 1
 
     await session.commit()
@@ -609,6 +581,7 @@ async def add_fixed_schedule(
         select(GymClass).where(GymClass.start_time > now)
     )
     bookings_created = 0
+    auto_booked = {}  # gym_class_id -> reservas creadas (contador de cupos)
 
     for gym_class in future_classes.scalars().all():
         if gym_class.start_time.weekday() != target_weekday:
@@ -632,7 +605,9 @@ async def add_fixed_schedule(
         )
         session.add(booking)
         bookings_created += 1
+        auto_booked[gym_class.id] = 1
 
+    await bump_confirmed_counts(session, auto_booked)
     await session.commit()
     return {
         "fixed_schedule": fixed,
@@ -669,8 +644,7 @@ async def delete_fixed_schedule(
         )
     )
 
-    cancelled_count = 0
-    refunded_count = 0
+    to_cancel = []
 
     for gym_class in future_classes.scalars().all():
         # Verificar si coincide día y hora
@@ -682,24 +656,23 @@ async def delete_fixed_schedule(
             continue
 
         # Buscar booking del usuario para esta clase
-        booking = await session.scalar(
-            select(Booking).where(
+        booking_id = await session.scalar(
+            select(Booking.id).where(
                 Booking.gym_class_id == gym_class.id,
                 Booking.user_id == fixed.user_id,
                 Booking.status == BookingStatus.CONFIRMED,
             )
         )
+        if booking_id:
+            to_cancel.append(booking_id)
 
-        if booking:
-            booking.status = BookingStatus.CANCELLED
-            booking.cancelled_at = now
-            session.add(booking)
-            cancelled_count += 1
-
-            # Reembolso de crédito
-            refund = Credit(amount=1, user_id=fixed.user_id)
-            session.add(refund)
-            refunded_count += 1
+    cancelled = await cancel_bookings(session, to_cancel, now)
+    cancelled_count = len(cancelled)
+    refunded_count = 0
+    for _ in cancelled:
+        # Reembolso de crédito
+        await add_credit(session, fixed.user_id, 1)
+        refunded_count += 1
 
     await session.commit()
     return {
@@ -800,12 +773,11 @@ async def search_users(
     """
     Lista usuarios con buscador y paginación.
     Retorna usuario + flag is_instructor.
+    Filas leídas como columnas y serializadas con orjson (ver serialization.py).
     """
-    # Usamos outer join con Instructor para saber si es instructor activo
-    # Optimización: eager loading de creditos para evitar N+1
+    # Saldos: un único SELECT sobre la proyección credit_balances para toda la página
     statement = (
-        select(User)
-        .options(selectinload(User.credits))
+        select(*User.__table__.columns)
         .order_by(User.full_name)
         .offset(skip)
         .limit(limit)
@@ -819,18 +791,19 @@ async def search_users(
         statement = statement.where(User.is_deleted == False)
 
     result = await session.execute(statement)
+    users = result.mappings().all()
+    balances = await get_credit_balances(session, [u["id"] for u in users])
 
-    # Mapeamos a lista de dicts
+    # Mapeamos a lista de dicts (mismas claves que User.model_dump())
     output = []
-    now = datetime.now()
+    base_url = str(request.base_url)
 
-    for user in result.scalars().all():
-        data = user.model_dump()  # Convert SQLModel to dict
+    for user in users:
+        data = dict(user)
 
         # Build absolute URL for medical certificate
         cert_url = data.get("medical_certificate_url")
         if cert_url and not cert_url.startswith("http"):
-            base_url = str(request.base_url)
             if base_url.endswith("/"):
                 data["medical_certificate_url"] = f"{base_url}{cert_url}"
             else:
@@ -838,19 +811,12 @@ async def search_users(
 
         # Cleaned up: No more 'is_instructor' logic here
 
-        # Calcular créditos (En memoria, ya cargados por selectinload)
-        credits = user.credits
-        balance = 0
-        for c in credits:
-            if c.amount < 0:
-                balance += c.amount
-            elif c.amount > 0 and (c.expires_at is None or c.expires_at > now):
-                balance += c.amount
-
-        data["credits_available"] = max(balance, 0)
+        data["credits_available"] = balances[user["id"]]
         output.append(data)
 
-    return output
+    # Persiste recálculos lazy de la proyección (vencimientos / filas faltantes)
+    await session.commit()
+    return FastJSONResponse(output)
 
 
 @router.get("/users/{user_id}")
@@ -864,17 +830,13 @@ async def get_user_detail(
     if not user:
         raise HTTPException(404, detail="Usuario no encontrado")
 
-    now = datetime.now()
-    credits = await session.execute(select(Credit).where(Credit.user_id == user_id))
-    available = sum(
-        c.amount
-        for c in credits.scalars().all()
-        if c.amount > 0 and (c.expires_at is None or c.expires_at > now)
-    )
+    available = await calculate_credit_balance(session, user.id)
+    data = user.model_dump()
+    await session.commit()  # Persiste recálculo lazy de la proyección (si hubo)
 
     return {
-        **user.model_dump(),
-        "credits_available": max(available, 0),
+        **data,
+        "credits_available": available,
         "is_instructor_active": False,  # Deprecated
     }
 
@@ -899,7 +861,7 @@ async def toggle_user_disabled(
         now = datetime.now()
         # Buscar reservas futuras y confirmadas
         future_bookings_result = await session.execute(
-            select(Booking)
+            select(Booking.id)
             .join(GymClass)
             .where(
                 Booking.user_id == user.id,
@@ -907,17 +869,19 @@ async def toggle_user_disabled(
                 GymClass.start_time > now,
             )
         )
-        bookings_to_cancel = future_bookings_result.scalars().all()
-        
-        for b in bookings_to_cancel:
-            b.status = BookingStatus.CANCELLED
-            b.cancelled_at = now
-            session.add(b)
-            
+        bookings_to_cancel = await cancel_bookings(
+            session, future_bookings_result.scalars().all(), now
+        )
+
         logger.info(f"User {user_id} blocked. Cancelled {len(bookings_to_cancel)} future bookings.")
 
     session.add(user)
     await session.commit()
+
+    if new_state:
+        # Invalida los tokens de sesión ya emitidos (no pueden renovarse)
+        revocations.revoke(user.id)
+
     return {"status": "updated", "disabled": user.disabled}
 
 
@@ -959,6 +923,96 @@ async def update_user_details(
 # NOTA: Endpoint de créditos movido a línea ~775 como add_user_credits() con soporte para negativos
 
 
+# ----------- MÉTRICAS -----------
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Métricas internas del worker que atiende la request (no agregadas entre workers).
+    - executors: cola, ejecución y tiempos por thread pool dedicado.
+    - admission: cola de reservas por clase (en espera, rechazos, tiempo de espera).
+    - booking: estrategia de concurrencia, transacciones y reintentos por conflicto.
+    - grid_cache: aciertos/fallos e invalidaciones del cache de la grilla.
+    - live: streams SSE de cupos abiertos, lotes enviados y resyncs.
+    """
+    return {
+        "pid": os.getpid(),
+        "executors": executors_snapshot(),
+        "admission": admission.snapshot(),
+        "booking": booking_stats.snapshot(),
+        "grid_cache": grid_cache.snapshot(),
+        "live": slot_hub.snapshot(),
+    }
+
+
+# ----------- MANTENIMIENTO -----------
+@router.post("/maintenance/credits/compact")
+async def compact_credits(
+    older_than_days: int = Query(365, ge=30, description="Antigüedad mínima a compactar"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Compacta el ledger de créditos: movimientos viejos que ya no pueden cambiar el saldo
+    se pliegan en un snapshot por usuario y los originales pasan a credits_archive.
+    Idempotente y seguro de correr con reservas en curso.
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    report = await compact_credit_ledger(session, cutoff)
+    return {"status": "ok", **report}
+
+
+@router.post("/maintenance/slots/reconcile")
+async def reconcile_slots(
+    days_back: int = Query(7, ge=0, description="Incluye clases de los últimos N días"),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Compara gym_classes.confirmed_count con las reservas CONFIRMED reales y repara
+    las diferencias (drift). Idempotente y seguro de correr con reservas en curso.
+    """
+    since = datetime.now() - timedelta(days=days_back)
+    report = await reconcile_confirmed_counts(session, since)
+    return {"status": "ok", **report}
+
+
+@router.post("/maintenance/idempotency/purge")
+async def purge_idempotency(session: AsyncSession = Depends(get_session)):
+    """Elimina las respuestas de Idempotency-Key ya vencidas."""
+    older_than = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    report = await purge_idempotency_keys(session, older_than)
+    return {"status": "ok", **report}
+
+
+@router.post("/maintenance/partitions")
+async def maintain_class_partitions(
+    months_ahead: int = Query(PARTITION_MONTHS_AHEAD, ge=1, le=24),
+    retention_months: int = Query(
+        PARTITION_RETENTION_MONTHS, ge=0, description="0 = no archivar"
+    ),
+):
+    """
+    Crea las particiones mensuales de gym_classes que falten (incluye reubicar clases
+    que cayeron en la partición DEFAULT) y archiva los meses más viejos que
+    `retention_months` junto con sus reservas. Idempotente.
+    """
+    report = await maintain_partitions(months_ahead, retention_months)
+    if not report["partitioned"]:
+        raise HTTPException(409, detail="gym_classes no está particionada")
+    return {"status": "ok", **report}
+
+
+@router.post("/maintenance/partitions/convert")
+async def convert_class_partitions():
+    """
+    Convierte gym_classes en tabla particionada por mes (una sola vez, sin vuelta atrás
+    automática). Bloquea gym_classes y bookings mientras reescribe la tabla: correrla
+    en una ventana sin tráfico. Requiere PARTITIONING_ENABLED=true. Idempotente.
+    """
+    if not PARTITIONING_ENABLED:
+        raise HTTPException(409, detail="Particionado deshabilitado (PARTITIONING_ENABLED)")
+    report = await convert_gym_classes()
+    return {"status": "ok", **report}
+
+
 # ----------- SETTINGS (ADMIN) -----------
 @router.patch("/settings/{key}")
 async def update_setting(
@@ -1000,14 +1054,13 @@ async def admin_cancel_booking(
         raise HTTPException(400, detail="La reserva no está confirmada")
 
     now = datetime.now()
-    booking.status = BookingStatus.CANCELLED
-    booking.cancelled_at = now
-    session.add(booking)
+    # Cancelación condicional: si otra request ya la canceló, no se reembolsa dos veces
+    if not await cancel_bookings(session, [booking.id], now):
+        raise HTTPException(400, detail="La reserva no está confirmada")
 
     # Reembolso forzado por ser acción admin
     if booking.user_id:
-        refund = Credit(amount=1, user_id=booking.user_id)
-        session.add(refund)
+        await add_credit(session, booking.user_id, 1)
         logger.info(f"[ADMIN] Cancelled booking {booking_id} (Refunded)")
 
     await session.commit()
@@ -1172,13 +1225,13 @@ async def add_user_credits(
     if exp_date and exp_date.tzinfo:
         exp_date = exp_date.astimezone(timezone.utc).replace(tzinfo=None)
 
-    credit = Credit(
-        amount=update.amount,
-        user_id=UUID(user_id),
+    await add_credit(
+        session,
+        UUID(user_id),
+        update.amount,
         expires_at=exp_date,
         created_at=datetime.now(),
     )
-    session.add(credit)
     await session.commit()
     return {"status": "ok", "credits_added": update.amount}
 
@@ -1288,8 +1341,8 @@ async def create_announcement(
             raise HTTPException(400, detail="Máximo 5MB")
 
         try:
-            # Comprimir imagen
-            compressed_bytes = compress_image(image_bytes)
+            # Comprimir imagen (CPU: pool dedicado `image`, fuera del event loop)
+            compressed_bytes = await image_executor.run(compress_image, image_bytes)
 
             # Siempre guardamos como .jpg después de compresión
             new_filename = f"{uuid4().hex}.jpg"
@@ -1303,6 +1356,8 @@ async def create_announcement(
             logger.info(
                 f"Image compressed: {len(image_bytes)} -> {len(compressed_bytes)} bytes"
             )
+        except ExecutorSaturatedError:
+            raise
         except Exception as e:
             logger.error(f"Error compressing image: {e}")
             raise HTTPException(400, detail="Error procesando imagen")
@@ -4,17 +4,30 @@ from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 from app.database import get_session
-from app.auth.dependencies import get_current_user
+from app.auth.dependencies import get_current_user, get_token_from_header
+from app.auth.firebase import verify_firebase_token
+from app.auth.session_tokens import (
+    sessions_enabled,
+    issue_session_token,
+    is_session_token,
+    decode_session_token,
+)
 from app.models import User, ProviderType
 from app.models import Credit
-from app.api.schemas import LoginRequest, UserProfileReadV2
+from app.api.schemas import (
+    LoginRequest,
+    LoginResponse,
+    SessionTokenRead,
+    UserProfileReadV2,
+)
 from app.utils import calculate_credit_balance
 import firebase_admin
-from firebase_admin import auth, credentials
+from firebase_admin import credentials
 import os
 import logging
-import asyncio
 from datetime import datetime
+from uuid import UUID
+import jwt
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 logger = logging.getLogger("uvicorn")
@@ -35,12 +48,14 @@ except Exception as e:
         pass
 
 
-@router.post("/login", response_model=UserProfileReadV2)
+@router.post("/login", response_model=LoginResponse)
 async def login_with_firebase(
     request: LoginRequest, session: AsyncSession = Depends(get_session)
 ):
     """
     Recibe ID Token de Firebase, valida, obtiene/crea usuario en DB y devuelve perfil.
+    Incluye un token de sesión propio (HS256, vida corta) para usar como Bearer en
+    el resto de las requests: así Firebase solo se consulta en el login.
     """
     logger.info("Login endpoint invoked.")
     token = request.id_token
@@ -51,9 +66,8 @@ async def login_with_firebase(
 
     # 1. Verificar Token
     try:
-        # CRITICAL: auth.verify_id_token es SINCRONO y bloquea el event loop.
-        # USAR SIEMPRE asyncio.to_thread para evitar timeouts en el servidor.
-        decoded_token = await asyncio.to_thread(auth.verify_id_token, token)
+        # Verificación centralizada (cache + modo local/offline o Admin SDK en thread pool)
+        decoded_token = await verify_firebase_token(token)
         uid = decoded_token.get("uid")
         email = decoded_token.get("email")
         name = decoded_token.get("name")
@@ -134,6 +148,10 @@ async def login_with_firebase(
     # Calculate credits dynamically (Usando función centralizada)
     balance = await calculate_credit_balance(session, user.id)
 
+    session_token, session_expires_at = None, None
+    if sessions_enabled() and not user.disabled:
+        session_token, session_expires_at = issue_session_token(user)
+
     logger.info(f"Login successful for user: {user.email}")
     return {
         "id": str(user.id),
@@ -148,9 +166,39 @@ async def login_with_firebase(
         "feedback_sentiment": user.feedback_sentiment,
         "medical_certificate_url": user.medical_certificate_url,
         "credits_available": balance,
+        "session_token": session_token,
+        "session_expires_at": session_expires_at,
     }
 
 
+@router.post("/refresh", response_model=SessionTokenRead)
+async def refresh_session_token(
+    token: str = Depends(get_token_from_header),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Renueva un token de sesión vigente (Bearer) por uno nuevo con claims actualizados.
+    Rechaza tokens expirados o revocados (bloqueo): en ese caso el cliente
+    debe volver a pasar por /auth/login con Firebase.
+    """
+    if not sessions_enabled() or not is_session_token(token):
+        raise HTTPException(401, detail="Token de sesión requerido")
+
+    try:
+        claims = decode_session_token(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(401, detail="Sesión expirada")
+    except jwt.PyJWTError:
+        raise HTTPException(401, detail="Token inválido")
+
+    user = await session.get(User, UUID(claims["sub"]))
+    if not user or user.disabled:
+        raise HTTPException(401, detail="Usuario bloqueado")
+
+    new_token, expires_at = issue_session_token(user)
+    return {"session_token": new_token, "session_expires_at": expires_at}
+
+
 # -------------------------------------------------------------
 # FCM TOKEN UPDATE
 # -------------------------------------------------------------
@@ -8,13 +8,16 @@ from fastapi import (
     UploadFile,
     File,
     Request,
+    Header,
     BackgroundTasks,
 )
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlmodel import select, func
-from sqlalchemy import or_, text
-from typing import List, Optional
-from datetime import datetime, timedelta
+from sqlmodel import select
+from sqlalchemy import or_, and_, not_, delete, update, func, tuple_
+from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta
+from uuid import UUID
 import shutil
 import time
 from pathlib import Path
@@ -30,19 +33,60 @@ from app.models import (
     Booking,
     BookingStatus,
     Credit,
+    CreditArchive,
+    CreditBalance,
     Setting,
     Announcement,
     FixedSchedule,
     ProviderType,
 )
 from app.auth.dependencies import get_current_user, get_current_user_optional
+from app.auth.session_tokens import revocations
+from app.executors import image_executor, ExecutorSaturatedError
+from app.admission import admission, ClassFullError
+from app.caching import grid_cache
+from app.live import LIVE_SLOTS_ENABLED, slot_hub
+from app.serialization import FastJSONResponse
+from app.partitioning import get_gym_class
+from app.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.versioning import (
+    ANNOUNCEMENTS,
+    etag_matches,
+    get_grid_versions,
+    get_version,
+    not_modified,
+    time_bucket,
+    weak_etag,
+)
+from app.idempotency import get_idempotency_key, run_idempotent, save_response
+from app.booking import (
+    BOOKING_OK,
+    BOOKING_OK_MESSAGE,
+    book_class_atomic,
+    book_classes_atomic,
+    run_booking_transaction,
+    full_class_status,
+    booking_status_message,
+    raise_for_booking_status,
+    bump_confirmed_count,
+    cancel_bookings,
+)
 from app.api.schemas import (
+    BatchBookingRequest,
+    BatchBookingResponse,
+    BatchBookingResult,
     GymClassRead,
     MyBookingRead,
+    MyBookingsHistory,
     UserProfileReadV2,
     UserProfileUpdate,
 )
-from app.utils import get_setting_int, get_setting_bool
+from app.utils import (
+    get_setting_int,
+    add_credit,
+    calculate_credit_balance,
+    refresh_credit_balance,
+)
 import logging
 
 logger = logging.getLogger("uvicorn")
@@ -105,24 +149,11 @@ async def get_profile(
 ):
     """
     Retorna el perfil del usuario autenticado.
-    Calcula el saldo de créditos sumando cargas (+) y restando usos (-),
-    ignorando créditos vencidos.
+    Saldo de créditos desde la proyección credit_balances (ver utils.calculate_credit_balance).
     """
-    now = datetime.now()
-
-    credits_result = await session.execute(
-        select(Credit).where(Credit.user_id == current_user.id)
-    )
-    credits = credits_result.scalars().all()
-
-    balance = 0
-    for c in credits:
-        # Créditos negativos (usos) siempre restan
-        if c.amount < 0:
-            balance += c.amount
-        # Créditos positivos suman solo si no han expirado
-        elif c.amount > 0 and (c.expires_at is None or c.expires_at > now):
-            balance += c.amount
+    balance = await calculate_credit_balance(session, current_user.id)
+    # Persiste el recálculo lazy de la proyección si hubo vencimientos
+    await session.commit()
 
     # Construir URL absoluta si existe certificado
     cert_url = current_user.medical_certificate_url
@@ -147,7 +178,7 @@ async def get_profile(
         has_given_feedback=current_user.has_given_feedback,  # Agregamos feedback
         feedback_sentiment=current_user.feedback_sentiment,
         medical_certificate_url=cert_url,
-        credits_available=max(balance, 0),
+        credits_available=balance,
     )
 
 
@@ -211,6 +242,8 @@ async def update_profile(
                     if duplicate_check:
                         # Conflicto: Ya tiene reserva. Priorizamos conservar la que ya tiene el usuario.
                         # Borramos la reserva "sombra" duplicada para limpiar.
+                        if b.status == BookingStatus.CONFIRMED:
+                            await bump_confirmed_count(session, b.gym_class_id, -1)
                         await session.delete(b)
                     else:
                         # Sin conflicto: Transferir reserva
@@ -224,6 +257,16 @@ async def update_profile(
                 for c in shadow_credits.scalars().all():
                     c.user_id = current_user.id
                     session.add(c)
+                # Historial compactado también pasa al usuario real
+                await session.execute(
+                    update(CreditArchive)
+                    .where(CreditArchive.user_id == existing_user.id)
+                    .values(user_id=current_user.id)
+                )
+                # La proyección del Sombra desaparece (su FK bloquearía el delete)
+                await session.execute(
+                    delete(CreditBalance).where(CreditBalance.user_id == existing_user.id)
+                )
 
                 # 3. Transferir Abonos Fijos (Con check de duplicados)
                 shadow_fixed = await session.execute(
@@ -265,6 +308,9 @@ async def update_profile(
                 await session.delete(existing_user)
                 await session.flush()  # FORCE DELETE to free up the DNI constraint
 
+                # Recalcular saldo del usuario real con los créditos transferidos
+                await refresh_credit_balance(session, current_user.id)
+
                 # Asignar DNI al usuario real
                 current_user.dni = stripped_dni
                 updated = True
@@ -322,7 +368,7 @@ async def delete_my_account(
         # Esto libera los cupos para otros alumnos.
         now = datetime.now()
         future_bookings_result = await session.execute(
-            select(Booking)
+            select(Booking.id)
             .join(GymClass)
             .where(
                 Booking.user_id == current_user.id,
@@ -330,16 +376,14 @@ async def delete_my_account(
                 GymClass.start_time > now,
             )
         )
-        future_bookings = future_bookings_result.scalars().all()
-
-        for booking in future_bookings:
-            booking.status = BookingStatus.CANCELLED
-            booking.cancelled_at = now
-            session.add(booking)
-            # No reembolsamos créditos porque la cuenta se está eliminando.
+        # No reembolsamos créditos porque la cuenta se está eliminando.
+        future_bookings = await cancel_bookings(
+            session, future_bookings_result.scalars().all(), now
+        )
 
         session.add(current_user)
         await session.commit()
+        revocations.revoke(current_user.id)
         
         logger.info(f"User {current_user.id} deleted. {len(future_bookings)} future bookings cancelled.")
         return {"status": "deleted"}
@@ -356,6 +400,20 @@ import pillow_heif  # Importar para soporte HEIC
 pillow_heif.register_heif_opener()
 
 
+def _save_certificate_image(source, file_path: Path) -> None:
+    """Pillow (CPU + IO bloqueante): se ejecuta en el pool dedicado `image`."""
+    img = Image.open(source)
+    img = img.convert(
+        "RGB"
+    )  # Convertir todo a RGB (incluyendo RGBA de PNG/WEBP y HEIC)
+
+    # Redimensionar (Thumbnail preserva aspect ratio)
+    img.thumbnail((1200, 1200))
+
+    # Guardar optimizado
+    img.save(file_path, "JPEG", quality=70, optimize=True)
+
+
 @router.post("/me/medical-certificate")
 async def upload_medical_certificate(
     request: Request,
@@ -407,17 +465,10 @@ async def upload_medical_certificate(
             # Resetear puntero por si acaso
             await file.seek(0)
 
-            img = Image.open(file.file)
-            img = img.convert(
-                "RGB"
-            )  # Convertir todo a RGB (incluyendo RGBA de PNG/WEBP y HEIC)
-
-            # Redimensionar (Thumbnail preserva aspect ratio)
-            img.thumbnail((1200, 1200))
-
-            # Guardar optimizado
-            img.save(file_path, "JPEG", quality=70, optimize=True)
+            await image_executor.run(_save_certificate_image, file.file, file_path)
 
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"Error procesando archivo: {e}")
         raise HTTPException(500, detail="Error interno al procesar el archivo")
@@ -451,88 +502,343 @@ async def upload_medical_certificate(
 # ----------- GYM CLASSES (Grilla de Reservas) -----------
 
 
+# Ventana máxima (días) de una consulta de la grilla y tamaño de página
+GRID_MAX_RANGE_DAYS = 14
+GRID_PAGE_SIZE = 200
+GRID_PAGE_MAX = 500
+
+
+def _parse_day(value: Optional[str], name: str) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(400, detail=f"Formato fecha inválido en {name}: YYYY-MM-DD")
+
+
+def _grid_range(
+    date_str: Optional[str],
+    week_str: Optional[str],
+    from_str: Optional[str],
+    to_str: Optional[str],
+    now: datetime,
+) -> Tuple[date, date, bool]:
+    """(primer día, último día, es_vista_próximas) según date / week / from-to."""
+    target_date = _parse_day(date_str, "date")
+    week_day = _parse_day(week_str, "week")
+    range_from = _parse_day(from_str, "from")
+    range_to = _parse_day(to_str, "to")
+    if sum(x is not None for x in (target_date, week_day, range_from or range_to)) > 1:
+        raise HTTPException(400, detail="Usar solo uno de: date, week o from/to")
+
+    upcoming = False
+    if target_date:
+        first_day = last_day = target_date
+    elif week_day:
+        first_day = week_day - timedelta(days=week_day.weekday())
+        last_day = first_day + timedelta(days=6)
+    elif range_from or range_to:
+        first_day = range_from or now.date()
+        last_day = range_to or first_day + timedelta(days=GRID_MAX_RANGE_DAYS - 1)
+    else:
+        upcoming = True
+        first_day = now.date()
+        last_day = first_day + timedelta(days=GRID_MAX_RANGE_DAYS - 1)
+
+    if last_day < first_day:
+        raise HTTPException(400, detail="El rango es inválido: 'to' es anterior a 'from'")
+    if (last_day - first_day).days + 1 > GRID_MAX_RANGE_DAYS:
+        raise HTTPException(
+            400, detail=f"El rango no puede superar {GRID_MAX_RANGE_DAYS} días"
+        )
+    return first_day, last_day, upcoming
+
+
 @router.get("/gym-classes", response_model=List[GymClassRead])
 async def get_gym_classes(
     date_str: Optional[str] = Query(None, alias="date"),
+    from_str: Optional[str] = Query(None, alias="from"),
+    to_str: Optional[str] = Query(None, alias="to"),
+    week_str: Optional[str] = Query(None, alias="week"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(GRID_PAGE_SIZE, ge=1, le=GRID_PAGE_MAX),
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     session: AsyncSession = Depends(get_session),
 ):
     """
     Retorna la grilla de clases con estado calculado para el usuario.
-    - confirmed_count: Cupos ocupados.
+    - confirmed_count: Cupos ocupados (columna mantenida en gym_classes).
     - my_status: Estado de la reserva del usuario actual (si existe).
+
+    Rango (a lo sumo GRID_MAX_RANGE_DAYS días, ambos extremos inclusive):
+    - date=YYYY-MM-DD: un día (lo que usa la app).
+    - week=YYYY-MM-DD: la semana (lunes a domingo) que contiene esa fecha.
+    - from/to=YYYY-MM-DD: rango explícito.
+    - Sin parámetros: clases próximas (desde ahora) dentro de la ventana máxima.
+    Paginación keyset por (start_time, id): si hay más filas, el header X-Next-Cursor
+    trae el cursor para pedir la página siguiente (ver pagination.py).
+
+    La parte compartida (clases + cupos) sale de grid_cache por día; solo el estado
+    propio se consulta en cada request (ver caching.py).
+    ETag débil por rango + versiones de sus días + usuario: If-None-Match → 304 si no
+    cambió ningún día pedido, aunque haya reservas en otros (ver versioning.py).
+    Las filas ya son dicts confiables: se serializan con orjson (ver serialization.py).
     """
-    # Subqueries para conteo eficiente
-    confirmed_sub = (
-        select(func.count(Booking.id))
-        .where(
-            Booking.gym_class_id == GymClass.id,
-            Booking.status == BookingStatus.CONFIRMED,
+    now = datetime.now()
+    first_day, last_day, upcoming = _grid_range(date_str, week_str, from_str, to_str, now)
+    after = decode_cursor(cursor)
+
+    # Las reservas del usuario también incrementan la versión (la de su día)
+    versions = await get_grid_versions(session, first_day, last_day)
+    etag_parts = [
+        "grid",
+        *_range_etag_parts(first_day, last_day, versions),
+        current_user.id.hex[:12],
+    ]
+    if upcoming:
+        etag_parts.append(time_bucket())  # "Próximas" cambia sola al empezar las clases
+    etag = weak_etag(*etag_parts)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    headers = {"ETag": etag}
+
+    if after:
+        first_day = max(first_day, after[0].date())  # Días ya entregados: no se leen
+    rows = []
+    if first_day <= last_day:
+        rows = await _grid_rows(session, first_day, last_day, versions)
+    if upcoming:
+        # Las de hoy pueden haber quedado cacheadas ya empezadas
+        rows = [r for r in rows if r["start_time"] >= now]
+    if after:
+        rows = [r for r in rows if (r["start_time"], r["id"]) > after]
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            rows[-1]["start_time"], rows[-1]["id"]
         )
-        .scalar_subquery()
+
+    my_class_ids = await _my_confirmed_class_ids(session, current_user.id, rows)
+    return FastJSONResponse(
+        [{**r, "my_status": r["id"] in my_class_ids} for r in rows], headers=headers
     )
-    my_status_sub = (
-        select(Booking.status)
-        .where(
-            Booking.gym_class_id == GymClass.id,
-            Booking.user_id == current_user.id,
-            Booking.status != BookingStatus.CANCELLED,
-        )
-        .scalar_subquery()
+
+
+@router.get("/gym-classes/stream")
+async def stream_gym_class_slots(
+    date_str: Optional[str] = Query(None, alias="date"),
+    from_str: Optional[str] = Query(None, alias="from"),
+    to_str: Optional[str] = Query(None, alias="to"),
+    week_str: Optional[str] = Query(None, alias="week"),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Cupos en vivo (Server-Sent Events) para el día/semana que muestra el cliente.
+    Mismos parámetros de rango que GET /gym-classes. Eventos: ready, slots (lote de
+    clases con cupos actualizados), resync (volver a pedir la grilla). Ver live.py.
+    """
+    if not LIVE_SLOTS_ENABLED:
+        raise HTTPException(404, detail="Cupos en vivo deshabilitados")
+    now = datetime.now()
+    first_day, last_day, _ = _grid_range(date_str, week_str, from_str, to_str, now)
+
+    # El stream dura minutos: no retener la conexión del pool tomada por la auth
+    await session.close()
+
+    subscriber = slot_hub.subscribe(first_day, last_day)
+    return StreamingResponse(
+        slot_hub.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    statement = select(
-        GymClass, confirmed_sub.label("confirmed"), my_status_sub.label("my_status")
+
+@router.get("/gym-classes/week")
+async def get_gym_classes_week(
+    start: Optional[str] = Query(
+        None, description="Primer día (YYYY-MM-DD). Por defecto, el lunes de esta semana"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Siete días de grilla en una sola llamada, en formato columnar compacto:
+    - names / instructors / groups: tablas de valores únicos.
+    - id, offset (minutos desde `start` 00:00), duration, max_slots, confirmed: una
+      columna por campo, una posición por clase (orden por start_time, id).
+    - name / instructor / group: índices en las tablas (group null = sin serie).
+    - mine: posiciones de las clases con reserva CONFIRMED del usuario.
+    Cupos libres = max_slots - confirmed (is_full si <= 0).
+
+    Mismas filas que GET /gym-classes (cache por día, una query para los días que
+    falten) y ETag propio de la semana: If-None-Match → 304.
+    """
+    now = datetime.now()
+    first_day = _parse_day(start, "start") or now.date() - timedelta(days=now.weekday())
+    last_day = first_day + timedelta(days=6)
+
+    versions = await get_grid_versions(session, first_day, last_day)
+    etag = weak_etag(
+        "week", *_range_etag_parts(first_day, last_day, versions), current_user.id.hex[:12]
     )
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    rows = await _grid_rows(session, first_day, last_day, versions)
+    mine = await _my_confirmed_class_ids(session, current_user.id, rows)
+    return FastJSONResponse(_columnar_week(rows, first_day, mine), headers={"ETag": etag})
+
+
+WEEK_COLUMNS = (
+    "id",
+    "offset",
+    "duration",
+    "name",
+    "instructor",
+    "group",
+    "max_slots",
+    "confirmed",
+)
 
-    # Filtro por fecha (Día específico o desde Hoy en adelante)
-    if date_str:
-        try:
-            target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-            start_of_day = datetime.combine(target_date, datetime.min.time())
-            end_of_day = datetime.combine(target_date, datetime.max.time())
-            statement = statement.where(
-                GymClass.start_time >= start_of_day, GymClass.start_time <= end_of_day
-            )
-        except ValueError:
-            raise HTTPException(400, detail="Formato fecha inválido: YYYY-MM-DD")
-    else:
-        statement = statement.where(GymClass.start_time >= datetime.now())
 
-    # Exclude cancelled classes (Soft Delete)
-    statement = statement.where(GymClass.cancelled_at.is_(None))
+def _columnar_week(rows: List[dict], first_day: date, mine: set) -> dict:
+    base = datetime.combine(first_day, datetime.min.time())
+    lookups = {"names": {}, "instructors": {}, "groups": {}}
 
-    statement = statement.order_by(GymClass.start_time)
+    def index(table: str, value: str) -> int:
+        return lookups[table].setdefault(value, len(lookups[table]))
+
+    columns = {name: [] for name in WEEK_COLUMNS}
+    for r in rows:
+        columns["id"].append(r["id"])
+        columns["offset"].append(int((r["start_time"] - base).total_seconds() // 60))
+        columns["duration"].append(r["duration_minutes"])
+        columns["name"].append(index("names", r["name"]))
+        columns["instructor"].append(index("instructors", r["instructor"]))
+        group = r["recurrence_group"]
+        columns["group"].append(index("groups", group) if group else None)
+        columns["max_slots"].append(r["max_slots"])
+        columns["confirmed"].append(r["confirmed_count"])
+
+    return {
+        "start": first_day.isoformat(),
+        **{table: list(values) for table, values in lookups.items()},
+        **columns,
+        "mine": [i for i, r in enumerate(rows) if r["id"] in mine],
+    }
+
+
+async def _my_confirmed_class_ids(session: AsyncSession, user_id, rows: List[dict]) -> set:
+    """Overlay del usuario: una query indexada por user_id sobre sus reservas confirmadas."""
+    if not rows:
+        return set()
+    result = await session.execute(
+        select(Booking.gym_class_id).where(
+            Booking.user_id == user_id,
+            Booking.status == BookingStatus.CONFIRMED,
+            Booking.gym_class_id.in_([r["id"] for r in rows]),
+        )
+    )
+    return {str(cid) for cid in result.scalars().all()}
+
+
+def _range_etag_parts(
+    first_day: date, last_day: date, versions: Tuple[int, Dict[date, int]]
+) -> list:
+    """
+    Parte del ETag de un rango de la grilla: cambia solo si cambió algún día del rango
+    (o la versión global). Las versiones de día salen de una única secuencia y nunca
+    bajan, así que el máximo del rango sube con cualquier cambio en él.
+    """
+    grid_version, day_versions = versions
+    return [
+        f"{first_day.isoformat()}_{last_day.isoformat()}",
+        grid_version,
+        max(day_versions.values(), default=0),
+    ]
+
+
+async def _grid_rows(
+    session: AsyncSession,
+    first_day: date,
+    last_day: date,
+    versions: Tuple[int, Dict[date, int]],
+) -> List[dict]:
+    """
+    Filas compartidas de [first_day, last_day] ordenadas por (start_time, id).
+    Cada día es una entrada de grid_cache, válida mientras no cambien la versión global
+    ni la de su día (`versions`, de get_grid_versions); los días que faltan se leen en
+    una sola query.
+    """
+    grid_version, day_versions = versions
+    days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    version_of = {day: (grid_version, day_versions.get(day, 0)) for day in days}
+    by_day = {day: grid_cache.get(grid_cache.key_for(day), version_of[day]) for day in days}
+    missing = [day for day, rows in by_day.items() if rows is None]
+    if missing:
+        for day in missing:
+            by_day[day] = []
+        for row in await _load_grid_rows(session, missing[0], missing[-1]):
+            day = row["start_time"].date()
+            if day in missing:  # Los días intermedios ya cacheados se conservan
+                by_day[day].append(row)
+        for day in missing:
+            grid_cache.put(grid_cache.key_for(day), by_day[day], version_of[day])
+    return [row for day in days for row in by_day[day]]
+
+
+async def _load_grid_rows(session: AsyncSession, first_day: date, last_day: date) -> List[dict]:
+    """Parte compartida de la grilla (sin datos del usuario): solo lee gym_classes."""
+    statement = (
+        select(
+            GymClass.id,
+            GymClass.name,
+            GymClass.instructor,
+            GymClass.start_time,
+            GymClass.max_slots,
+            GymClass.duration_minutes,
+            GymClass.recurrence_group,
+            GymClass.confirmed_count,
+        )
+        .where(
+            GymClass.start_time >= datetime.combine(first_day, datetime.min.time()),
+            GymClass.start_time
+            < datetime.combine(last_day + timedelta(days=1), datetime.min.time()),
+            # Exclude cancelled classes (Soft Delete)
+            GymClass.cancelled_at.is_(None),
+        )
+        .order_by(GymClass.start_time, GymClass.id)
+    )
     result = await session.execute(statement)
 
-    classes = []
-    for row in result:
-        gym_class = row[0]
-        confirmed = row.confirmed or 0
-        my_status = row.my_status
+    # Columnas sueltas (sin instanciar GymClass): mismas claves y orden que GymClassRead
+    rows = []
+    for gym_class in result.all():
+        confirmed = gym_class.confirmed_count
         available = gym_class.max_slots - confirmed
-
-        classes.append(
-            GymClassRead(
-                id=str(gym_class.id),
-                name=gym_class.name,
-                instructor=gym_class.instructor,
-                start_time=gym_class.start_time,
-                max_slots=gym_class.max_slots,
-                duration_minutes=gym_class.duration_minutes,
-                confirmed_count=confirmed,
-                available_slots=available,
-                is_full=available <= 0,
-                my_status=(my_status == BookingStatus.CONFIRMED),
-                recurrence_group=(
+        rows.append(
+            {
+                "id": str(gym_class.id),
+                "name": gym_class.name,
+                "instructor": gym_class.instructor,
+                "start_time": gym_class.start_time,
+                "max_slots": gym_class.max_slots,
+                "duration_minutes": gym_class.duration_minutes,
+                "recurrence_group": (
                     str(gym_class.recurrence_group)
                     if gym_class.recurrence_group
                     else None
                 ),
-            )
+                "confirmed_count": confirmed,
+                "available_slots": available,
+                "is_full": available <= 0,
+            }
         )
-
-    return classes
+    return rows
 
 
 # ----------- LOGICA DE RESERVA -----------
@@ -542,11 +848,13 @@ async def get_gym_classes(
 async def book_class(
     class_id: str = FastPath(...),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     session: AsyncSession = Depends(get_session),
 ):
     """
     Gestiona la reserva de una clase.
     Incluye validaciones de negocio (pausa, saldo, cupo) y seguridad (bloqueo trial).
+    Admite header Idempotency-Key (los reintentos reciben la primera respuesta).
     """
 
     logger.debug(
@@ -559,80 +867,161 @@ async def book_class(
             403, detail="Tu cuenta es de prueba. Contacta a recepción para reservar."
         )
 
-    # 2. Configuración Global: Pausa de reservas
-    pause = await get_setting_bool(session, "pause_reservations", default=False)
-    if pause:
-        raise HTTPException(
-            403, detail="Reservas pausadas temporalmente por el administrador"
-        )
+    user_id = current_user.id
+
+    async def book():
+        # 2. Libera la conexión antes de hacer cola (get_current_user ya la usó)
+        await session.commit()
 
-    gym_class = await session.get(GymClass, class_id)
-    if not gym_class:
-        raise HTTPException(404, detail="Clase no encontrada")
-    if gym_class.start_time < datetime.now():
-        raise HTTPException(400, detail="Clase pasada")
+        # 3. Cola de admisión FIFO por clase: durante la apertura semanal solo unas pocas
+        # requests por clase llegan a la DB; si la clase ya se llenó, no se hace cola ni
+        # se toma el lock de la clase (solo los chequeos propios del alumno, sin lock).
+        response = {"status": "ok", "message": BOOKING_OK_MESSAGE}
+        try:
+            async with admission.admit(class_id):
+
+                async def work():
+                    # Pausa, clase, doble reserva, saldo y cupo + alta y descuento de
+                    # crédito: todo en un único round trip (ver booking.pac_book_class)
+                    status = await book_class_atomic(session, user_id, class_id)
+                    if status == "full":
+                        admission.mark_full(class_id)
+                    raise_for_booking_status(status)
+                    await save_response(
+                        session, user_id, idempotency_key, f"book:{class_id}", response
+                    )
 
-    # 3. Validación: Evitar doble reserva
-    existing = await session.scalar(
-        select(Booking).where(
-            Booking.user_id == current_user.id, Booking.gym_class_id == class_id
-        )
+                # Commit (o rollback si se rechaza) dentro de la cola: libera el lock
+                # de la clase antes de ceder el turno
+                await run_booking_transaction(session, work)
+        except ClassFullError:
+            status = await full_class_status(session, user_id, class_id)
+            await session.rollback()
+            raise_for_booking_status(status)
+        return response
+
+    return await run_idempotent(
+        session, user_id, idempotency_key, f"book:{class_id}", book
     )
-    if existing and existing.status == BookingStatus.CONFIRMED:
-        raise HTTPException(400, detail="Ya tienes reserva confirmada")
 
-    # 4. Validación: Saldo de créditos
-    now = datetime.now()
-    credits = await session.execute(
-        select(Credit).where(Credit.user_id == current_user.id)
-    )
-    balance = 0
-    for c in credits.scalars().all():
-        if c.amount < 0:
-            balance += c.amount
-        elif c.amount > 0 and (c.expires_at is None or c.expires_at > now):
-            balance += c.amount
-
-    if balance < 1:
-        raise HTTPException(400, detail="No tienes créditos disponibles")
-
-    # 5. Validación: Cupo disponible (CON LOCK PESIMISTA)
-    # SELECT FOR UPDATE previene race condition cuando 2 usuarios reservan el último cupo
-    await session.execute(
-        text("SELECT 1 FROM gym_classes WHERE id = :id FOR UPDATE"),
-        {"id": class_id},
-    )
-    confirmed_count = await session.scalar(
-        select(func.count(Booking.id)).where(
-            Booking.gym_class_id == class_id, Booking.status == BookingStatus.CONFIRMED
+
+# Semana completa con margen; evita lotes que retengan muchos locks de clases
+BATCH_BOOKING_MAX_CLASSES = 14
+
+
+@router.post("/bookings/batch", response_model=BatchBookingResponse)
+async def book_classes_batch(
+    payload: BatchBookingRequest,
+    current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Reserva varias clases en una única transacción (ej: toda la semana).
+    Cupos bloqueados en orden determinístico, saldo chequeado una vez contra el total
+    (si no alcanza se priorizan las clases más próximas) y resultado por clase.
+    Admite header Idempotency-Key (los reintentos reciben la primera respuesta).
+    """
+    if current_user.is_trial:
+        raise HTTPException(
+            403, detail="Tu cuenta es de prueba. Contacta a recepción para reservar."
         )
-    )
-    if confirmed_count >= gym_class.max_slots:
-        raise HTTPException(400, detail="Clase llena")
-
-    # 6. Ejecución: Crear reserva (o reactivar) y descontar crédito
-    if existing:  # Reactivate cancelled
-        existing.status = BookingStatus.CONFIRMED
-        existing.cancelled_at = None
-        session.add(existing)
-    else:
-        booking = Booking(
-            user_id=current_user.id,
-            gym_class_id=class_id,
-            status=BookingStatus.CONFIRMED,
+
+    class_ids = list(dict.fromkeys(c.strip() for c in payload.class_ids if c.strip()))
+    if not class_ids:
+        raise HTTPException(400, detail="No se enviaron clases para reservar")
+    if len(class_ids) > BATCH_BOOKING_MAX_CLASSES:
+        raise HTTPException(
+            400, detail=f"Máximo {BATCH_BOOKING_MAX_CLASSES} clases por solicitud"
         )
-        session.add(booking)
 
-    deduction = Credit(amount=-1, user_id=current_user.id)
-    session.add(deduction)
-    await session.commit()
+    user_id = current_user.id
+    scope = "book_batch:" + ",".join(sorted(class_ids))
+
+    async def work():
+        # Clases ya marcadas como llenas en este worker: no se reservan (sin lock),
+        # solo se chequean los errores propios del alumno
+        statuses = {
+            cid: await full_class_status(session, user_id, cid)
+            for cid in class_ids
+            if admission.is_marked_full(cid)
+        }
+        pending = [cid for cid in class_ids if cid not in statuses]
+        statuses.update(await book_classes_atomic(session, user_id, pending))
+
+        results = []
+        for cid in class_ids:
+            status = statuses[cid]
+            if status == "full":
+                admission.mark_full(cid)
+            results.append(
+                BatchBookingResult(
+                    class_id=cid,
+                    ok=status == BOOKING_OK,
+                    status=status,
+                    message=booking_status_message(status),
+                )
+            )
+        response = BatchBookingResponse(
+            booked=sum(r.ok for r in results), results=results
+        )
+        await save_response(session, user_id, idempotency_key, scope, response)
+        return response
+
+    async def book():
+        await session.commit()  # Sin transacción abierta antes del motor de reservas
+        return await run_booking_transaction(session, work)
 
-    return {"status": "ok", "message": "Reserva confirmada, crédito deducido"}
+    return await run_idempotent(session, user_id, idempotency_key, scope, book)
 
 
 # ----------- RESERVAS DEL USUARIO (Mis Clases) -----------
 
 
+# Columnas de una reserva + su clase (mismas para el listado y el historial paginado)
+MY_BOOKING_COLUMNS = (
+    Booking.id.label("booking_id"),
+    Booking.status,
+    Booking.cancelled_at,
+    GymClass.id,
+    GymClass.name,
+    GymClass.instructor,
+    GymClass.start_time,
+    GymClass.max_slots,
+    GymClass.duration_minutes,
+    GymClass.confirmed_count,
+)
+
+MY_BOOKINGS_PAGE_SIZE = 20
+MY_BOOKINGS_PAGE_MAX = 100
+# /my-bookings (versiones viejas de la app): solo las más recientes, sin paginar
+MY_BOOKINGS_LEGACY_LIMIT = 200
+
+
+def _my_booking_row(row, now: datetime) -> dict:
+    """Mismas claves y orden que MyBookingRead."""
+    available = row.max_slots - row.confirmed_count
+    confirmed = row.status == BookingStatus.CONFIRMED
+    return {
+        "id": str(row.id),
+        "name": row.name,
+        "instructor": row.instructor,
+        "start_time": row.start_time,
+        "max_slots": row.max_slots,
+        "duration_minutes": row.duration_minutes,
+        "recurrence_group": None,
+        "confirmed_count": row.confirmed_count,
+        "available_slots": available,
+        "is_full": available <= 0,
+        "my_status": confirmed,
+        "booking_id": str(row.booking_id),
+        "status": row.status,
+        "cancelled_at": row.cancelled_at,
+        # Cancelable solo si es futura y está confirmada
+        "can_cancel": confirmed and row.start_time > now,
+    }
+
+
 @router.get("/my-bookings", response_model=List[MyBookingRead])
 async def get_my_bookings(
     current_user: User = Depends(get_current_user),
@@ -641,59 +1030,97 @@ async def get_my_bookings(
     """
     Lista el historial de reservas del usuario.
     Orden cronológico inverso (futuras primero).
+    Filas armadas desde columnas y serializadas con orjson (ver serialization.py).
+    Se mantiene para versiones viejas de la app, acotado a las
+    MY_BOOKINGS_LEGACY_LIMIT reservas más recientes; la app usa /my-bookings/history.
     """
     now = datetime.now()
 
-    # Subquery para calcular cupos ocupados de cada clase listada
-    confirmed_sub = (
-        select(Booking.gym_class_id, func.count(Booking.id).label("confirmed_count"))
-        .where(Booking.status == BookingStatus.CONFIRMED)
-        .group_by(Booking.gym_class_id)
-        .subquery()
-    )
-
     statement = (
-        select(Booking, GymClass, confirmed_sub.c.confirmed_count)
+        select(*MY_BOOKING_COLUMNS)
         .join(GymClass, Booking.gym_class_id == GymClass.id)
-        .outerjoin(confirmed_sub, confirmed_sub.c.gym_class_id == GymClass.id)
         .where(Booking.user_id == current_user.id)
-        .order_by(GymClass.start_time.desc())
+        .order_by(GymClass.start_time.desc(), Booking.id.desc())
+        .limit(MY_BOOKINGS_LEGACY_LIMIT)
     )
 
     result = await session.execute(statement)
+    return FastJSONResponse([_my_booking_row(row, now) for row in result.all()])
 
-    bookings = []
-    for row in result:
-        booking = row[0]
-        gym_class = row[1]
-        confirmed_count = row[2] or 0
-        available = gym_class.max_slots - confirmed_count
 
-        # Determina si es cancelable (futura y confirmada)
-        can_cancel = (
-            booking.status == BookingStatus.CONFIRMED and gym_class.start_time > now
-        )
+@router.get("/my-bookings/history", response_model=MyBookingsHistory)
+async def get_my_bookings_history(
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(MY_BOOKINGS_PAGE_SIZE, ge=1, le=MY_BOOKINGS_PAGE_MAX),
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    "Mis Clases" por secciones (las mismas dos pestañas de la app):
+    - upcoming: reservas confirmadas de clases que aún no empezaron (orden cronológico).
+    - past: el resto (clases ya empezadas y reservas canceladas), de la más reciente
+      hacia atrás, paginadas por keyset (start_time, booking id): next_cursor pide la
+      página siguiente.
+    - summary: upcoming (mismas filas que la lista upcoming), attended (confirmadas ya
+      dictadas) y cancelled, contadas en SQL sobre las reservas del usuario.
+    summary y upcoming van solo en la primera página (sin cursor).
+    """
+    now = datetime.now()
+    after = decode_cursor(cursor)
+    base = (
+        select(*MY_BOOKING_COLUMNS)
+        .join(GymClass, Booking.gym_class_id == GymClass.id)
+        .where(Booking.user_id == current_user.id)
+    )
 
-        bookings.append(
-            MyBookingRead(
-                id=str(gym_class.id),
-                name=gym_class.name,
-                instructor=gym_class.instructor,
-                start_time=gym_class.start_time,
-                max_slots=gym_class.max_slots,
-                duration_minutes=gym_class.duration_minutes,
-                confirmed_count=confirmed_count,
-                available_slots=available,
-                is_full=available <= 0,
-                my_status=(booking.status == BookingStatus.CONFIRMED),
-                booking_id=str(booking.id),
-                status=booking.status,
-                cancelled_at=booking.cancelled_at,
-                can_cancel=can_cancel,
+    is_confirmed = Booking.status == BookingStatus.CONFIRMED
+    is_upcoming = and_(is_confirmed, GymClass.start_time >= now)
+
+    summary = None
+    upcoming = None
+    if after is None:
+        counts = (
+            await session.execute(
+                select(
+                    func.count().filter(is_upcoming),
+                    func.count().filter(is_confirmed, GymClass.start_time < now),
+                    func.count().filter(Booking.status == BookingStatus.CANCELLED),
+                )
+                .select_from(Booking)
+                .join(GymClass, Booking.gym_class_id == GymClass.id)
+                .where(Booking.user_id == current_user.id)
             )
+        ).one()
+        summary = {"upcoming": counts[0], "attended": counts[1], "cancelled": counts[2]}
+
+        result = await session.execute(
+            base.where(is_upcoming).order_by(GymClass.start_time, Booking.id)
         )
+        upcoming = [_my_booking_row(row, now) for row in result.all()]
 
-    return bookings
+    past_query = base.where(not_(is_upcoming))
+    if after:
+        last_start, last_booking_id = after[0], UUID(after[1])
+        past_query = past_query.where(
+            tuple_(GymClass.start_time, Booking.id) < tuple_(last_start, last_booking_id)
+        )
+    result = await session.execute(
+        past_query.order_by(GymClass.start_time.desc(), Booking.id.desc()).limit(limit + 1)
+    )
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].start_time, rows[-1].booking_id)
+
+    return FastJSONResponse(
+        {
+            "summary": summary,
+            "upcoming": upcoming,
+            "past": [_my_booking_row(row, now) for row in rows],
+            "next_cursor": next_cursor,
+        }
+    )
 
 
 # ----------- LOGICA CANCELAR RESERVA -----------
@@ -703,6 +1130,7 @@ async def get_my_bookings(
 async def cancel_booking(
     booking_id: str = FastPath(...),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     session: AsyncSession = Depends(get_session),
 ):
     """
@@ -710,6 +1138,7 @@ async def cancel_booking(
     Política de reembolso:
     - Temprana (antes del tiempo límite): Se devuelve el crédito.
     - Tardía (dentro del tiempo límite): Se pierde el crédito.
+    Admite header Idempotency-Key (los reintentos reciben la primera respuesta).
     """
     # 1. Seguridad: Usuarios de prueba no pueden cancelar
     if current_user.is_trial:
@@ -717,47 +1146,55 @@ async def cancel_booking(
             403, detail="Tu cuenta es de prueba. No puedes cancelar turnos."
         )
 
-    booking = await session.get(Booking, booking_id)
-    if not booking or booking.user_id != current_user.id:
-        raise HTTPException(404, detail="Reserva no encontrada")
+    user_id = current_user.id
+    scope = f"cancel:{booking_id}"
 
-    if booking.status != BookingStatus.CONFIRMED:
-        raise HTTPException(400, detail="Solo se pueden cancelar reservas confirmadas")
+    async def cancel():
+        booking = await session.get(Booking, booking_id)
+        if not booking or booking.user_id != user_id:
+            raise HTTPException(404, detail="Reserva no encontrada")
 
-    gym_class = await session.get(GymClass, booking.gym_class_id)
-    now = datetime.now()
-    if gym_class.start_time <= now:
-        raise HTTPException(400, detail="No se puede cancelar clase pasada o en curso")
+        if booking.status != BookingStatus.CONFIRMED:
+            raise HTTPException(400, detail="Solo se pueden cancelar reservas confirmadas")
 
-    # 2. Cálculo de penalización
-    cancel_minutes = await get_setting_int(session, "cancel_minutes_before", default=10)
-    limit_time = gym_class.start_time - timedelta(minutes=cancel_minutes)
+        gym_class = await get_gym_class(session, booking.gym_class_id)
+        now = datetime.now()
+        if gym_class.start_time <= now:
+            raise HTTPException(400, detail="No se puede cancelar clase pasada o en curso")
 
-    logger.debug(
-        f"cancel_booking: id={booking_id}, class_start={gym_class.start_time}, now={now}, limit={limit_time}, cancel_min={cancel_minutes}"
-    )
+        # 2. Cálculo de penalización
+        cancel_minutes = await get_setting_int(session, "cancel_minutes_before", default=10)
+        limit_time = gym_class.start_time - timedelta(minutes=cancel_minutes)
 
-    refund_given = False
-    if now < limit_time:
-        refund = Credit(amount=1, user_id=current_user.id)
-        session.add(refund)
-        refund_given = True
-        message = "Reserva cancelada. Crédito reembolsado."
-        logger.info(f"cancel_booking: REFUND GIVEN for {booking_id}")
-    else:
-        message = "Cancelación tardía. No se ha reembolsado el crédito."
-        logger.info(f"cancel_booking: NO REFUND for {booking_id} (late)")
+        logger.debug(
+            f"cancel_booking: id={booking_id}, class_start={gym_class.start_time}, now={now}, limit={limit_time}, cancel_min={cancel_minutes}"
+        )
 
-    booking.status = BookingStatus.CANCELLED
-    booking.cancelled_at = now
-    session.add(booking)
-    await session.commit()
+        # Cancelación condicional: si otra request ya la canceló, no se reembolsa dos veces
+        if not await cancel_bookings(session, [booking.id], now):
+            raise HTTPException(400, detail="Solo se pueden cancelar reservas confirmadas")
 
-    return {
-        "status": "ok",
-        "message": message,
-        "refunded": refund_given,
-    }
+        refund_given = False
+        if now < limit_time:
+            await add_credit(session, user_id, 1)
+            refund_given = True
+            message = "Reserva cancelada. Crédito reembolsado."
+            logger.info(f"cancel_booking: REFUND GIVEN for {booking_id}")
+        else:
+            message = "Cancelación tardía. No se ha reembolsado el crédito."
+            logger.info(f"cancel_booking: NO REFUND for {booking_id} (late)")
+
+        response = {
+            "status": "ok",
+            "message": message,
+            "refunded": refund_given,
+        }
+        await save_response(session, user_id, idempotency_key, scope, response)
+        await session.commit()
+
+        return response
+
+    return await run_idempotent(session, user_id, idempotency_key, scope, cancel)
 
 
 # ----------- ANNOUNCEMENTS -----------
@@ -767,6 +1204,7 @@ async def cancel_booking(
 async def get_announcements(
     request: Request,
     include_expired: bool = Query(False),
+    if_none_match: Optional[str] = Header(None),
     session: AsyncSession = Depends(get_session),
     current_user: Optional[User] = Depends(get_current_user_optional),
 ):
@@ -775,14 +1213,22 @@ async def get_announcements(
     - Para usuarios normales: solo vigentes (sin expirar)
     - Para admins con include_expired=true: todas (incluye expiradas)
     Ordenadas por fecha de creación descendente.
+    ETag débil por versión de novedades: If-None-Match → 304.
+    Filas leídas como columnas y serializadas con orjson (ver serialization.py).
     """
-    query = select(Announcement)
-
     # Solo mostrar TODAS si se pide include_expired=true Y el usuario es admin
     # Caso contrario, filtrar por vigentes
     is_admin = current_user is not None and current_user.is_admin
     show_all = include_expired and is_admin
 
+    etag_parts = ["news", await get_version(session, ANNOUNCEMENTS)]
+    etag_parts.append("all" if show_all else time_bucket())  # Las vigentes vencen solas
+    etag = weak_etag(*etag_parts)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    query = select(*Announcement.__table__.columns)
+
     if not show_all:
         now = datetime.now()
         query = query.where(
@@ -791,14 +1237,14 @@ async def get_announcements(
 
     query = query.order_by(Announcement.created_at.desc())
     result = await session.execute(query)
-    announcements = result.scalars().all()
+    announcements = [dict(row) for row in result.mappings().all()]
 
     # Construir URL absoluta para imágenes
     base_url = str(request.base_url).rstrip("/")
     for a in announcements:
-        if a.image_url and not a.image_url.startswith("http"):
+        if a["image_url"] and not a["image_url"].startswith("http"):
             # Si empieza con /, quitamos para evitar doble //
-            rel_path = a.image_url.lstrip("/")
-            a.image_url = f"{base_url}/{rel_path}"
+            rel_path = a["image_url"].lstrip("/")
+            a["image_url"] = f"{base_url}/{rel_path}"
 
-    return announcements
+    return FastJSONResponse(announcements, headers={"ETag": etag})
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from sqlmodel import select
-from typing import Dict
+from typing import Dict, Optional
 from app.database import get_session
 from app.models import Setting
+from app.versioning import SETTINGS, etag_matches, get_version, not_modified, weak_etag
 
 router = APIRouter()
 
@@ -28,11 +29,21 @@ async def health_check(session: AsyncSession = Depends(get_session)):
 
 
 @router.get("/settings", response_model=Dict[str, str])
-async def get_settings(session: AsyncSession = Depends(get_session)):
+async def get_settings(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    session: AsyncSession = Depends(get_session),
+):
     """
     Recupera configuraciones globales accesibles sin autenticación.
     Disponible para datos esenciales para la inicialización del cliente
+    ETag débil por versión de settings: If-None-Match → 304.
     """
+    etag = weak_etag("settings", await get_version(session, SETTINGS))
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+
     result = await session.execute(select(Setting))
     settings = result.scalars().all()
 
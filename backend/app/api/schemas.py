@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel
 from app.models import BookingStatus
 
@@ -49,10 +49,47 @@ class MyBookingRead(GymClassRead):
     can_cancel: bool
 
 
+class MyBookingsSummary(BaseModel):
+    upcoming: int
+    attended: int
+    cancelled: int
+
+
+class MyBookingsHistory(BaseModel):
+    """
+    'Mis Clases' por secciones (GET /my-bookings/history).
+    summary y upcoming solo vienen en la primera página; past se pagina con next_cursor.
+    """
+
+    summary: Optional[MyBookingsSummary] = None
+    upcoming: Optional[List[MyBookingRead]] = None
+    past: List[MyBookingRead]
+    next_cursor: Optional[str] = None
+
+
 class BookingCreate(BaseModel):
     gym_class_id: str
 
 
+class BatchBookingRequest(BaseModel):
+    """Reserva de varias clases en una sola transacción (POST /bookings/batch)."""
+
+    class_ids: List[str]
+
+
+class BatchBookingResult(BaseModel):
+    class_id: str
+    ok: bool
+    # ok | paused | not_found | past | already_booked | no_credits | full
+    status: str
+    message: str
+
+
+class BatchBookingResponse(BaseModel):
+    booked: int
+    results: List[BatchBookingResult]
+
+
 class LoginRequest(BaseModel):
     id_token: str
 
@@ -80,6 +117,21 @@ class UserProfileReadV2(BaseModel):
         from_attributes = True
 
 
+class LoginResponse(UserProfileReadV2):
+    """
+    Respuesta de /auth/login: perfil + token de sesión propio.
+    session_token es None si el servidor no tiene SESSION_SECRET configurado.
+    """
+
+    session_token: Optional[str] = None
+    session_expires_at: Optional[datetime] = None
+
+
+class SessionTokenRead(BaseModel):
+    session_token: str
+    session_expires_at: datetime
+
+
 class UserProfileUpdate(BaseModel):
     """
     DTO para actualizar el perfil del usuario.
@@ -2,32 +2,84 @@
 from fastapi import Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from app.database import get_session
+from app.database import async_session_factory, get_session
 from app.auth.firebase import verify_firebase_token
+from app.auth.singleflight import SingleFlight
+from app.auth.session_tokens import is_session_token, decode_session_token
 from app.models import User, ProviderType
 from typing import Optional
+from uuid import UUID
+import jwt
 
 from fastapi import Request
 
+# Lookups concurrentes del mismo email comparten un único SELECT
+user_lookup_flight = SingleFlight()
+
 
 def get_token_from_header(request: Request) -> str:
     authorization: str = request.headers.get("Authorization", "")
     return authorization.replace("Bearer ", "")
 
 
+async def _find_user_by_email(session: AsyncSession, email: str) -> Optional[User]:
+    """
+    Busca el usuario por email coalesciendo requests concurrentes (single-flight).
+    La carga compartida usa una sesión propia y corta: sigue viva aunque se cancele
+    la request que la inició (su sesión se cierra). Cada caller adjunta la fila
+    (ya desvinculada) a su propia sesión con merge(load=False), sin volver a consultar.
+    """
+
+    async def load() -> Optional[User]:
+        async with async_session_factory() as own_session:
+            result = await own_session.execute(select(User).where(User.email == email))
+            return result.scalar_one_or_none()
+
+    user = await user_lookup_flight.do(email, load)
+    if user is not None:
+        user = await session.merge(user, load=False)
+    return user
+
+
+async def get_user_from_session_token(session: AsyncSession, token: str) -> User:
+    """
+    Resuelve el usuario a partir de un token de sesión propio (ver session_tokens.py).
+    Sin Firebase ni búsqueda por email: firma HMAC local + lectura por PK.
+    """
+    try:
+        claims = decode_session_token(token)
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(401, detail="Sesión expirada")
+    except jwt.PyJWTError:
+        raise HTTPException(401, detail="Token inválido")
+
+    if claims.get("dis"):
+        raise HTTPException(401, detail="Usuario bloqueado")
+
+    user = await session.get(User, UUID(claims["sub"]))
+    if not user:
+        raise HTTPException(401, detail="Usuario no encontrado")
+    if user.disabled:
+        raise HTTPException(401, detail="Usuario bloqueado")
+    return user
+
+
 async def get_current_user(
     token: str = Depends(get_token_from_header),
     session: AsyncSession = Depends(get_session),
 ) -> User:
     """
     Dependency principal:
-    - Lee Bearer token manual (Firebase directo).
-    - Valida con Firebase.
-    - Busca o crea usuario (onboarding obliga full_name/dni).
+    - Lee Bearer token manual (token de sesión propio o ID-Token de Firebase).
+    - Token de sesión: validación local HMAC, sin Firebase.
+    - ID-Token: valida con Firebase, busca o crea usuario (onboarding obliga full_name/dni).
     """
     if not token:
         raise HTTPException(status_code=401, detail="Falta el token de autorización")
 
+    if is_session_token(token):
+        return await get_user_from_session_token(session, token)
+
     decoded = await verify_firebase_token(token)
     email: str = decoded.get("email")
     uid: str = decoded.get("uid")
@@ -44,8 +96,7 @@ async def get_current_user(
     if not provider:
         raise HTTPException(401, detail="Provider no soportado")
 
-    result = await session.execute(select(User).where(User.email == email))
-    user = result.scalar_one_or_none()
+    user = await _find_user_by_email(session, email)
 
     if not user:
         user = User(
@@ -82,14 +133,16 @@ async def get_current_user_optional(
         if not token:
             return None
 
+        if is_session_token(token):
+            return await get_user_from_session_token(session, token)
+
         decoded = await verify_firebase_token(token)
         email: str = decoded.get("email")
 
         if not email:
             return None
 
-        result = await session.execute(select(User).where(User.email == email))
-        user = result.scalar_one_or_none()
+        user = await _find_user_by_email(session, email)
 
         if user and not user.disabled:
             return user
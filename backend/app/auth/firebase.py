@@ -1,13 +1,248 @@
 import firebase_admin
 from firebase_admin import credentials, auth
 from fastapi import HTTPException, status
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
 import os
+import re
+import time
 import asyncio
+import httpx
+import jwt
+from app.auth.singleflight import SingleFlight
+from app.executors import auth_executor, ExecutorSaturatedError
+
+logger = logging.getLogger("uvicorn")
 
 if not firebase_admin._apps:
     cred = credentials.Certificate(os.getenv("FIREBASE_SA_PATH"))
     firebase_admin.initialize_app(cred)
 
+# ----------- CACHE DE TOKENS VERIFICADOS -----------
+# Tamaño máximo (entradas) del cache LRU. 0 deshabilita el cache.
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "1024"))
+# Cada cuántos segundos se vuelve a consultar a Firebase si el token fue revocado.
+TOKEN_REVOCATION_CHECK_SECONDS = int(os.getenv("TOKEN_REVOCATION_CHECK_SECONDS", "300"))
+
+
+class VerifiedTokenCache:
+    """
+    Cache LRU en memoria de ID-Tokens ya verificados.
+    - Clave: SHA-256 del token (el token en claro nunca se guarda).
+    - Vigencia: hasta el `exp` del propio token.
+    - Revocación: pasado `revocation_interval` la entrada deja de servirse y el
+      token se vuelve a verificar contra Firebase (check_revoked=True).
+    """
+
+    def __init__(self, max_size: int, revocation_interval: int):
+        self.max_size = max_size
+        self.revocation_interval = revocation_interval
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        decoded, checked_at = entry
+        now = time.time()
+        if decoded.get("exp", 0) <= now:
+            # Token expirado: se descarta, Firebase devolverá el error adecuado.
+            del self._entries[key]
+            return None
+        if now - checked_at >= self.revocation_interval:
+            # Toca re-chequear revocación (la entrada se reemplaza en put()).
+            return None
+
+        self._entries.move_to_end(key)
+        return decoded
+
+    def put(self, key: str, decoded: dict) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (decoded, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)  # Evicción LRU
+
+    def discard(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+token_cache = VerifiedTokenCache(TOKEN_CACHE_MAX_SIZE, TOKEN_REVOCATION_CHECK_SECONDS)
+# Verificaciones concurrentes del mismo token comparten una única llamada a Firebase
+verify_flight = SingleFlight()
+
+# ----------- VERIFICACIÓN LOCAL (OFFLINE) -----------
+# AUTH_VERIFY_MODE=firebase (default): Admin SDK en thread pool (incluye check de revocación).
+# AUTH_VERIFY_MODE=local: firma RS256 verificada en proceso con PyJWT y claves públicas
+#   cacheadas en memoria. Sin thread pool ni HTTP saliente en el camino caliente.
+#   La revocación no se consulta a Firebase: el bloqueo se aplica vía User.disabled
+#   y la vida útil del token (1h).
+AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "firebase").lower()
+FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID") or firebase_admin.get_app().project_id
+FIREBASE_JWKS_URL = (
+    "https://www.googleapis.com/service_accounts/v1/jwk/"
+    "securetoken@system.gserviceaccount.com"
+)
+# Archivo JWKS local (tests/dev). Si está definido reemplaza al endpoint de Google.
+FIREBASE_JWKS_FILE = os.getenv("FIREBASE_JWKS_FILE")
+JWKS_DEFAULT_MAX_AGE = 3600  # Si el endpoint no informa Cache-Control
+JWKS_MIN_REFRESH_SECONDS = 60
+JWKS_RETRY_SECONDS = 30  # Reintento tras un fallo de descarga
+# Un kid desconocido (Google rotó las claves antes del próximo refresco) dispara una
+# descarga inmediata, a lo sumo una cada este intervalo: un kid inventado no genera
+# una descarga por request.
+JWKS_UNKNOWN_KID_REFRESH_SECONDS = 30
+
+# Devuelve (documento JWKS, max-age en segundos)
+KeyFetcher = Callable[[], Awaitable[Tuple[dict, int]]]
+
+
+def _parse_max_age(cache_control: Optional[str]) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE
+
+
+async def fetch_google_jwks() -> Tuple[dict, int]:
+    """Descarga las claves públicas de Firebase Auth respetando Cache-Control."""
+    async with httpx.AsyncClient(timeout=10) as client:
+        response = await client.get(FIREBASE_JWKS_URL)
+        response.raise_for_status()
+    return response.json(), _parse_max_age(response.headers.get("cache-control"))
+
+
+def file_key_fetcher(path: str) -> KeyFetcher:
+    """KeyFetcher que lee un JWKS desde disco (útil para tests con claves propias)."""
+
+    async def fetch() -> Tuple[dict, int]:
+        with open(path) as f:
+            return json.load(f), JWKS_DEFAULT_MAX_AGE
+
+    return fetch
+
+
+class JWKSKeyStore:
+    """
+    Claves públicas (por `kid`) en memoria, refrescadas por una tarea en background.
+    El intervalo de refresco es el max-age que informa el endpoint de claves.
+    Un kid desconocido fuerza una descarga (con límite de frecuencia, ver resolve()).
+    """
+
+    def __init__(self, fetcher: KeyFetcher):
+        self._fetcher = fetcher
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flight = SingleFlight()
+        self._max_age: Optional[int] = None  # max-age de la última descarga exitosa
+        self._last_attempt = 0.0  # time.monotonic() del último intento de descarga
+
+    def set_fetcher(self, fetcher: KeyFetcher) -> None:
+        self._fetcher = fetcher
+
+    def get(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        return self._keys.get(kid) if kid else None
+
+    async def resolve(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        """
+        Clave para `kid`. Si no está, descarga el JWKS una vez (compartida entre requests
+        concurrentes) salvo que el último intento sea de hace menos de
+        JWKS_UNKNOWN_KID_REFRESH_SECONDS.
+        """
+        key = self.get(kid)
+        if key is not None or not kid:
+            return key
+        if time.monotonic() - self._last_attempt < JWKS_UNKNOWN_KID_REFRESH_SECONDS:
+            return None
+        try:
+            await self._flight.do("jwks", self.refresh)
+        except Exception as e:
+            logger.error(f"[AUTH] Error actualizando JWKS por kid desconocido: {e}")
+            return None
+        return self.get(kid)
+
+    async def refresh(self) -> int:
+        """Descarga y reemplaza el set de claves. Retorna el max-age recibido."""
+        self._last_attempt = time.monotonic()
+        jwks, max_age = await self._fetcher()
+        self._keys = {
+            k["kid"]: jwt.PyJWK(k, algorithm="RS256")
+            for k in jwks.get("keys", [])
+            if k.get("kid")
+        }
+        self._max_age = max_age
+        logger.info(f"[AUTH] JWKS actualizado ({len(self._keys)} claves, max-age={max_age}s)")
+        return max_age
+
+    async def _refresh_loop(self) -> None:
+        # Si el arranque ya descargó las claves, la primera vuelta espera su max-age
+        delay = (
+            max(self._max_age, JWKS_MIN_REFRESH_SECONDS) if self._max_age is not None else 0
+        )
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                delay = max(await self.refresh(), JWKS_MIN_REFRESH_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[AUTH] Error actualizando JWKS: {e}")
+                delay = JWKS_RETRY_SECONDS
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+jwks_store = JWKSKeyStore(
+    file_key_fetcher(FIREBASE_JWKS_FILE) if FIREBASE_JWKS_FILE else fetch_google_jwks
+)
+
+
+async def _verify_token_local(token: str) -> dict:
+    """
+    Verifica firma y claims de un ID-Token de Firebase sin salir del proceso.
+    Mismas reglas que el Admin SDK: RS256, aud = project id, iss = securetoken, sub no vacío.
+    Solo sale a la red si el kid es desconocido (rotación de claves, ver JWKSKeyStore).
+    """
+    header = jwt.get_unverified_header(token)
+    key = await jwks_store.resolve(header.get("kid"))
+    if key is None:
+        raise jwt.InvalidTokenError("kid desconocido")
+
+    claims = jwt.decode(
+        token,
+        key.key,
+        algorithms=["RS256"],
+        audience=FIREBASE_PROJECT_ID,
+        issuer=f"https://securetoken.google.com/{FIREBASE_PROJECT_ID}",
+        options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+    )
+    if not claims.get("sub") or claims.get("auth_time", 0) > time.time():
+        raise jwt.InvalidTokenError("Claims inválidos")
+
+    claims["uid"] = claims["sub"]  # Mismo shape que auth.verify_id_token
+    return claims
+
 
 def _verify_token_sync(token: str) -> dict:
     """Synchronous wrapper for Firebase token verification."""
@@ -18,14 +253,42 @@ async def verify_firebase_token(token: str) -> dict:
     """
     Valida el ID-Token de Firebase y devuelve el payload.
     Lanza 401 si el token es inválido o expiró.
-    CRITICAL: auth.verify_id_token es SINCRONO — se ejecuta en thread pool.
+    Los tokens ya verificados se sirven desde `token_cache` hasta su `exp`, y las
+    verificaciones concurrentes del mismo token se coalescen (single-flight).
+    CRITICAL: auth.verify_id_token es SINCRONO — se ejecuta en el pool dedicado `auth`.
+    En modo local (AUTH_VERIFY_MODE=local) la firma se valida en el event loop.
     """
+    cache_key = VerifiedTokenCache.key_for(token)
+    cached = token_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    return await verify_flight.do(cache_key, lambda: _verify_and_cache(token, cache_key))
+
+
+async def _verify_and_cache(token: str, cache_key: str) -> dict:
     try:
-        return await asyncio.to_thread(_verify_token_sync, token)
+        if AUTH_VERIFY_MODE == "local":
+            decoded = await _verify_token_local(token)
+        else:
+            decoded = await auth_executor.run(_verify_token_sync, token)
     except auth.InvalidIdTokenError:
+        token_cache.discard(cache_key)
         raise HTTPException(401, "Token inválido")
     except auth.ExpiredIdTokenError:
+        token_cache.discard(cache_key)
+        raise HTTPException(401, "Token expirado")
+    except jwt.ExpiredSignatureError:
+        token_cache.discard(cache_key)
         raise HTTPException(401, "Token expirado")
+    except jwt.PyJWTError:
+        token_cache.discard(cache_key)
+        raise HTTPException(401, "Token inválido")
+    except ExecutorSaturatedError:
+        raise  # 503 (handler global): no es un problema del token
     except Exception as e:
+        token_cache.discard(cache_key)
         raise HTTPException(401, f"Error: {e}")
 
+    token_cache.put(cache_key, decoded)
+    return decoded
@@ -0,0 +1,117 @@
+import os
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+from uuid import uuid4
+import jwt
+from app.models import User
+
+"""
+SESSION_TOKENS.PY
+-----------------
+Tokens de sesión propios (JWT HS256) emitidos por /auth/login.
+
+- Firebase solo se consulta en el login: el resto de las requests presenta este token,
+  que se valida localmente en microsegundos (HMAC) sin llamadas externas.
+- Vida corta (SESSION_TOKEN_TTL_SECONDS) + /auth/refresh para renovarlo.
+- Revocación server-side en memoria: bloquear/eliminar un usuario invalida todos los
+  tokens emitidos antes de ese momento. Entre workers, la fuente de verdad sigue siendo
+  User.disabled (la fila se lee igual por PK en get_current_user).
+- Si SESSION_SECRET no está definido, la funcionalidad queda deshabilitada.
+"""
+
+logger = logging.getLogger("uvicorn")
+
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+SESSION_TOKEN_TTL_SECONDS = int(os.getenv("SESSION_TOKEN_TTL_SECONDS", "900"))
+SESSION_ALGORITHM = "HS256"
+SESSION_ISSUER = "pac-backend"
+
+if not SESSION_SECRET:
+    logger.warning("SESSION_SECRET no definido: tokens de sesión deshabilitados.")
+
+
+def sessions_enabled() -> bool:
+    return bool(SESSION_SECRET)
+
+
+class SessionRevocationList:
+    """
+    user_id -> instante de revocación (milisegundos).
+    Un token es inválido si fue emitido (iat_ms) antes de la revocación de su usuario.
+    Se compara en milisegundos: con `iat` (segundos enteros) un re-login dentro del
+    mismo segundo de la revocación quedaría rechazado.
+    Las entradas se descartan pasado un TTL: los tokens previos ya expiraron solos.
+    """
+
+    def __init__(self):
+        self._revoked_at: Dict[str, int] = {}
+
+    def revoke(self, user_id) -> None:
+        self._prune()
+        self._revoked_at[str(user_id)] = time.time_ns() // 1_000_000
+
+    def is_revoked(self, claims: dict) -> bool:
+        revoked_at = self._revoked_at.get(claims.get("sub"))
+        if revoked_at is None:
+            return False
+        issued_ms = claims.get("iat_ms", claims.get("iat", 0) * 1000)
+        return issued_ms < revoked_at
+
+    def _prune(self) -> None:
+        cutoff = time.time_ns() // 1_000_000 - SESSION_TOKEN_TTL_SECONDS * 1000
+        for user_id in [u for u, ts in self._revoked_at.items() if ts < cutoff]:
+            del self._revoked_at[user_id]
+
+
+revocations = SessionRevocationList()
+
+
+def issue_session_token(user: User) -> Tuple[str, datetime]:
+    """Firma un token de sesión con los claims de autorización del usuario."""
+    now_ms = time.time_ns() // 1_000_000
+    now = now_ms // 1000
+    expires = now + SESSION_TOKEN_TTL_SECONDS
+    claims = {
+        "iss": SESSION_ISSUER,
+        "sub": str(user.id),
+        "adm": user.is_admin,
+        "trl": user.is_trial,
+        "dis": user.disabled,
+        "iat": now,
+        "iat_ms": now_ms,
+        "exp": expires,
+        "jti": uuid4().hex,
+    }
+    token = jwt.encode(claims, SESSION_SECRET, algorithm=SESSION_ALGORITHM)
+    # UTC naive, como el resto de los datetimes de la API
+    return token, datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None)
+
+
+def is_session_token(token: str) -> bool:
+    """Distingue tokens propios (HS256) de ID-Tokens de Firebase (RS256) sin verificar."""
+    try:
+        return jwt.get_unverified_header(token).get("alg") == SESSION_ALGORITHM
+    except jwt.PyJWTError:
+        return False
+
+
+def decode_session_token(token: str) -> dict:
+    """
+    Verifica firma, expiración y revocación.
+    Lanza jwt.ExpiredSignatureError / jwt.InvalidTokenError.
+    """
+    if not SESSION_SECRET:
+        raise jwt.InvalidTokenError("Tokens de sesión deshabilitados")
+
+    claims = jwt.decode(
+        token,
+        SESSION_SECRET,
+        algorithms=[SESSION_ALGORITHM],
+        issuer=SESSION_ISSUER,
+        options={"require": ["exp", "iat", "sub", "iss"]},
+    )
+    if revocations.is_revoked(claims):
+        raise jwt.InvalidTokenError("Sesión revocada")
+    return claims
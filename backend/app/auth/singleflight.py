@@ -0,0 +1,38 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+"""
+SINGLEFLIGHT.PY
+---------------
+Coalescing de llamadas concurrentes ("single-flight").
+
+Mientras hay una llamada en curso para una clave, las siguientes con la misma clave
+esperan ese mismo resultado (o excepción) en lugar de repetir el trabajo.
+Al terminar, la clave se libera: no es un cache, solo deduplica lo que está en vuelo.
+"""
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._forget(k, t))
+        # shield: si un caller se cancela (cliente cortó la conexión),
+        # la llamada compartida sigue para el resto de los que esperan.
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Marca la excepción como consumida (evita warnings del loop)
@@ -0,0 +1,165 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Booking, GymClass
+from app.versioning import GRID, mark_changed, mark_grid_days
+
+"""
+CACHING.PY
+----------
+Cache en memoria (por worker) de la parte compartida de la grilla de clases.
+
+GET /gym-classes es igual para todos salvo my_status, y la app lo consulta en cada
+poll. Se cachean por día las filas de clases con su confirmed_count (un rango se arma
+con los días que lo componen); el estado propio de cada usuario se superpone con una
+única query indexada sobre sus reservas.
+
+Invalidación:
+- Automática al hacer commit: un listener de flush detecta GymClass/Booking
+  creados, modificados o borrados vía ORM; los UPDATE/funciones de booking.py marcan
+  las clases que tocan con mark_grid_dirty. Tras el commit se descartan solo los
+  días afectados.
+- Cambios hechos en OTRO worker: cada entrada guarda la versión con la que se armó,
+  (versión global GRID, versión de su día) (ver versioning.get_grid_versions); si la
+  actual es otra, la entrada no se usa. Una reserva solo mueve la versión de su día: en
+  plena hora pico los demás días siguen cacheados en todos los workers. Los cambios de
+  clases vía ORM mueven la global y descartan todo. GRID_CACHE_TTL_SECONDS queda como
+  límite de seguridad.
+"""
+
+logger = logging.getLogger("uvicorn")
+
+GRID_CACHE_TTL_SECONDS = float(os.getenv("GRID_CACHE_TTL_SECONDS", "5"))
+GRID_CACHE_MAX_ENTRIES = int(os.getenv("GRID_CACHE_MAX_ENTRIES", "64"))
+
+_DIRTY_KEY = "grid_dirty"
+
+# (versión global GRID, versión del día)
+DayVersion = Tuple[int, int]
+
+
+class GridCache:
+    """
+    Entradas: clave (día ISO) -> (vence_en, (versión global, versión del día), filas).
+    Índice inverso class_id -> claves que la contienen, para invalidar solo lo afectado.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, DayVersion, List[Dict[str, Any]]]]" = (
+            OrderedDict()
+        )
+        self._by_class: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key_for(day: date) -> str:
+        return day.isoformat()
+
+    def get(self, key: str, version: DayVersion) -> Optional[List[Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic() or entry[1] != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def put(self, key: str, rows: List[Dict[str, Any]], version: DayVersion) -> None:
+        """`version`: la leída ANTES de consultar las filas (si cambió, la entrada no se usa)."""
+        if self.max_entries <= 0:
+            return
+        self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, version, rows)
+        for row in rows:
+            self._by_class.setdefault(row["id"], set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def invalidate(self, class_ids: Set[str], days: Set[str]) -> None:
+        keys = set(days)
+        for class_id in class_ids:
+            keys |= self._by_class.pop(class_id, set())
+        for key in keys:
+            self._drop(key)
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_class.clear()
+        self.invalidations += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for row in entry[2]:
+            keys = self._by_class.get(row["id"])
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_class[row["id"]]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+grid_cache = GridCache(GRID_CACHE_TTL_SECONDS, GRID_CACHE_MAX_ENTRIES)
+
+
+# ----------- INVALIDACIÓN -----------
+
+
+def _dirty(session) -> Dict[str, Set[str]]:
+    return session.info.setdefault(_DIRTY_KEY, {"classes": set(), "days": set()})
+
+
+def mark_grid_dirty(session, class_id: Any = None, start_time: Optional[datetime] = None) -> None:
+    """
+    Marca una clase (y/o su día) para invalidar la grilla cuando la sesión haga commit:
+    en este worker se descartan esas entradas y en los demás cambia la versión del día.
+    Acepta AsyncSession o Session (comparten `info`).
+    """
+    dirty = _dirty(session)
+    mark_grid_days(session, class_id, start_time.date() if start_time is not None else None)
+    if class_id is not None:
+        dirty["classes"].add(str(UUID(str(class_id))))
+    if start_time is not None:
+        dirty["days"].add(start_time.date().isoformat())
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_grid_changes(session, flush_context, instances) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, GymClass):
+            # Edición/cancelación de la clase: el día anterior no se conoce acá
+            mark_changed(session, GRID)
+            mark_grid_dirty(session, obj.id, obj.start_time)
+        elif isinstance(obj, Booking) and obj.gym_class_id is not None:
+            mark_grid_dirty(session, obj.gym_class_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session) -> None:
+    dirty = session.info.pop(_DIRTY_KEY, None)
+    if dirty and (dirty["classes"] or dirty["days"]):
+        grid_cache.invalidate(dirty["classes"], dirty["days"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_DIRTY_KEY, None)
@@ -3,6 +3,8 @@ from typing import AsyncGenerator
 from sqlmodel import SQLModel
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from dotenv import load_dotenv
+from app.schema import SCHEMA_DDL
+from app.versioning import VersionedSession
 
 """
 DATABASE.PY
@@ -25,9 +27,9 @@ engine = create_async_engine(
     pool_pre_ping=True,
 )
 
-# Fábrica de Sesiones
+# Fábrica de Sesiones (commit() también versiona los recursos modificados, ver versioning.py)
 async_session_factory = async_sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
+    engine, class_=VersionedSession, expire_on_commit=False
 )
 
 
@@ -38,10 +40,21 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
 
 
 # --- Funciones de Utilidad ---
+# Clave del advisory lock que serializa el arranque de los workers
+SCHEMA_LOCK_KEY = 727001
+
+
 async def create_tables():
-    """Crea las tablas al iniciar la app (Idempotente: solo si no existen)."""
+    """
+    Crea las tablas al iniciar la app (Idempotente: solo si no existen)
+    y aplica el DDL adicional de schema.py.
+    """
     async with engine.begin() as conn:
+        # Varios workers arrancan a la vez: CREATE OR REPLACE concurrente puede fallar
+        await conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY})")
         await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in SCHEMA_DDL:
+            await conn.exec_driver_sql(statement)
 
 
 async def dispose_engine():
@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+"""
+EXECUTORS.PY
+------------
+Thread pools dedicados para llamadas bloqueantes (SDKs síncronos).
+
+Motivo: asyncio.to_thread usa un único pool compartido. Un broadcast de push a cientos
+de dispositivos podía ocupar todos los threads y dejar esperando la verificación de
+tokens de cualquier request. Cada tipo de trabajo tiene ahora su propio pool con:
+- Tamaño configurable (EXECUTOR_<NOMBRE>_WORKERS).
+- Límite de cola (EXECUTOR_<NOMBRE>_QUEUE): si se supera, se rechaza de inmediato
+  con ExecutorSaturatedError (backpressure → 503) en vez de acumular latencia.
+- Métricas: cola, en ejecución, tiempo de espera y de ejecución (ver /metrics).
+"""
+
+
+class ExecutorSaturatedError(Exception):
+    """La cola del pool está llena: el caller debe reintentar más tarde."""
+
+    def __init__(self, name: str):
+        super().__init__(f"Executor '{name}' saturado")
+        self.name = name
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, default))
+    except ValueError:
+        return default
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"pac-{name}"
+        )
+        self._lock = threading.Lock()
+
+        # Estado actual
+        self._in_flight = 0  # Encolados + ejecutando
+        self._running = 0
+
+        # Acumulados
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+        self._run_max = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self._in_flight - self._running
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Ejecuta fn(*args) en el pool. Lanza ExecutorSaturatedError si la cola está llena."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorSaturatedError(self.name)
+            self._in_flight += 1
+            self.submitted += 1
+
+        enqueued_at = time.perf_counter()
+
+        def call():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                wait = started_at - enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            ok = False
+            try:
+                result = fn(*args)
+                ok = True
+                return result
+            finally:
+                elapsed = time.perf_counter() - started_at
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._run_total += elapsed
+                    self._run_max = max(self._run_max, elapsed)
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+        # Igual que asyncio.to_thread: propagar contextvars al thread
+        ctx = contextvars.copy_context()
+        future = self._pool.submit(ctx.run, call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Si nunca llegó a ejecutarse, call() no descuenta el in-flight
+            if future.cancel():
+                with self._lock:
+                    self._in_flight -= 1
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.failed + self._running
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self._running,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+                "max_wait_ms": round(self._wait_max * 1000, 2),
+                "avg_run_ms": round(self._run_total / finished * 1000, 2) if finished else 0.0,
+                "max_run_ms": round(self._run_max * 1000, 2),
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ----------- POOLS -----------
+# auth: verificación de ID-Tokens con el Admin SDK (camino caliente de cada request)
+auth_executor = BoundedExecutor(
+    "auth", _env_int("EXECUTOR_AUTH_WORKERS", 8), _env_int("EXECUTOR_AUTH_QUEUE", 64)
+)
+# push: messaging.send de FCM (broadcasts de novedades)
+push_executor = BoundedExecutor(
+    "push", _env_int("EXECUTOR_PUSH_WORKERS", 4), _env_int("EXECUTOR_PUSH_QUEUE", 1000)
+)
+# email: SMTP
+email_executor = BoundedExecutor(
+    "email", _env_int("EXECUTOR_EMAIL_WORKERS", 2), _env_int("EXECUTOR_EMAIL_QUEUE", 100)
+)
+# image: compresión con Pillow (CPU)
+image_executor = BoundedExecutor(
+    "image", _env_int("EXECUTOR_IMAGE_WORKERS", 2), _env_int("EXECUTOR_IMAGE_QUEUE", 8)
+)
+
+EXECUTORS = {
+    e.name: e for e in (auth_executor, push_executor, email_executor, image_executor)
+}
+
+
+def executors_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: e.snapshot() for name, e in EXECUTORS.items()}
+
+
+def shutdown_executors() -> None:
+    for e in EXECUTORS.values():
+        e.shutdown()
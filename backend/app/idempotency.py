@@ -0,0 +1,141 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+from uuid import UUID
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.models import IdempotencyKey
+
+"""
+IDEMPOTENCY.PY
+--------------
+Soporte del header `Idempotency-Key` para reservar, cancelar y reservas manuales.
+
+Con mala señal la app reintenta la request; antes cada reintento volvía a correr toda
+la validación y devolvía un error confuso ("Ya tienes reserva confirmada") aunque la
+primera hubiera funcionado. Ahora:
+- La primera respuesta exitosa se guarda en `idempotency_keys` en la MISMA transacción
+  que la mutación (o quedan las dos, o ninguna).
+- Un reintento con la misma clave recibe esa respuesta (header Idempotent-Replayed)
+  con un lookup por PK, sin tocar reservas, créditos ni el lock de la clase.
+- Si dos intentos corren a la vez, el segundo falla la validación (la reserva ya
+  existe) y en ese momento encuentra y devuelve la respuesta guardada por el primero.
+- Los errores no se guardan: no mutaron nada y reintentarlos es seguro.
+"""
+
+logger = logging.getLogger("uvicorn")
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def get_idempotency_key(
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+) -> Optional[str]:
+    """Dependency: valida el header (opcional)."""
+    if idempotency_key is None:
+        return None
+    idempotency_key = idempotency_key.strip()
+    if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(400, detail="Idempotency-Key inválida")
+    return idempotency_key
+
+
+def _cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+
+
+async def find_stored_response(
+    session: AsyncSession, user_id: UUID, key: str, scope: str
+) -> Optional[JSONResponse]:
+    """Respuesta guardada para (usuario, clave) si sigue vigente."""
+    stored = (
+        await session.execute(
+            select(IdempotencyKey).where(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.key == key,
+                IdempotencyKey.created_at >= _cutoff(),
+            )
+        )
+    ).scalar_one_or_none()
+    if stored is None:
+        return None
+    if stored.scope != scope:
+        raise HTTPException(
+            422, detail="Idempotency-Key ya utilizada para otra operación"
+        )
+    return JSONResponse(
+        content=stored.response,
+        status_code=stored.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def save_response(
+    session: AsyncSession,
+    user_id: UUID,
+    key: Optional[str],
+    scope: str,
+    response: Any,
+    status_code: int = 200,
+) -> None:
+    """
+    Registra la respuesta en la transacción actual (el commit es del caller).
+    Una clave vencida que aún no se purgó se reemplaza.
+    """
+    if not key:
+        return
+    stmt = pg_insert(IdempotencyKey).values(
+        user_id=user_id,
+        key=key,
+        scope=scope,
+        status_code=status_code,
+        response=jsonable_encoder(response),
+        created_at=datetime.utcnow(),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.user_id, IdempotencyKey.key],
+        set_={
+            "scope": stmt.excluded.scope,
+            "status_code": stmt.excluded.status_code,
+            "response": stmt.excluded.response,
+            "created_at": stmt.excluded.created_at,
+        },
+        where=IdempotencyKey.created_at < _cutoff(),
+    )
+    await session.execute(stmt)
+
+
+async def run_idempotent(
+    session: AsyncSession,
+    user_id: UUID,
+    key: Optional[str],
+    scope: str,
+    operation: Callable[[], Awaitable[Any]],
+) -> Any:
+    """
+    Ejecuta `operation` (que debe llamar a save_response antes de su commit) salvo
+    que la clave ya tenga respuesta guardada. Sin clave, ejecuta directamente.
+    """
+    if not key:
+        return await operation()
+
+    stored = await find_stored_response(session, user_id, key, scope)
+    if stored is not None:
+        return stored
+
+    try:
+        return await operation()
+    except HTTPException:
+        # ¿Un intento concurrente con la misma clave terminó primero?
+        await session.rollback()
+        stored = await find_stored_response(session, user_id, key, scope)
+        if stored is not None:
+            logger.info(f"[IDEMPOTENCY] Replay tras conflicto: scope={scope}")
+            return stored
+        raise
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Dict, Optional, Set
+import asyncpg
+from fastapi import HTTPException
+from sqlalchemy.engine import make_url
+
+"""
+LIVE.PY
+-------
+Cupos en vivo: push de cambios de gym_classes por Server-Sent Events.
+
+Origen de los eventos: un trigger en gym_classes hace pg_notify('slot_changes') cuando
+cambian confirmed_count, max_slots, cancelled_at o start_time (o se crea/borra una
+clase). Cubre todos los caminos (reserva, cancelación, baja de clase, funciones de
+booking.py, jobs de mantenimiento) y las notificaciones salen recién al hacer commit.
+
+Por worker:
+- SlotListener: una conexión asyncpg propia con LISTEN (fuera del pool), que se
+  reconecta sola. Los eventos llegan a los dos workers aunque el cambio sea del otro.
+- SlotHub: fan-out en proceso a los streams abiertos, filtrando por rango de días.
+  Cada conexión guarda solo el último estado por clase (las ráfagas se fusionan) y
+  envía lotes cada LIVE_COALESCE_MS. Si un cliente lento acumula más de
+  LIVE_MAX_PENDING clases, se descarta lo pendiente y recibe "resync" (debe volver a
+  pedir la grilla). También se envía "resync" si se cortó el LISTEN.
+
+Formato (text/event-stream):
+    event: ready   data: {"from": "YYYY-MM-DD", "to": "YYYY-MM-DD"}
+    event: slots   data: [{id, start_time, confirmed_count, max_slots,
+                           available_slots, is_full, cancelled, op}, ...]
+    event: resync  data: {}
+    : ping          (cada LIVE_HEARTBEAT_SECONDS, mantiene vivos proxies y detecta cortes)
+"""
+
+logger = logging.getLogger("uvicorn")
+
+LIVE_SLOTS_ENABLED = os.getenv("LIVE_SLOTS_ENABLED", "true").lower() == "true"
+LIVE_MAX_CLIENTS = int(os.getenv("LIVE_MAX_CLIENTS", "500"))
+LIVE_MAX_PENDING = int(os.getenv("LIVE_MAX_PENDING", "200"))
+LIVE_COALESCE_MS = int(os.getenv("LIVE_COALESCE_MS", "250"))
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "15"))
+LIVE_RECONNECT_SECONDS = float(os.getenv("LIVE_RECONNECT_SECONDS", "2"))
+
+SLOT_CHANNEL = "slot_changes"
+
+# ----------- TRIGGER -----------
+
+NOTIFY_SLOT_CHANGE_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION pac_notify_slot_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    r record;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        r := OLD;
+    ELSE
+        r := NEW;
+    END IF;
+
+    -- Filas reubicadas entre particiones (partitioning.py): no cambian los cupos
+    IF current_setting('pac.moving_partition', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+
+    -- UPDATE OF dispara aunque el valor no cambie (p.ej. SET max_slots = max_slots)
+    IF TG_OP = 'UPDATE'
+       AND NEW.confirmed_count = OLD.confirmed_count
+       AND NEW.max_slots = OLD.max_slots
+       AND NEW.cancelled_at IS NOT DISTINCT FROM OLD.cancelled_at
+       AND NEW.start_time = OLD.start_time THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM pg_notify('{SLOT_CHANNEL}', json_build_object(
+        'op', lower(TG_OP),
+        'id', r.id,
+        'start_time', r.start_time,
+        'old_start_time',
+            CASE WHEN TG_OP = 'UPDATE' AND NEW.start_time <> OLD.start_time
+                 THEN OLD.start_time END,
+        'confirmed_count', r.confirmed_count,
+        'max_slots', r.max_slots,
+        'cancelled', TG_OP = 'DELETE' OR r.cancelled_at IS NOT NULL
+    )::text);
+    RETURN NULL;
+END
+$$
+"""
+
+NOTIFY_SLOT_CHANGE_TRIGGER = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'trg_gym_classes_slot_change'
+    ) THEN
+        CREATE TRIGGER trg_gym_classes_slot_change
+        AFTER INSERT OR DELETE
+           OR UPDATE OF confirmed_count, max_slots, cancelled_at, start_time
+        ON gym_classes
+        FOR EACH ROW EXECUTE FUNCTION pac_notify_slot_change();
+    END IF;
+END
+$$
+"""
+
+LIVE_DDL = [NOTIFY_SLOT_CHANGE_FUNCTION, NOTIFY_SLOT_CHANGE_TRIGGER]
+
+
+# ----------- FAN-OUT -----------
+
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("first_day", "last_day", "pending", "wake", "resync", "closed")
+
+    def __init__(self, first_day: date, last_day: date):
+        self.first_day = first_day
+        self.last_day = last_day
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.wake = asyncio.Event()
+        self.resync = False
+        self.closed = False
+
+    def wants(self, days: Set[date]) -> bool:
+        return any(self.first_day <= day <= self.last_day for day in days)
+
+    def offer(self, event: Dict[str, Any], max_pending: int) -> bool:
+        """Encola (el último estado de cada clase pisa al anterior). False si desbordó."""
+        self.pending[event["id"]] = event
+        overflow = len(self.pending) > max_pending
+        if overflow:
+            self.pending.clear()
+            self.resync = True
+        self.wake.set()
+        return not overflow
+
+    def request_resync(self) -> None:
+        self.pending.clear()
+        self.resync = True
+        self.wake.set()
+
+
+class SlotHub:
+    def __init__(
+        self, max_clients: int, max_pending: int, coalesce_ms: int, heartbeat: float
+    ):
+        self.max_clients = max_clients
+        self.max_pending = max_pending
+        self.coalesce = coalesce_ms / 1000
+        self.heartbeat = heartbeat
+        self._subscribers: Set[_Subscriber] = set()
+
+        # Acumulados
+        self.received = 0
+        self.delivered_batches = 0
+        self.resyncs = 0
+        self.rejected = 0
+
+    def subscribe(self, first_day: date, last_day: date) -> _Subscriber:
+        if len(self._subscribers) >= self.max_clients:
+            self.rejected += 1
+            raise HTTPException(
+                503,
+                detail="Demasiadas conexiones en vivo, reintenta en unos segundos",
+                headers={"Retry-After": "5"},
+            )
+        subscriber = _Subscriber(first_day, last_day)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(self, payload: Dict[str, Any]) -> None:
+        """Evento del trigger → streams cuyo rango incluye el día (nuevo o anterior)."""
+        self.received += 1
+        start_time = datetime.fromisoformat(payload["start_time"])
+        days = {start_time.date()}
+        if payload.get("old_start_time"):
+            days.add(datetime.fromisoformat(payload["old_start_time"]).date())
+        available = payload["max_slots"] - payload["confirmed_count"]
+        event = {
+            "id": payload["id"],
+            "start_time": payload["start_time"],
+            "confirmed_count": payload["confirmed_count"],
+            "max_slots": payload["max_slots"],
+            "available_slots": available,
+            "is_full": available <= 0,
+            "cancelled": payload["cancelled"],
+            "op": payload["op"],
+        }
+        for subscriber in self._subscribers:
+            if subscriber.wants(days) and not subscriber.offer(event, self.max_pending):
+                self.resyncs += 1
+
+    def resync_all(self) -> None:
+        """Se pudieron perder eventos (LISTEN caído): todos deben volver a pedir la grilla."""
+        for subscriber in self._subscribers:
+            subscriber.request_resync()
+        self.resyncs += len(self._subscribers)
+
+    def close(self) -> None:
+        for subscriber in self._subscribers:
+            subscriber.closed = True
+            subscriber.wake.set()
+
+    async def stream(self, subscriber: _Subscriber) -> AsyncIterator[str]:
+        """Generador SSE de una conexión. Desuscribe al terminar (o si el cliente corta)."""
+        try:
+            yield f"retry: {int(LIVE_RECONNECT_SECONDS * 1000)}\n\n"
+            window = {
+                "from": subscriber.first_day.isoformat(),
+                "to": subscriber.last_day.isoformat(),
+            }
+            yield _sse("ready", window)
+            while not subscriber.closed:
+                try:
+                    await asyncio.wait_for(subscriber.wake.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                # Junta la ráfaga (p.ej. apertura de reservas) en un solo envío
+                await asyncio.sleep(self.coalesce)
+                subscriber.wake.clear()
+                if subscriber.resync:
+                    subscriber.resync = False
+                    yield _sse("resync", {})
+                    continue
+                events = list(subscriber.pending.values())
+                subscriber.pending.clear()
+                if events:
+                    self.delivered_batches += 1
+                    # Mientras el cliente no lee, este yield espera y lo nuevo se fusiona
+                    yield _sse("slots", events)
+        finally:
+            self.unsubscribe(subscriber)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._subscribers),
+            "received": self.received,
+            "delivered_batches": self.delivered_batches,
+            "resyncs": self.resyncs,
+            "rejected": self.rejected,
+            "listening": slot_listener.connected,
+        }
+
+
+slot_hub = SlotHub(
+    LIVE_MAX_CLIENTS, LIVE_MAX_PENDING, LIVE_COALESCE_MS, LIVE_HEARTBEAT_SECONDS
+)
+
+
+# ----------- LISTEN -----------
+
+
+class SlotListener:
+    """Conexión dedicada con LISTEN slot_changes; reconecta con espera fija."""
+
+    def __init__(self, hub: SlotHub):
+        self.hub = hub
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            self.hub.publish(json.loads(payload))
+        except Exception as e:
+            logger.warning(f"[LIVE] Notificación inválida descartada: {e}")
+
+    async def _listen_once(self, dsn: str) -> None:
+        connection = await asyncpg.connect(dsn)
+        try:
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(SLOT_CHANNEL, self._on_notify)
+            self.connected = True
+            logger.info(f"[LIVE] Escuchando {SLOT_CHANNEL}")
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), LIVE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    await connection.fetchval("SELECT 1")  # Detecta conexiones muertas
+        finally:
+            self.connected = False
+            if not connection.is_closed():
+                connection.terminate()
+
+    async def _run(self) -> None:
+        from app.database import DATABASE_URL  # database -> schema importa este módulo
+
+        dsn = make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+        while True:
+            try:
+                await self._listen_once(dsn)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[LIVE] LISTEN interrumpido: {e}")
+            # Lo que cambió mientras no se escuchaba no llegó a los streams
+            self.hub.resync_all()
+            await asyncio.sleep(LIVE_RECONNECT_SECONDS)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+slot_listener = SlotListener(slot_hub)
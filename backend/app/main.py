@@ -1,10 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
 import logging
 from .database import create_tables
+from .auth.firebase import AUTH_VERIFY_MODE, jwks_store
+from .executors import ExecutorSaturatedError, shutdown_executors
+from .live import LIVE_SLOTS_ENABLED, slot_hub, slot_listener
+from .partitioning import PARTITIONING_ENABLED, partition_keeper
 from .api import adminEP, clientEP, publicEP, authEP
 
 # Configuración de Logging
@@ -16,8 +21,10 @@ logger = logging.getLogger("uvicorn")
 async def lifespan(app: FastAPI):
     """
     Gestión del ciclo de vida de la aplicación.
-    - Inicio: Crea carpeta de uploads y verifica tablas DB.
-    - Cierre: (Disponible para cleanup si fuera necesario).
+    - Inicio: Crea carpeta de uploads, verifica tablas DB y (modo auth local) carga el JWKS.
+    - Cupos en vivo: LISTEN de cambios de clases para los streams SSE (ver live.py).
+    - Particiones: creación anticipada y archivo periódico de gym_classes (ver partitioning.py).
+    - Cierre: Detiene el refresco de claves en background y los thread pools dedicados.
     """
     # Crear carpeta de uploads si no existe para evitar errores
     os.makedirs("static/uploads", exist_ok=True)
@@ -25,8 +32,30 @@ async def lifespan(app: FastAPI):
     logger.info("[STARTUP] Inicializando base de datos...")
     await create_tables()
     logger.info("[STARTUP] Tablas verificadas.")
+
+    if AUTH_VERIFY_MODE == "local":
+        # Primera carga síncrona para no rechazar tokens en las primeras requests;
+        # el refresco en background arranca esperando su max-age (no repite la descarga)
+        try:
+            await jwks_store.refresh()
+        except Exception as e:
+            logger.error(f"[STARTUP] No se pudo cargar el JWKS inicial: {e}")
+        jwks_store.start()
+
+    if LIVE_SLOTS_ENABLED:
+        slot_listener.start()
+
+    if PARTITIONING_ENABLED:
+        partition_keeper.start()
+
     yield
 
+    slot_hub.close()
+    await slot_listener.stop()
+    await partition_keeper.stop()
+    await jwks_store.stop()
+    shutdown_executors()
+
 
 app = FastAPI(
     title="Pilates All Canning API",
@@ -45,8 +74,20 @@ app.add_middleware(
     allow_credentials=cors_origins_str != "*",  # Solo con orígenes específicos
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],  # GET condicionales / paginación (web)
 )
 
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturatedError):
+    """Backpressure: un thread pool dedicado está lleno → 503 para que el cliente reintente."""
+    logger.warning(f"[EXECUTORS] {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servidor ocupado, reintentá en unos segundos"},
+        headers={"Retry-After": "2"},
+    )
+
+
 # Servir archivos estáticos (imágenes, certificados)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
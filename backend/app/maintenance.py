@@ -0,0 +1,185 @@
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import text, or_, func, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+from app.models import Credit, GymClass, IdempotencyKey
+from app.caching import mark_grid_dirty
+
+"""
+MAINTENANCE.PY
+--------------
+Tareas de mantenimiento de datos (idempotentes, seguras con tráfico en curso).
+Se disparan desde endpoints de admin (ver adminEP, sección MANTENIMIENTO).
+"""
+
+logger = logging.getLogger("uvicorn")
+
+COMPACTION_BATCH_USERS = 500
+
+
+# ----------- COMPACTACIÓN DEL LEDGER DE CRÉDITOS -----------
+# Qué se puede compactar sin alterar el saldo (reglas en utils.ledger_balance_columns):
+# - Negativos y positivos sin vencimiento: aportan siempre lo mismo → se suman en un snapshot.
+# - Positivos ya vencidos: aportan 0 para siempre → se archivan sin snapshot.
+# - Positivos con vencimiento futuro: su aporte cambia al vencer → NO se tocan.
+# El snapshot es un Credit sin vencimiento con created_at = cutoff, por lo que una
+# segunda corrida con el mismo cutoff no encuentra nada nuevo (idempotente) y una
+# corrida con un cutoff posterior lo vuelve a plegar junto con los movimientos nuevos.
+#
+# Todo ocurre en un único statement por lote: cualquier lectura concurrente del ledger
+# (también de un solo statement) ve el estado anterior o el posterior, con igual saldo.
+# La proyección credit_balances no cambia.
+COMPACT_CREDITS_SQL = text(
+    """
+    WITH moved AS (
+        DELETE FROM credits
+        WHERE user_id = ANY(:user_ids)
+          AND created_at < :cutoff
+          AND (amount <= 0 OR expires_at IS NULL OR expires_at <= :now)
+        RETURNING id, amount, expires_at, created_at, user_id
+    ),
+    archived AS (
+        INSERT INTO credits_archive (id, amount, expires_at, created_at, user_id, archived_at)
+        SELECT id, amount, expires_at, created_at, user_id, :now FROM moved
+        RETURNING user_id, amount, expires_at
+    ),
+    snapshots AS (
+        INSERT INTO credits (id, amount, expires_at, created_at, user_id)
+        SELECT gen_random_uuid(),
+               SUM(amount) FILTER (WHERE amount < 0 OR expires_at IS NULL),
+               NULL, :cutoff, user_id
+        FROM archived
+        GROUP BY user_id
+        HAVING COALESCE(SUM(amount) FILTER (WHERE amount < 0 OR expires_at IS NULL), 0) <> 0
+        RETURNING id
+    )
+    SELECT (SELECT count(*) FROM archived) AS archived,
+           (SELECT count(*) FROM snapshots) AS snapshots
+    """
+)
+
+
+async def compact_credit_ledger(
+    session: AsyncSession, cutoff: datetime, now: Optional[datetime] = None
+) -> Dict[str, int]:
+    """
+    Pliega los movimientos anteriores a `cutoff` que ya no pueden cambiar el saldo
+    en un snapshot por usuario y mueve los originales a credits_archive.
+    Commit por lote de usuarios para mantener las transacciones cortas.
+    Retorna cuántas filas se archivaron, cuántos snapshots se crearon y las filas recuperadas.
+    """
+    now = now or datetime.now()
+    foldable = or_(
+        Credit.amount <= 0, Credit.expires_at.is_(None), Credit.expires_at <= now
+    )
+    candidates = await session.execute(
+        select(Credit.user_id)
+        .where(Credit.created_at < cutoff, foldable)
+        .group_by(Credit.user_id)
+        .having(func.count() > 1)  # Con 1 sola fila no hay nada que ganar
+    )
+    user_ids = list(candidates.scalars().all())
+
+    archived = 0
+    snapshots = 0
+    for i in range(0, len(user_ids), COMPACTION_BATCH_USERS):
+        batch = user_ids[i : i + COMPACTION_BATCH_USERS]
+        row = (
+            await session.execute(
+                COMPACT_CREDITS_SQL, {"user_ids": batch, "cutoff": cutoff, "now": now}
+            )
+        ).one()
+        await session.commit()
+        archived += row.archived
+        snapshots += row.snapshots
+
+    report = {
+        "users": len(user_ids),
+        "archived": archived,
+        "snapshots": snapshots,
+        "reclaimed": archived - snapshots,
+    }
+    logger.info(f"[MAINTENANCE] Credit ledger compaction (cutoff={cutoff}): {report}")
+    return report
+
+
+# ----------- RECONCILIACIÓN DE CUPOS -----------
+# gym_classes.confirmed_count se mantiene con UPDATEs relativos (ver booking.py).
+# Si algún camino lo desajustara (edición manual en la DB, bug), este job lo recalcula.
+# Primero se bloquean las clases del lote: así el COUNT (statement siguiente, snapshot
+# nuevo) ve todas las reservas de las transacciones que ya ajustaron el contador, y las
+# que lo ajusten después lo harán de forma relativa sobre el valor reparado.
+RECONCILE_SLOTS_SQL = text(
+    """
+    WITH actual AS (
+        SELECT g.id, count(b.id) FILTER (WHERE b.status = 'CONFIRMED') AS n
+        FROM gym_classes g
+        LEFT JOIN bookings b ON b.gym_class_id = g.id
+        WHERE g.id = ANY(:class_ids)
+        GROUP BY g.id
+    )
+    UPDATE gym_classes g
+    SET confirmed_count = a.n
+    FROM actual a
+    WHERE g.id = a.id AND g.confirmed_count <> a.n
+    RETURNING g.id, g.confirmed_count
+    """
+)
+
+RECONCILE_BATCH_CLASSES = 500
+
+
+async def reconcile_confirmed_counts(
+    session: AsyncSession, since: datetime
+) -> Dict[str, int]:
+    """
+    Repara gym_classes.confirmed_count de las clases con start_time >= since.
+    Commit por lote de clases para no retener los locks más de lo necesario.
+    Retorna cuántas clases se revisaron y cuántas tenían drift.
+    """
+    class_ids = list(
+        (
+            await session.execute(
+                select(GymClass.id).where(GymClass.start_time >= since).order_by(GymClass.id)
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+    repaired = 0
+    for i in range(0, len(class_ids), RECONCILE_BATCH_CLASSES):
+        batch = class_ids[i : i + RECONCILE_BATCH_CLASSES]
+        await session.execute(
+            select(GymClass.id)
+            .where(GymClass.id.in_(batch))
+            .order_by(GymClass.id)
+            .with_for_update()
+        )
+        rows = (await session.execute(RECONCILE_SLOTS_SQL, {"class_ids": batch})).all()
+        for row in rows:
+            mark_grid_dirty(session, row.id)
+        await session.commit()
+        for row in rows:
+            logger.warning(
+                f"[MAINTENANCE] confirmed_count drift en clase {row.id}: reparado a {row.confirmed_count}"
+            )
+        repaired += len(rows)
+
+    report = {"checked": len(class_ids), "repaired": repaired}
+    logger.info(f"[MAINTENANCE] Slot counter reconciliation (since={since}): {report}")
+    return report
+
+
+# ----------- PURGA DE IDEMPOTENCY KEYS -----------
+async def purge_idempotency_keys(session: AsyncSession, older_than: datetime) -> Dict[str, int]:
+    """Elimina respuestas guardadas ya vencidas (ver idempotency.IDEMPOTENCY_TTL_HOURS)."""
+    result = await session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.created_at < older_than)
+    )
+    await session.commit()
+    report = {"deleted": result.rowcount}
+    logger.info(f"[MAINTENANCE] Idempotency keys purge (older_than={older_than}): {report}")
+    return report
@@ -2,7 +2,8 @@ import uuid
 from datetime import datetime, timezone, time
 from enum import Enum
 from typing import List, Optional
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
 """
@@ -46,6 +47,19 @@ class User(SQLModel, table=True):
     __table_args__ = (
         UniqueConstraint("provider", "social_id", name="uq_provider_social_id"),
         UniqueConstraint("dni", name="uq_user_dni"),
+        # Índices parciales: cubren solo las filas "activas" que filtran los endpoints
+        # Listado/buscador de alumnos (admin), ordenado por nombre
+        Index(
+            "ix_users_active_full_name",
+            "full_name",
+            postgresql_where=text("is_deleted = false"),
+        ),
+        # Envío de push y limpieza de tokens inválidos (notifications.py)
+        Index(
+            "ix_users_fcm_token",
+            "fcm_token",
+            postgresql_where=text("fcm_token IS NOT NULL"),
+        ),
     )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -96,7 +110,16 @@ class Instructor(SQLModel, table=True):
 
 # ----------- GYM CLASS -----------
 class GymClass(SQLModel, table=True):
+    # En la DB está particionada por mes de start_time, PK (id, start_time) (ver partitioning.py)
     __tablename__ = "gym_classes"
+    __table_args__ = (
+        # Grilla: clases no canceladas desde una fecha
+        Index(
+            "ix_gym_classes_active_start",
+            "start_time",
+            postgresql_where=text("cancelled_at IS NULL"),
+        ),
+    )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str = Field(default="Clase")
@@ -104,6 +127,10 @@ class GymClass(SQLModel, table=True):
     start_time: datetime = Field(index=True)
     max_slots: int = Field(default=8)
     duration_minutes: int = Field(default=60)
+    # Reservas CONFIRMED de la clase. Se mantiene con UPDATEs relativos (ver booking.py);
+    # la reserva ocupa un cupo con un UPDATE condicional (confirmed_count < max_slots).
+    # Puede superar max_slots: los abonos fijos reservan sin chequear cupo.
+    confirmed_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
     recurrence_group: Optional[uuid.UUID] = Field(default=None, index=True)
     recurrence: bool = Field(default=False)
@@ -122,6 +149,16 @@ class Booking(SQLModel, table=True):
         UniqueConstraint(
             "user_id", "gym_class_id", name="uq_prevent_double_booking_user"
         ),
+        # Reservas de una clase por estado (detalle admin, cancelaciones, reconciliación)
+        Index("ix_bookings_class_status", "gym_class_id", "status"),
+        # Reservas confirmadas del usuario (overlay de la grilla, mis reservas).
+        # Parcial: no crece con el historial de canceladas
+        Index(
+            "ix_bookings_user_confirmed",
+            "user_id",
+            "gym_class_id",
+            postgresql_where=text("status = 'CONFIRMED'"),
+        ),
     )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -132,6 +169,7 @@ class Booking(SQLModel, table=True):
 
     # Foreign Keys
     user_id: uuid.UUID = Field(foreign_key="users.id", index=True)
+    # Con gym_classes particionada la FK real la reemplaza trg_bookings_class_exists
     gym_class_id: uuid.UUID = Field(foreign_key="gym_classes.id", index=True)
 
     user: User = Relationship(back_populates="bookings")
@@ -145,6 +183,13 @@ class FixedSchedule(SQLModel, table=True):
         UniqueConstraint(
             "user_id", "day_of_week", "start_time", name="uq_fixed_user_slot"
         ),
+        # Auto-reserva: abonos vigentes de un día y horario
+        Index(
+            "ix_fixed_schedules_active_slot",
+            "day_of_week",
+            "start_time",
+            postgresql_where=text("cancelled_at IS NULL"),
+        ),
     )
 
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
@@ -170,6 +215,63 @@ class Credit(SQLModel, table=True):
     user: User = Relationship(back_populates="credits")
 
 
+# ----------- CREDIT ARCHIVE -----------
+class CreditArchive(SQLModel, table=True):
+    """
+    Movimientos del ledger ya compactados (ver maintenance.compact_credit_ledger).
+    Se conservan como historial; no participan del cálculo de saldo.
+    Sin FK a users: el historial sobrevive a la fusión/eliminación de usuarios sombra.
+    """
+
+    __tablename__ = "credits_archive"
+
+    id: uuid.UUID = Field(primary_key=True)
+    amount: int
+    expires_at: Optional[datetime] = None
+    created_at: datetime
+    user_id: uuid.UUID = Field(index=True)
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ----------- CREDIT BALANCE (PROYECCIÓN) -----------
+class CreditBalance(SQLModel, table=True):
+    """
+    Proyección materializada del saldo por usuario (1 fila por usuario).
+    Se actualiza en la misma transacción que cada alta en `credits` (ver utils.add_credit),
+    así leer el saldo es un lookup por PK en vez de recorrer todo el ledger.
+    """
+
+    __tablename__ = "credit_balances"
+
+    user_id: uuid.UUID = Field(foreign_key="users.id", primary_key=True)
+    # Suma vigente del ledger SIN piso en 0 (el piso se aplica al leer)
+    balance: int = Field(default=0)
+    # Próximo vencimiento de un crédito positivo vigente.
+    # Al pasar esta fecha la fila se recalcula desde el ledger (expiración lazy).
+    next_expiry_at: Optional[datetime] = None
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# ----------- IDEMPOTENCY KEYS -----------
+class IdempotencyKey(SQLModel, table=True):
+    """
+    Primera respuesta exitosa de una mutación enviada con header Idempotency-Key.
+    Los reintentos con la misma clave reciben esta respuesta sin volver a ejecutarse
+    (ver idempotency.py). Vigencia: IDEMPOTENCY_TTL_HOURS.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    # Clave por usuario: dos clientes distintos pueden generar la misma
+    user_id: uuid.UUID = Field(primary_key=True)
+    key: str = Field(primary_key=True, max_length=255)
+    # Endpoint + recurso (ej: "book:<class_id>"): detecta claves reutilizadas
+    scope: str
+    status_code: int = Field(default=200)
+    response: dict = Field(sa_type=JSONB)
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
 # ----------- SETTINGS -----------
 class Setting(SQLModel, table=True):
     __tablename__ = "settings"
@@ -1,6 +1,5 @@
 import json
 import logging
-import asyncio
 from typing import List, Optional
 from firebase_admin import messaging
 from sqlalchemy.future import select
@@ -8,6 +7,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import text  # Moved from inner function
 from app.database import engine
 from app.models import User
+from app.executors import push_executor
 
 logger = logging.getLogger(__name__)
 
@@ -55,8 +55,9 @@ async def send_multicast_notification(
 
         try:
             # CRITICAL: messaging.send es SINCRONO.
-            # Envolver en asyncio.to_thread para no bloquear el loop principal durante el envío.
-            await asyncio.to_thread(messaging.send, msg)
+            # Se ejecuta en el pool dedicado `push` para no bloquear el loop ni
+            # competir por threads con la verificación de tokens.
+            await push_executor.run(messaging.send, msg)
             success_count += 1
         except Exception as e:
             failure_count += 1
@@ -0,0 +1,40 @@
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+from fastapi import HTTPException
+
+"""
+PAGINATION.PY
+-------------
+Cursores keyset (start_time, id) para listados ordenados por fecha.
+
+El cursor es opaco para el cliente (base64 de "<start_time ISO>|<id>") y apunta a la
+última fila entregada: la página siguiente empieza estrictamente después de ella.
+A diferencia de offset, no se saltea ni repite filas cuando se agregan o borran clases
+entre páginas, y el costo no crece con el número de página.
+
+El cursor de la página siguiente viaja en el header X-Next-Cursor (el body sigue siendo
+la lista de siempre); sin header no hay más páginas.
+"""
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+CursorKey = Tuple[datetime, str]
+
+
+def encode_cursor(start_time: datetime, row_id) -> str:
+    raw = f"{start_time.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[CursorKey]:
+    """(start_time, id) de la última fila vista; 400 si el cursor no es válido."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        start_iso, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(start_iso), str(UUID(row_id))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, detail="Cursor inválido")
@@ -0,0 +1,742 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from app.models import GymClass
+from app.versioning import GRID, bump_versions
+
+"""
+PARTITIONING.PY
+---------------
+Particionado por mes de gym_classes (RANGE sobre start_time) y archivo de meses viejos.
+
+Las clases se guardan para siempre y cada serie recurrente suma 12 filas, pero las
+queries calientes (grilla, semana, stream, reservas) filtran por start_time reciente o
+futuro. Con particiones mensuales gym_classes_pYYYYMM el planner descarta los meses
+fuera del rango: la grilla de la semana toca una o dos particiones chicas, sin importar
+cuántos años de historial haya.
+
+Estructura:
+- gym_classes: tabla particionada; PK (id, start_time) porque toda clave única debe
+  incluir la clave de partición. Los ids siguen siendo UUID únicos (uuid4).
+- gym_classes_default: partición DEFAULT. Una clase creada más allá de las particiones
+  existentes nunca falla; en el próximo mantenimiento sus filas se mueven a la partición
+  del mes correspondiente.
+- bookings: se archiva junto con su mes (ver abajo) pero queda como una sola tabla.
+  Particionarla exigiría sumar la fecha de la clase a uq_prevent_double_booking_user
+  (ON CONFLICT de booking.py) y a cada alta de reserva. Sus lecturas son por
+  gym_class_id/user_id indexados y el archivo la mantiene acotada. La FK a
+  gym_classes.id (ya no única por sí sola) la reemplaza un trigger con FOR KEY SHARE,
+  el mismo lock que toma una FK.
+
+Lookups por id: la PK es (id, start_time) y una query que llega solo con el id no
+puede descartar particiones (recorre el índice de cada una). Por eso gym_class_starts
+guarda (id, start_time) sin particionar, mantenida por trigger: pac_book_class y su
+precheck, pac_book_classes, pac_admin_book_class, las cancelaciones
+(bump_confirmed_counts), get_gym_class y trg_bookings_class_exists leen ahí el
+start_time y filtran por (id, start_time), que toca una sola partición. La tabla
+existe también sin particionar, así el código es el mismo en ambos modos. Medido con
+pgbench en PG 16.2 (1 vCPU) sobre una base de 6.9k clases y 53k reservas convertida a
+40 particiones (sin archivar):
+- SELECT de una clase por id: 0.06-0.08 ms podando (lookup + SELECT) vs 0.75-0.85 ms
+  solo con el id; 0.03 ms sin particionar.
+- Reserva completa (BEGIN; pac_book_class; ROLLBACK): 1.0-1.2 ms vs 0.65-0.8 ms sin
+  particionar (2.4-2.6 ms antes de podar).
+
+Conversión (CONVERT_GYM_CLASSES): opt-in. PARTITIONING_ENABLED=false por defecto y,
+aun activado, el arranque no convierte: hay que llamar a POST
+/maintenance/partitions/convert (convert_gym_classes) en una ventana sin tráfico.
+Reescribe la tabla bajo ACCESS EXCLUSIVE sobre gym_classes y bookings y no tiene vuelta
+atrás automática. Probada sobre una base del schema anterior con los datos de arriba:
+mismas filas y ninguna reserva huérfana.
+
+Mantenimiento (idempotente):
+- Al arrancar (si ya está particionada): las particiones hasta PARTITION_MONTHS_AHEAD
+  meses adelante, serializadas por el advisory lock del arranque.
+- Cada PARTITION_CHECK_HOURS (PartitionKeeper, en cada worker) o POST
+  /maintenance/partitions: crea las particiones que falten (misma transacción y lock
+  que el arranque) y después archiva los meses que terminaron hace más de
+  PARTITION_RETENTION_MONTHS (0 = no archivar). El archivo corre en un solo worker
+  (ARCHIVE_LOCK_KEY) y cada mes usa transacciones propias, en este orden:
+  1. Mueve las reservas de sus clases a PARTITION_ARCHIVE_SCHEMA.bookings_pYYYYMM, de a
+     PARTITION_ARCHIVE_BATCH por transacción. Solo bloquea esas filas de bookings.
+  2. DETACH de la partición, sola en su transacción y con
+     PARTITION_DETACH_LOCK_TIMEOUT_MS: el ACCESS EXCLUSIVE sobre gym_classes frena la
+     grilla y las reservas, y esperándolo encola al resto. Si no se obtiene, el mes
+     (con sus reservas ya archivadas) queda para la próxima corrida.
+  3. Pasa la tabla al schema de archivo (o suma sus filas a la del mes, si una clase
+     con fecha pasada volvió a crear la partición) y archiva las reservas creadas
+     entre 1 y 2.
+  Los datos quedan consultables en la DB, fuera de las tablas calientes. No se usa
+  DETACH ... CONCURRENTLY porque Postgres no lo permite con partición DEFAULT.
+
+Mover filas entre particiones no es un cambio de cupos: esos pasos setean
+pac.moving_partition y el trigger de live.py no notifica. Un UPDATE de start_time que
+cambia de mes mueve la fila de partición: los streams la ven como delete + insert.
+"""
+
+logger = logging.getLogger("uvicorn")
+
+PARTITIONING_ENABLED = os.getenv("PARTITIONING_ENABLED", "false").lower() == "true"
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PARTITION_RETENTION_MONTHS = int(os.getenv("PARTITION_RETENTION_MONTHS", "24"))
+PARTITION_ARCHIVE_SCHEMA = os.getenv("PARTITION_ARCHIVE_SCHEMA", "archive")
+PARTITION_CHECK_HOURS = float(os.getenv("PARTITION_CHECK_HOURS", "24"))
+# Reservas movidas al archivo por transacción
+PARTITION_ARCHIVE_BATCH = int(os.getenv("PARTITION_ARCHIVE_BATCH", "5000"))
+# Espera máxima del DETACH por el lock de gym_classes (mientras espera, encola al resto)
+PARTITION_DETACH_LOCK_TIMEOUT_MS = int(os.getenv("PARTITION_DETACH_LOCK_TIMEOUT_MS", "2000"))
+
+PARTITION_PREFIX = "gym_classes_p"
+# Advisory lock (de sesión) del archivo. La creación usa database.SCHEMA_LOCK_KEY
+ARCHIVE_LOCK_KEY = 727002
+
+# ----------- INICIO DE CADA CLASE POR ID -----------
+# Copia sin particionar de (id, start_time), mantenida por trigger. Los caminos que
+# llegan solo con el id leen acá el start_time y filtran gym_classes por (id,
+# start_time): el planner poda hasta una partición. Existe también sin particionar
+# (mismo código en ambos modos; el costo es un lookup por PK en una tabla angosta).
+CLASS_STARTS_TABLE = """
+DO $$
+BEGIN
+    IF to_regclass('gym_class_starts') IS NULL THEN
+        CREATE TABLE gym_class_starts (
+            id uuid PRIMARY KEY,
+            start_time timestamp NOT NULL
+        );
+        -- Las altas esperan al commit: el trigger (más abajo) toma las que sigan
+        LOCK TABLE gym_classes IN SHARE MODE;
+        INSERT INTO gym_class_starts SELECT id, start_time FROM gym_classes;
+    END IF;
+END
+$$
+"""
+
+# plpgsql y no sql: llamada desde otras funciones, el plan del SELECT queda cacheado
+CLASS_START_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_class_start(p_class_id uuid) RETURNS timestamp
+LANGUAGE plpgsql STABLE AS $$
+BEGIN
+    RETURN (SELECT start_time FROM gym_class_starts WHERE id = p_class_id);
+END;
+$$
+"""
+
+# Mover filas entre particiones (pac.moving_partition) no cambia start_time
+SYNC_CLASS_START_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_sync_class_start() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF current_setting('pac.moving_partition', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.id <> NEW.id) THEN
+        DELETE FROM gym_class_starts WHERE id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO gym_class_starts (id, start_time) VALUES (NEW.id, NEW.start_time)
+        ON CONFLICT (id) DO UPDATE SET start_time = EXCLUDED.start_time;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Por tgrelid: la conversión crea un gym_classes nuevo y este DDL se vuelve a aplicar
+SYNC_CLASS_START_TRIGGER = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger
+        WHERE tgrelid = 'gym_classes'::regclass AND tgname = 'trg_gym_classes_start'
+    ) THEN
+        CREATE TRIGGER trg_gym_classes_start
+        AFTER INSERT OR DELETE OR UPDATE OF id, start_time ON gym_classes
+        FOR EACH ROW EXECUTE FUNCTION pac_sync_class_start();
+    END IF;
+END
+$$
+"""
+
+# ----------- FUNCIONES PL/pgSQL -----------
+
+PARTITION_NAME_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION pac_class_partition_name(p_month date) RETURNS text
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT '{PARTITION_PREFIX}' || to_char(p_month, 'YYYYMM')
+$$
+"""
+
+# Crea la partición de un mes. Si la DEFAULT ya tiene filas de ese mes, se mueven a una
+# tabla nueva que luego se adjunta (CREATE ... PARTITION OF fallaría).
+# Mover es DELETE + INSERT: un UPDATE concurrente sobre esas clases (ocupar un cupo)
+# espera el lock de la fila y después no la encuentra. El LOCK de la DEFAULT frena
+# antes de empezar a quien todavía no la tocó, y pac_take_slot reintenta con un
+# snapshot nuevo a quien ya estaba esperando la fila.
+ENSURE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_ensure_class_partition(p_month date) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_name text := pac_class_partition_name(p_month);
+    v_from timestamp := date_trunc('month', p_month);
+    v_to timestamp := date_trunc('month', p_month) + interval '1 month';
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN false;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM gym_classes_default WHERE start_time >= v_from AND start_time < v_to
+    ) THEN
+        LOCK TABLE gym_classes_default IN SHARE ROW EXCLUSIVE MODE;
+        PERFORM set_config('pac.moving_partition', 'on', true);
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE gym_classes INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+            v_name
+        );
+        EXECUTE format(
+            'WITH moved AS (
+                 DELETE FROM gym_classes_default
+                 WHERE start_time >= $1 AND start_time < $2
+                 RETURNING *
+             )
+             INSERT INTO %I SELECT * FROM moved',
+            v_name
+        ) USING v_from, v_to;
+        EXECUTE format(
+            'ALTER TABLE gym_classes ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_from, v_to
+        );
+        PERFORM set_config('pac.moving_partition', 'off', true);
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF gym_classes FOR VALUES FROM (%L) TO (%L)',
+            v_name, v_from, v_to
+        );
+    END IF;
+    RETURN true;
+END
+$$
+"""
+
+# Meses [p_from, p_to] más los que tengan filas en la DEFAULT. 0 si no está particionada.
+ENSURE_PARTITIONS_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_ensure_class_partitions(p_from date, p_to date)
+RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_month date;
+    v_created integer := 0;
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'gym_classes'::regclass
+    ) THEN
+        RETURN 0;
+    END IF;
+
+    FOR v_month IN
+        SELECT generate_series(
+            date_trunc('month', p_from), date_trunc('month', p_to), interval '1 month'
+        )::date
+        UNION
+        SELECT DISTINCT date_trunc('month', start_time)::date FROM gym_classes_default
+        ORDER BY 1
+    LOOP
+        IF pac_ensure_class_partition(v_month) THEN
+            v_created := v_created + 1;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END
+$$
+"""
+
+# Archivar un mes son tres pasos, cada uno en su propia transacción (ver
+# _archive_month): mover las reservas por lotes, DETACH y guardar la tabla en el schema
+# de archivo. Ninguno mueve filas mientras se tiene el ACCESS EXCLUSIVE de gym_classes.
+
+# Tabla de clases del mes: la partición (o la tabla ya separada) del schema public o,
+# si ya se guardó, la del archivo. NULL si no hay ninguna.
+ARCHIVE_CLASSES_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_archive_class_table(p_month date, p_schema text)
+RETURNS regclass
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(
+        to_regclass(quote_ident(pac_class_partition_name(p_month))),
+        to_regclass(format('%I.%I', p_schema, pac_class_partition_name(p_month)))
+    )
+$$
+"""
+
+# Mueve hasta p_limit reservas de las clases del mes a p_schema.bookings_pYYYYMM
+# (NULL = todas). Solo toma locks de fila en bookings: no bloquea la grilla ni las
+# reservas de otras clases. Retorna las reservas movidas.
+ARCHIVE_BOOKINGS_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_archive_class_bookings(
+    p_month date, p_schema text, p_limit integer
+) RETURNS integer
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_classes regclass := pac_archive_class_table(p_month, p_schema);
+    v_bookings text := 'bookings_p' || to_char(p_month, 'YYYYMM');
+    v_moved integer;
+BEGIN
+    IF v_classes IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format('CREATE SCHEMA IF NOT EXISTS %I', p_schema);
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I.%I (LIKE bookings INCLUDING DEFAULTS)',
+        p_schema, v_bookings
+    );
+    EXECUTE format(
+        'WITH batch AS (
+             SELECT b.id FROM bookings b JOIN %s g ON g.id = b.gym_class_id
+             LIMIT $1
+         ), moved AS (
+             DELETE FROM bookings b USING batch WHERE b.id = batch.id
+             RETURNING b.*
+         )
+         INSERT INTO %I.%I SELECT * FROM moved',
+        v_classes, p_schema, v_bookings
+    ) USING p_limit;
+    GET DIAGNOSTICS v_moved = ROW_COUNT;
+    RETURN v_moved;
+END
+$$
+"""
+
+# DETACH de la partición del mes (false si no está adjunta). Toma ACCESS EXCLUSIVE
+# sobre gym_classes: el caller fija lock_timeout y no hace nada más en la transacción.
+DETACH_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_detach_class_partition(p_month date) RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_name text := pac_class_partition_name(p_month);
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_inherits
+        WHERE inhrelid = to_regclass(quote_ident(v_name))
+          AND inhparent = 'gym_classes'::regclass
+    ) THEN
+        RETURN false;
+    END IF;
+
+    EXECUTE format('ALTER TABLE gym_classes DETACH PARTITION %I', v_name);
+    RETURN true;
+END
+$$
+"""
+
+# Pasa la tabla ya separada al schema de archivo. Si el mes ya se había archivado (una
+# clase con fecha pasada volvió a crear la partición) sus filas se suman a la tabla
+# archivada. false si no hay tabla separada para ese mes.
+STORE_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_store_class_partition(p_month date, p_schema text)
+RETURNS boolean
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_name text := pac_class_partition_name(p_month);
+    v_table regclass := to_regclass(quote_ident(v_name));
+BEGIN
+    IF v_table IS NULL OR EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = v_table) THEN
+        RETURN false;
+    END IF;
+
+    EXECUTE format('CREATE SCHEMA IF NOT EXISTS %I', p_schema);
+    IF to_regclass(format('%I.%I', p_schema, v_name)) IS NULL THEN
+        EXECUTE format('ALTER TABLE %I SET SCHEMA %I', v_name, p_schema);
+    ELSE
+        EXECUTE format(
+            'INSERT INTO %I.%I SELECT * FROM %I', p_schema, v_name, v_name
+        );
+        EXECUTE format('DROP TABLE %I', v_name);
+    END IF;
+    -- DETACH no dispara triggers: las clases archivadas se sacan de gym_class_starts acá
+    EXECUTE format(
+        'DELETE FROM gym_class_starts s USING %I.%I g WHERE s.id = g.id', p_schema, v_name
+    );
+    RETURN true;
+END
+$$
+"""
+
+# Versión anterior (DETACH y traslado de reservas en una sola transacción)
+DROP_ARCHIVE_PARTITION_FUNCTION = (
+    "DROP FUNCTION IF EXISTS pac_archive_class_partition(date, text)"
+)
+
+# Reemplazo de la FK bookings.gym_class_id (ver docstring)
+BOOKING_CLASS_CHECK_FUNCTION = """
+CREATE OR REPLACE FUNCTION pac_check_booking_class() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_start timestamp := pac_class_start(NEW.gym_class_id);
+BEGIN
+    PERFORM 1 FROM gym_classes
+    WHERE id = NEW.gym_class_id AND start_time = v_start
+    FOR KEY SHARE;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'gym_class % no existe', NEW.gym_class_id
+            USING ERRCODE = 'foreign_key_violation';
+    END IF;
+    RETURN NEW;
+END
+$$
+"""
+
+# ----------- CONVERSIÓN ÚNICA -----------
+# Tabla existente (create_all o instalación previa) → particionada. No corre al arrancar:
+# la dispara convert_gym_classes (POST /maintenance/partitions/convert), que después
+# vuelve a aplicar schema.SCHEMA_DDL para crear índices y triggers sobre la tabla nueva.
+CONVERT_GYM_CLASSES = f"""
+DO $$
+DECLARE
+    fk record;
+    v_first date;
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'gym_classes'::regclass
+    ) THEN
+        RETURN;
+    END IF;
+
+    LOCK TABLE gym_classes, bookings IN ACCESS EXCLUSIVE MODE;
+
+    FOR fk IN
+        SELECT conname FROM pg_constraint
+        WHERE contype = 'f'
+          AND conrelid = 'bookings'::regclass
+          AND confrelid = 'gym_classes'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE bookings DROP CONSTRAINT %I', fk.conname);
+    END LOOP;
+
+    ALTER TABLE gym_classes RENAME TO gym_classes_unpartitioned;
+    CREATE TABLE gym_classes (
+        LIKE gym_classes_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS
+    ) PARTITION BY RANGE (start_time);
+    CREATE TABLE gym_classes_default PARTITION OF gym_classes DEFAULT;
+
+    v_first := coalesce(
+        (SELECT min(start_time) FROM gym_classes_unpartitioned), now()
+    )::date;
+    PERFORM pac_ensure_class_partitions(
+        v_first, (now() + interval '{PARTITION_MONTHS_AHEAD} months')::date
+    );
+    INSERT INTO gym_classes SELECT * FROM gym_classes_unpartitioned;
+    DROP TABLE gym_classes_unpartitioned;
+
+    ALTER TABLE gym_classes ADD CONSTRAINT gym_classes_pkey PRIMARY KEY (id, start_time);
+END
+$$
+"""
+
+BOOKING_CLASS_CHECK_TRIGGER = """
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'gym_classes'::regclass
+    ) AND NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'trg_bookings_class_exists'
+    ) THEN
+        CREATE TRIGGER trg_bookings_class_exists
+        BEFORE INSERT OR UPDATE OF gym_class_id ON bookings
+        FOR EACH ROW EXECUTE FUNCTION pac_check_booking_class();
+    END IF;
+END
+$$
+"""
+
+ENSURE_AHEAD = f"""
+SELECT pac_ensure_class_partitions(
+    current_date, (current_date + interval '{PARTITION_MONTHS_AHEAD} months')::date
+)
+"""
+
+PARTITION_DDL: List[str] = [
+    CLASS_STARTS_TABLE,
+    CLASS_START_FUNCTION,
+    SYNC_CLASS_START_FUNCTION,
+    SYNC_CLASS_START_TRIGGER,
+    PARTITION_NAME_FUNCTION,
+    ENSURE_PARTITION_FUNCTION,
+    ENSURE_PARTITIONS_FUNCTION,
+    ARCHIVE_CLASSES_FUNCTION,
+    ARCHIVE_BOOKINGS_FUNCTION,
+    DETACH_PARTITION_FUNCTION,
+    STORE_PARTITION_FUNCTION,
+    DROP_ARCHIVE_PARTITION_FUNCTION,
+    BOOKING_CLASS_CHECK_FUNCTION,
+    BOOKING_CLASS_CHECK_TRIGGER,
+    ENSURE_AHEAD,
+]
+
+
+# ----------- LOOKUPS POR ID -----------
+
+
+async def class_starts(session: AsyncSession, class_ids: Iterable[Any]) -> Dict[UUID, datetime]:
+    """start_time de cada clase (las inexistentes no aparecen), desde gym_class_starts."""
+    rows = await session.execute(
+        text("SELECT id, start_time FROM gym_class_starts WHERE id = ANY(:ids)"),
+        {"ids": [UUID(str(class_id)) for class_id in class_ids]},
+    )
+    return {UUID(str(row.id)): row.start_time for row in rows}
+
+
+async def get_gym_class(session: AsyncSession, class_id: Any) -> Optional[GymClass]:
+    """
+    session.get(GymClass, id) que poda particiones: lee start_time de gym_class_starts y
+    filtra por (id, start_time). Para los caminos calientes (cancelar una reserva).
+    """
+    starts = await class_starts(session, [class_id])
+    if not starts:
+        return None
+    ((class_uuid, start_time),) = starts.items()
+    return await session.scalar(
+        select(GymClass).where(GymClass.id == class_uuid, GymClass.start_time == start_time)
+    )
+
+
+# ----------- CONVERSIÓN -----------
+
+
+async def convert_gym_classes() -> Dict[str, Any]:
+    """
+    Convierte gym_classes en tabla particionada (una sola vez; sin vuelta atrás
+    automática). Reescribe la tabla bajo ACCESS EXCLUSIVE sobre gym_classes y bookings:
+    correrla en una ventana sin tráfico. Idempotente: si ya está particionada no hace nada.
+    """
+    from app.database import SCHEMA_LOCK_KEY, engine
+    from app.schema import SCHEMA_DDL  # schema importa este módulo
+
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY})")
+        if await is_partitioned(conn):
+            return {"converted": False, "partitions": await list_partitions(conn)}
+        await conn.exec_driver_sql(CONVERT_GYM_CLASSES)
+        # Índices, trigger de cupos y reemplazo de la FK sobre la tabla nueva
+        for statement in SCHEMA_DDL:
+            await conn.exec_driver_sql(statement)
+        partitions = await list_partitions(conn)
+
+    logger.info(f"[PARTITIONS] gym_classes convertida ({len(partitions)} particiones)")
+    return {"converted": True, "partitions": partitions}
+
+
+# ----------- MANTENIMIENTO -----------
+
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    return bool(
+        await conn.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+                "WHERE partrelid = 'gym_classes'::regclass)"
+            )
+        )
+    )
+
+
+async def list_partitions(conn: AsyncConnection) -> List[str]:
+    """Particiones mensuales adjuntas a gym_classes (sin la DEFAULT), ordenadas."""
+    rows = await conn.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'gym_classes'::regclass AND c.relname LIKE :pattern
+            ORDER BY c.relname
+            """
+        ),
+        {"pattern": f"{PARTITION_PREFIX}%"},
+    )
+    return list(rows.scalars().all())
+
+
+async def list_detached(conn: AsyncConnection) -> List[str]:
+    """Meses separados de gym_classes que siguen en public (falta pasarlos al archivo)."""
+    rows = await conn.execute(
+        text(
+            """
+            SELECT c.relname FROM pg_class c
+            WHERE c.relnamespace = 'public'::regnamespace AND c.relkind = 'r'
+              AND c.relname LIKE :pattern
+              AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+            ORDER BY c.relname
+            """
+        ),
+        {"pattern": f"{PARTITION_PREFIX}%"},
+    )
+    return list(rows.scalars().all())
+
+
+def partition_month(name: str) -> date:
+    suffix = name.removeprefix(PARTITION_PREFIX)
+    return date(int(suffix[:4]), int(suffix[4:6]), 1)
+
+
+async def _archive_month(conn: AsyncConnection, month: date) -> int:
+    """
+    Archiva un mes en transacciones cortas sobre `conn`. Retorna las reservas movidas.
+    1. Reservas por lotes de PARTITION_ARCHIVE_BATCH (locks de fila en bookings).
+    2. DETACH sola y con lock_timeout: el ACCESS EXCLUSIVE sobre gym_classes dura lo
+       que el cambio de catálogo. Si no lo obtiene, el mes queda para la próxima corrida.
+    3. Traslado de la tabla al schema de archivo y de las reservas creadas entre 1 y 2.
+    """
+    params = {"month": month, "schema": PARTITION_ARCHIVE_SCHEMA}
+    moved = 0
+    while True:
+        async with conn.begin():
+            batch = await conn.scalar(
+                text("SELECT pac_archive_class_bookings(:month, :schema, :limit)"),
+                {**params, "limit": PARTITION_ARCHIVE_BATCH},
+            )
+        moved += batch
+        if batch < PARTITION_ARCHIVE_BATCH:
+            break
+
+    async with conn.begin():
+        await conn.execute(
+            text("SELECT set_config('lock_timeout', :timeout, true)"),
+            {"timeout": f"{PARTITION_DETACH_LOCK_TIMEOUT_MS}ms"},
+        )
+        await conn.scalar(text("SELECT pac_detach_class_partition(:month)"), params)
+
+    async with conn.begin():
+        await conn.scalar(text("SELECT pac_store_class_partition(:month, :schema)"), params)
+        moved += await conn.scalar(
+            text("SELECT pac_archive_class_bookings(:month, :schema, NULL)"), params
+        )
+    return moved
+
+
+async def _archive_months(cutoff: date, report: Dict[str, Any]) -> None:
+    """Archiva, un mes a la vez, los meses que terminaron antes de `cutoff`."""
+    from app.database import engine
+
+    async with engine.connect() as conn:
+        # Lock de sesión: un solo worker archiva, los demás siguen de largo
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": ARCHIVE_LOCK_KEY}
+        )
+        if not locked:
+            await conn.rollback()
+            report["archive_skipped"] = True
+            return
+        try:
+            # Incluye meses que una corrida interrumpida dejó separados
+            names = sorted(set(await list_partitions(conn)) | set(await list_detached(conn)))
+            await conn.commit()
+            for name in names:
+                month = partition_month(name)
+                if _add_months(month, 1) > cutoff:
+                    continue
+                try:
+                    report["archived_bookings"] += await _archive_month(conn, month)
+                except Exception as e:
+                    error = str(getattr(e, "orig", e))
+                    logger.error(f"[PARTITIONS] Error archivando {name}: {error}")
+                    report["errors"].append({"partition": name, "error": error})
+                    continue
+                report["archived"].append(name)
+        finally:
+            await conn.rollback()
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": ARCHIVE_LOCK_KEY}
+            )
+            await conn.commit()
+
+
+async def maintain_partitions(
+    months_ahead: int = PARTITION_MONTHS_AHEAD,
+    retention_months: int = PARTITION_RETENTION_MONTHS,
+    today: Optional[date] = None,
+) -> Dict[str, Any]:
+    """
+    Crea las particiones de los próximos `months_ahead` meses (y las de filas que
+    cayeron en la DEFAULT) y archiva los meses que terminaron hace más de
+    `retention_months`.
+    La creación va en su propia transacción, serializada con el arranque de los
+    workers, y cada mes archivado en las suyas: un error al archivar un mes queda en
+    report["errors"] sin deshacer las particiones creadas ni los otros meses.
+    """
+    from app.database import SCHEMA_LOCK_KEY, engine  # database -> schema importa este módulo
+
+    today = today or date.today()
+    report: Dict[str, Any] = {
+        "partitioned": False,
+        "created": 0,
+        "archived": [],
+        "archived_bookings": 0,
+        "errors": [],
+    }
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK_KEY})")
+        if not await is_partitioned(conn):
+            return report
+        report["partitioned"] = True
+        report["created"] = await conn.scalar(
+            text("SELECT pac_ensure_class_partitions(:from_day, :to_day)"),
+            {"from_day": today, "to_day": _add_months(today, months_ahead)},
+        )
+
+    if retention_months > 0:
+        # Meses que terminaron antes del corte (el mes en curso nunca se archiva)
+        await _archive_months(_add_months(today.replace(day=1), -retention_months), report)
+
+    async with engine.connect() as conn:
+        report["partitions"] = await list_partitions(conn)
+
+    if report["archived"]:
+        await bump_versions({GRID})
+    logger.info(
+        f"[PARTITIONS] created={report['created']} archived={report['archived']} "
+        f"bookings={report['archived_bookings']} errors={len(report['errors'])}"
+    )
+    return report
+
+
+class PartitionKeeper:
+    """Corre maintain_partitions cada PARTITION_CHECK_HOURS (una instancia por worker)."""
+
+    def __init__(self, interval_hours: float):
+        self.interval = interval_hours * 3600
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.last_report = await maintain_partitions()
+            except Exception as e:
+                # La DEFAULT recibe las clases nuevas: el próximo intento las reubica
+                logger.error(f"[PARTITIONS] Mantenimiento fallido: {e}")
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+partition_keeper = PartitionKeeper(PARTITION_CHECK_HOURS)
@@ -0,0 +1,62 @@
+from typing import List
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+from app.booking import BOOKING_DDL
+from app.live import LIVE_DDL
+from app.models import Booking, FixedSchedule, GymClass, User
+from app.partitioning import PARTITION_DDL
+from app.versioning import VERSION_DDL
+
+"""
+SCHEMA.PY
+---------
+DDL que create_all no cubre: funciones PL/pgSQL, columnas/índices agregados a tablas
+existentes, etc. Cada sentencia DEBE ser idempotente (CREATE OR REPLACE, IF NOT EXISTS)
+porque se ejecuta en cada arranque, después de create_all (ver database.create_tables).
+"""
+
+# ----------- UPGRADES DE TABLAS EXISTENTES -----------
+# gym_classes.confirmed_count: se agrega y se inicializa desde bookings una sola vez.
+GYM_CLASSES_CONFIRMED_COUNT = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'gym_classes' AND column_name = 'confirmed_count'
+    ) THEN
+        ALTER TABLE gym_classes ADD COLUMN confirmed_count integer NOT NULL DEFAULT 0;
+        UPDATE gym_classes g
+        SET confirmed_count = c.n
+        FROM (
+            SELECT gym_class_id, count(*) AS n
+            FROM bookings WHERE status = 'CONFIRMED'
+            GROUP BY gym_class_id
+        ) c
+        WHERE g.id = c.gym_class_id;
+    END IF;
+END
+$$
+"""
+
+
+def _index_ddl(*models) -> List[str]:
+    """
+    CREATE INDEX IF NOT EXISTS de los índices declarados en los modelos.
+    create_all solo crea índices junto con su tabla; así llegan también a tablas existentes.
+    """
+    return [
+        str(CreateIndex(index, if_not_exists=True).compile(dialect=postgresql.dialect()))
+        for model in models
+        for index in sorted(model.__table__.indexes, key=lambda i: i.name)
+    ]
+
+
+SCHEMA_DDL: List[str] = [
+    GYM_CLASSES_CONFIRMED_COUNT,
+    # Antes de los índices y del trigger de cupos: la conversión recrea gym_classes
+    *PARTITION_DDL,
+    *_index_ddl(User, GymClass, Booking, FixedSchedule),
+    *BOOKING_DDL,
+    *VERSION_DDL,
+    *LIVE_DDL,
+]
@@ -0,0 +1,31 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse
+
+"""
+SERIALIZATION.PY
+----------------
+Camino rápido de serialización para listados grandes.
+
+Devolver una lista de modelos hace que FastAPI la valide de nuevo contra el
+response_model, la pase por jsonable_encoder y la codifique con json. En los listados
+calientes las filas salen de la DB (o del cache) ya armadas como dicts: se devuelven
+con FastJSONResponse, que las codifica con orjson sin re-validar.
+
+Mismo JSON que el camino estándar:
+- datetime naive → "YYYY-MM-DDTHH:MM:SS[.ffffff]"; UTC → sufijo "Z" (como pydantic).
+- UUID → string; Enum → su valor.
+- UTF-8 sin escapar (FastAPI también usa ensure_ascii=False).
+El response_model del endpoint se mantiene para la documentación OpenAPI.
+"""
+
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
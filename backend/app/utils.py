@@ -1,33 +1,230 @@
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import update, func, case, or_, and_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlmodel import select
-from app.models import Setting, Credit
+from app.models import Setting, Credit, CreditBalance
 from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
 from uuid import UUID
 
 
+# ----------- CRÉDITOS -----------
+# Reglas del saldo (comunes al ledger y a la proyección credit_balances):
+# - Créditos negativos (usos/deducciones) siempre restan.
+# - Créditos positivos suman solo si no han expirado.
+# - El resultado mínimo es 0 (el piso se aplica al leer, no se guarda).
+
+
+def ledger_balance_columns(now: datetime):
+    """
+    Expresiones SQL del saldo crudo y el próximo vencimiento sobre `credits`.
+    Mismas reglas que arriba, evaluadas en la base (SUM(CASE ...)) en vez de en Python.
+    """
+    counted = or_(Credit.amount < 0, Credit.expires_at.is_(None), Credit.expires_at > now)
+    balance = func.coalesce(func.sum(case((counted, Credit.amount), else_=0)), 0)
+    next_expiry = func.min(
+        case((and_(Credit.amount > 0, Credit.expires_at > now), Credit.expires_at))
+    )
+    return balance.label("balance"), next_expiry.label("next_expiry_at")
+
+
+# next_expiry_at de una fila recién creada sin calcular: siempre "vencida" → se recalcula
+STALE_BALANCE = datetime.min
+
+
+def _is_fresh(next_expiry_at: Optional[datetime], now: datetime) -> bool:
+    return next_expiry_at is None or next_expiry_at > now
+
+
+async def _lock_balance_rows(
+    session: AsyncSession, user_ids: Sequence[UUID]
+) -> Dict[UUID, Optional[datetime]]:
+    """
+    Garantiza que exista la fila de proyección (placeholder vencido si falta) y la bloquea
+    FOR UPDATE en orden de user_id. Así dos transacciones concurrentes nunca recalculan
+    "a ciegas" la misma fila: la segunda espera y ve el resultado de la primera.
+    Retorna next_expiry_at por usuario.
+    """
+    await session.execute(
+        pg_insert(CreditBalance)
+        .values(
+            [
+                {"user_id": uid, "balance": 0, "next_expiry_at": STALE_BALANCE}
+                for uid in user_ids
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=[CreditBalance.user_id])
+    )
+    rows = await session.execute(
+        select(CreditBalance.user_id, CreditBalance.next_expiry_at)
+        .where(CreditBalance.user_id.in_(user_ids))
+        .order_by(CreditBalance.user_id)
+        .with_for_update()
+    )
+    return {r.user_id: r.next_expiry_at for r in rows}
+
+
+async def compute_ledger_balances(
+    session: AsyncSession, user_ids: Sequence[UUID], now: Optional[datetime] = None
+) -> Dict[UUID, Tuple[int, Optional[datetime]]]:
+    """
+    Saldo crudo y próximo vencimiento calculados desde el ledger, para varios usuarios
+    en un único GROUP BY. Usuarios sin movimientos → (0, None).
+    """
+    now = now or datetime.now()
+    balance_col, next_expiry_col = ledger_balance_columns(now)
+    rows = await session.execute(
+        select(Credit.user_id, balance_col, next_expiry_col)
+        .where(Credit.user_id.in_(user_ids))
+        .group_by(Credit.user_id)
+    )
+    result = {uid: (0, None) for uid in user_ids}
+    for r in rows:
+        result[r.user_id] = (int(r.balance), r.next_expiry_at)
+    return result
+
+
+async def refresh_credit_balances(
+    session: AsyncSession, user_ids: Sequence[UUID], now: Optional[datetime] = None
+) -> Dict[UUID, int]:
+    """
+    Recalcula la proyección de varios usuarios desde el ledger (upsert por lote).
+    Bloquea las filas (ver _lock_balance_rows) antes de leer el ledger, así no se pisan
+    actualizaciones relativas de transacciones concurrentes.
+    Retorna el saldo crudo (sin piso) por usuario.
+    """
+    if not user_ids:
+        return {}
+    now = now or datetime.now()
+    user_ids = sorted(set(user_ids))
+    await _lock_balance_rows(session, user_ids)
+    ledger = await compute_ledger_balances(session, user_ids, now)
+
+    stmt = pg_insert(CreditBalance).values(
+        [
+            {
+                "user_id": uid,
+                "balance": balance,
+                "next_expiry_at": next_expiry,
+                "updated_at": now,
+            }
+            for uid, (balance, next_expiry) in ledger.items()
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CreditBalance.user_id],
+        set_={
+            "balance": stmt.excluded.balance,
+            "next_expiry_at": stmt.excluded.next_expiry_at,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    await session.execute(stmt)
+    return {uid: balance for uid, (balance, _) in ledger.items()}
+
+
+async def refresh_credit_balance(
+    session: AsyncSession, user_id: UUID, now: Optional[datetime] = None
+) -> int:
+    """Recalcula la proyección de un usuario desde el ledger. Retorna el saldo crudo."""
+    user_id = UUID(str(user_id))
+    balances = await refresh_credit_balances(session, [user_id], now)
+    return balances[user_id]
+
+
+async def _ensure_fresh_balance(session: AsyncSession, user_id: UUID, now: datetime) -> None:
+    """Garantiza que la fila de proyección exista y no tenga vencimientos pendientes."""
+    user_id = UUID(str(user_id))
+    locked = await _lock_balance_rows(session, [user_id])
+    if not _is_fresh(locked[user_id], now):
+        await refresh_credit_balance(session, user_id, now)
+
+
+async def add_credit(
+    session: AsyncSession,
+    user_id: UUID,
+    amount: int,
+    expires_at: Optional[datetime] = None,
+    created_at: Optional[datetime] = None,
+) -> Credit:
+    """
+    Único punto de alta de movimientos de crédito (cargas, usos y reembolsos).
+    Inserta en el ledger y actualiza credit_balances en la MISMA transacción;
+    el commit queda a cargo del caller.
+    """
+    now = datetime.now()
+    # Antes de agregar el crédito: si hay que reconstruir, el ledger aún no lo incluye
+    await _ensure_fresh_balance(session, user_id, now)
+
+    credit = Credit(amount=amount, user_id=user_id, expires_at=expires_at)
+    if created_at is not None:
+        credit.created_at = created_at
+    session.add(credit)
+
+    counts = amount < 0 or expires_at is None or expires_at > now
+    values = {
+        "balance": CreditBalance.balance + (amount if counts else 0),
+        "updated_at": now,
+    }
+    if amount > 0 and expires_at is not None and expires_at > now:
+        # LEAST ignora NULL en Postgres
+        values["next_expiry_at"] = func.least(CreditBalance.next_expiry_at, expires_at)
+
+    await session.execute(
+        update(CreditBalance).where(CreditBalance.user_id == user_id).values(**values)
+    )
+    return credit
+
+
 async def calculate_credit_balance(session: AsyncSession, user_id: UUID) -> int:
     """
     Calcula el saldo de créditos de un usuario.
     Función centralizada para evitar duplicación y garantizar consistencia.
 
-    Reglas:
-    - Créditos negativos (usos/deducciones) siempre restan.
-    - Créditos positivos suman solo si no han expirado.
-    - El resultado mínimo es 0.
+    Lee la proyección credit_balances (lookup por PK). Si la fila no existe o tiene
+    un vencimiento pendiente, la recalcula desde el ledger en la transacción actual
+    (se persiste si el caller hace commit).
     """
     now = datetime.now()
-    credits_result = await session.execute(
-        select(Credit).where(Credit.user_id == user_id)
-    )
-    balance = 0
-    for c in credits_result.scalars().all():
-        if c.amount < 0:
-            balance += c.amount
-        elif c.amount > 0 and (c.expires_at is None or c.expires_at > now):
-            balance += c.amount
+    row = (
+        await session.execute(
+            select(CreditBalance.balance, CreditBalance.next_expiry_at).where(
+                CreditBalance.user_id == user_id
+            )
+        )
+    ).first()
+    if row is not None and _is_fresh(row.next_expiry_at, now):
+        return max(row.balance, 0)
+
+    balance = await refresh_credit_balance(session, user_id, now)
     return max(balance, 0)
 
 
+async def get_credit_balances(
+    session: AsyncSession, user_ids: Sequence[UUID]
+) -> Dict[UUID, int]:
+    """
+    Versión por lote de calculate_credit_balance: un SELECT sobre la proyección y,
+    si hay filas faltantes o vencidas, un único GROUP BY sobre el ledger para todas.
+    """
+    if not user_ids:
+        return {}
+    now = datetime.now()
+    rows = await session.execute(
+        select(
+            CreditBalance.user_id, CreditBalance.balance, CreditBalance.next_expiry_at
+        ).where(CreditBalance.user_id.in_(user_ids))
+    )
+    balances = {
+        r.user_id: max(r.balance, 0) for r in rows if _is_fresh(r.next_expiry_at, now)
+    }
+    missing = [uid for uid in user_ids if uid not in balances]
+    if missing:
+        refreshed = await refresh_credit_balances(session, missing, now)
+        balances.update({uid: max(b, 0) for uid, b in refreshed.items()})
+    return balances
+
+
 async def get_setting_int(
     session: AsyncSession,
     key: str,
@@ -63,7 +260,7 @@ import os
 import smtplib
 from email.message import EmailMessage
 import logging
-import asyncio
+from app.executors import email_executor
 
 # Configuración de Email (Usar variables de entorno en producción)
 SMTP_USER = os.getenv("SMTP_USER", "your_email@gmail.com")  # Email real removido para versión pública del repositorio
@@ -89,5 +286,5 @@ def send_email_sync(subject: str, body: str, to_email: str):
 
 
 async def send_email_background(subject: str, body: str, to_email: str):
-    """Wrapper to run blocking SMTP call in a thread"""
-    await asyncio.to_thread(send_email_sync, subject, body, to_email)
+    """Wrapper to run blocking SMTP call in the dedicated email pool"""
+    await email_executor.run(send_email_sync, subject, body, to_email)
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from uuid import UUID
+from fastapi import Response
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import Announcement, Setting
+
+"""
+VERSIONING.PY
+-------------
+Contadores de versión por recurso y ETags débiles para GET condicionales.
+
+La app re-consulta /gym-classes, /announcements y /settings aunque casi nunca cambien.
+Cada recurso tiene una SEQUENCE de Postgres (compartida por todos los workers) que se
+incrementa después de cada commit que lo modifica. Los GET arman un ETag débil con la
+versión y, si coincide con If-None-Match, responden 304 sin ejecutar las queries ni
+serializar.
+
+Marcado de cambios (se aplica tras el commit, se descarta en rollback):
+- Automático vía ORM: Announcement / Setting en el flush.
+- La grilla se marca junto con su invalidación de caché (caching.mark_grid_dirty).
+- Explícito: mark_changed(session, RECURSO) para SQL directo.
+
+La grilla además se versiona por día (grid_day_versions): reservar, cancelar o
+reconciliar cupos solo mueve la versión de los días de esas clases (mark_grid_days),
+así el cache de los demás días sigue sirviendo en todos los workers. La versión
+global GRID queda para los cambios estructurales (clases editadas o canceladas vía
+ORM, meses archivados), que invalidan todos los días.
+
+El incremento va DESPUÉS del commit: quien lea la versión vieja con datos nuevos solo
+hace un fetch de más. Incrementar antes permitiría etiquetar datos viejos con la
+versión nueva y el cliente quedaría con 304 sobre datos desactualizados.
+VersionedSession.commit() espera el incremento antes de volver: la respuesta del
+endpoint sale con la versión ya movida y un GET inmediato no recibe 304 viejo.
+
+Las vistas que dependen de la hora (clases próximas, novedades vigentes) agregan al
+ETag un tramo de ETAG_TIME_BUCKET_SECONDS: lo que vence por tiempo se refresca a lo
+sumo con ese retraso.
+"""
+
+logger = logging.getLogger("uvicorn")
+
+ETAG_TIME_BUCKET_SECONDS = int(os.getenv("ETAG_TIME_BUCKET_SECONDS", "60"))
+
+GRID = "grid"
+ANNOUNCEMENTS = "announcements"
+SETTINGS = "settings"
+RESOURCES = (GRID, ANNOUNCEMENTS, SETTINGS)
+# Secuencia de la que salen las versiones por día (una sola para todos los días)
+GRID_DAY = "grid_day"
+
+_PENDING_KEY = "resource_versions_pending"
+_COMMITTED_KEY = "resource_versions_committed"
+_PENDING_DAYS_KEY = "grid_days_pending"
+_COMMITTED_DAYS_KEY = "grid_days_committed"
+# Reintentos del incremento antes de propagar el error al endpoint
+VERSION_BUMP_ATTEMPTS = 3
+
+
+def _sequence(resource: str) -> str:
+    return f"resource_version_{resource}"
+
+
+VERSION_DDL = [
+    *(f"CREATE SEQUENCE IF NOT EXISTS {_sequence(r)}" for r in (*RESOURCES, GRID_DAY)),
+    """
+    CREATE TABLE IF NOT EXISTS grid_day_versions (
+        day date PRIMARY KEY,
+        version bigint NOT NULL
+    )
+    """,
+]
+
+# Días de las clases (vía gym_class_starts, que poda particiones) + días explícitos.
+# Cada día toma un valor nuevo de la secuencia; greatest() mantiene la versión creciente
+# si dos incrementos del mismo día terminan en otro orden. ORDER BY: locks de fila
+# siempre en el mismo orden entre workers.
+BUMP_GRID_DAYS_SQL = text(
+    f"""
+    INSERT INTO grid_day_versions (day, version)
+    SELECT day, nextval('{_sequence(GRID_DAY)}')
+    FROM (
+        SELECT start_time::date AS day FROM gym_class_starts WHERE id = ANY(:class_ids)
+        UNION
+        SELECT unnest(CAST(:days AS date[]))
+    ) changed
+    ORDER BY day
+    ON CONFLICT (day) DO UPDATE
+    SET version = greatest(grid_day_versions.version, EXCLUDED.version)
+    """
+)
+
+
+# ----------- LECTURA / ETAG -----------
+
+
+async def get_version(session: AsyncSession, resource: str) -> int:
+    """
+    Versión actual (lectura no transaccional de la secuencia, sin locks).
+    Una secuencia recién creada informa last_value=1 sin haber sido usada y el primer
+    nextval también devuelve 1: hasta el primer incremento la versión es 0.
+    """
+    return await session.scalar(
+        text(
+            f"SELECT CASE WHEN is_called THEN last_value ELSE 0 END "
+            f"FROM {_sequence(resource)}"
+        )
+    )
+
+
+async def get_grid_versions(
+    session: AsyncSession, first_day: date, last_day: date
+) -> Tuple[int, Dict[date, int]]:
+    """
+    Versión global de la grilla y la de cada día de [first_day, last_day] que tuvo
+    cambios (los que no aparecen están en 0), en una sola query.
+    """
+    rows = await session.execute(
+        text(
+            f"""
+            SELECT NULL::date AS day, CASE WHEN is_called THEN last_value ELSE 0 END AS version
+            FROM {_sequence(GRID)}
+            UNION ALL
+            SELECT day, version FROM grid_day_versions
+            WHERE day BETWEEN :first_day AND :last_day
+            """
+        ),
+        {"first_day": first_day, "last_day": last_day},
+    )
+    grid_version = 0
+    day_versions: Dict[date, int] = {}
+    for row in rows:
+        if row.day is None:
+            grid_version = row.version
+        else:
+            day_versions[row.day] = row.version
+    return grid_version, day_versions
+
+
+def weak_etag(*parts: Any) -> str:
+    return 'W/"' + "-".join(str(p) for p in parts) + '"'
+
+
+def time_bucket() -> int:
+    return int(time.time() // max(ETAG_TIME_BUCKET_SECONDS, 1))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil (RFC 9110): ignora el prefijo W/; acepta lista y "*"."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == target
+        for candidate in if_none_match.split(",")
+    )
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+# ----------- MARCADO E INCREMENTO -----------
+
+
+def mark_changed(session, *resources: str) -> None:
+    """Marca recursos a versionar cuando la sesión haga commit (AsyncSession o Session)."""
+    session.info.setdefault(_PENDING_KEY, set()).update(resources)
+
+
+def mark_grid_days(session, class_id: Any = None, day: Optional[date] = None) -> None:
+    """Marca el día de una clase (o un día dado) a versionar cuando la sesión haga commit."""
+    pending = session.info.setdefault(_PENDING_DAYS_KEY, {"classes": set(), "days": set()})
+    if class_id is not None:
+        pending["classes"].add(UUID(str(class_id)))
+    if day is not None:
+        pending["days"].add(day)
+
+
+async def _bump(statement, params: Dict[str, Any], what: str) -> None:
+    """
+    Corre el incremento con una conexión propia (la de la sesión ya se liberó).
+    Reintenta VERSION_BUMP_ATTEMPTS veces y si no lo logra propaga el error: sin
+    incremento el cliente recibiría 304 sobre datos viejos hasta el próximo cambio.
+    """
+    from app.database import engine  # database -> schema -> ... importa este módulo
+
+    for attempt in range(1, VERSION_BUMP_ATTEMPTS + 1):
+        try:
+            async with engine.connect() as conn:
+                await conn.execute(statement, params)
+                await conn.commit()
+            return
+        except Exception as e:
+            logger.error(f"[VERSIONING] No se pudo incrementar {what} (intento {attempt}): {e}")
+            if attempt == VERSION_BUMP_ATTEMPTS:
+                raise
+            await asyncio.sleep(0.05 * attempt)
+
+
+async def bump_versions(resources: Set[str]) -> None:
+    columns = ", ".join(f"nextval('{_sequence(r)}')" for r in sorted(resources))
+    await _bump(text(f"SELECT {columns}"), {}, str(sorted(resources)))
+
+
+async def bump_grid_days(class_ids: Iterable[UUID], days: Iterable[date]) -> None:
+    await _bump(
+        BUMP_GRID_DAYS_SQL,
+        {"class_ids": list(class_ids), "days": sorted(days)},
+        "días de la grilla",
+    )
+
+
+class VersionedSession(AsyncSession):
+    """
+    AsyncSession cuyo commit() incrementa, antes de volver, las versiones de los
+    recursos que la transacción modificó (ver database.async_session_factory).
+    """
+
+    async def commit(self) -> None:
+        await super().commit()
+        committed = self.info.pop(_COMMITTED_KEY, None)
+        days = self.info.pop(_COMMITTED_DAYS_KEY, None)
+        if committed:
+            await bump_versions(committed)
+        if days:
+            await bump_grid_days(days["classes"], days["days"])
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_resource_changes(session, flush_context, instances) -> None:
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Announcement):
+            mark_changed(session, ANNOUNCEMENTS)
+        elif isinstance(obj, Setting):
+            mark_changed(session, SETTINGS)
+
+
+@event.listens_for(Session, "after_commit")
+def _collect_after_commit(session) -> None:
+    # Sin await posible acá: VersionedSession.commit() hace el incremento
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.info.setdefault(_COMMITTED_KEY, set()).update(pending)
+    pending_days = session.info.pop(_PENDING_DAYS_KEY, None)
+    if pending_days:
+        committed = session.info.setdefault(_COMMITTED_DAYS_KEY, {"classes": set(), "days": set()})
+        committed["classes"] |= pending_days["classes"]
+        committed["days"] |= pending_days["days"]
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PENDING_DAYS_KEY, None)
@@ -0,0 +1,209 @@
+"""
+BOOKING_CONCURRENCY.PY
+----------------------
+Benchmark de estrategias de concurrencia de reservas (booking.BOOKING_CONCURRENCY).
+
+Simula N alumnos reservando a la vez la misma clase de M cupos, una vez por estrategia
+(pessimistic / optimistic), y reporta: throughput, latencia p50/p99, reintentos,
+intentos agotados y sobreventa (reservas confirmadas > cupos o contador desfasado).
+
+Uso (desde backend/, con DATABASE_URL apuntando a una base de PRUEBA):
+    python -m benchmarks.booking_concurrency --users 200 --slots 8 --rounds 3
+
+Crea sus propios usuarios/clase (prefijo "bench_") y los borra al terminar.
+
+Resultado de referencia (PostgreSQL 16.2, 1 vCPU, --users 200 --rounds 3, pool 20):
+
+    slots  strategy      req/s      p50 ms      p99 ms    retries  booked  exhausted
+    8      pessimistic   356-629    210-365     290-460   0        8       0
+    8      optimistic    351-483    283-401     408-560   62-80    8       0
+    200    pessimistic   93-121     993-1234    1570-1985 0        200     0
+    200    optimistic    83-96      1801-2058   2051-2386 654-679  113-119 81-87
+
+Sin sobreventa ni desfase del contador en ninguna ronda.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List
+from uuid import UUID, uuid4
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.booking import (
+    OPTIMISTIC,
+    PESSIMISTIC,
+    book_class_atomic,
+    booking_stats,
+    raise_for_booking_status,
+    run_booking_transaction,
+)
+from app.database import DATABASE_URL, create_tables
+from app.models import (
+    Booking,
+    BookingStatus,
+    Credit,
+    CreditBalance,
+    GymClass,
+    ProviderType,
+    User,
+)
+from app.utils import add_credit
+
+
+async def setup_round(factory, users: int, slots: int) -> Dict:
+    """Clase futura con `slots` cupos y `users` alumnos con 1 crédito cada uno."""
+    async with factory() as session:
+        gym_class = GymClass(
+            name="bench_class",
+            instructor="bench",
+            start_time=datetime.now() + timedelta(days=30),
+            max_slots=slots,
+        )
+        session.add(gym_class)
+        user_ids = []
+        for _ in range(users):
+            tag = uuid4().hex
+            user = User(
+                email=f"bench_{tag}@local.placeholder",
+                full_name="bench",
+                provider=ProviderType.LOCAL,
+                social_id=f"bench_{tag}",
+            )
+            session.add(user)
+            user_ids.append(user.id)
+        await session.flush()
+        for uid in user_ids:
+            await add_credit(session, uid, 1)
+        await session.commit()
+        return {"class_id": gym_class.id, "user_ids": user_ids}
+
+
+async def teardown_round(factory, fixture: Dict) -> None:
+    user_ids = fixture["user_ids"]
+    async with factory() as session:
+        await session.execute(delete(Booking).where(Booking.gym_class_id == fixture["class_id"]))
+        await session.execute(delete(Credit).where(Credit.user_id.in_(user_ids)))
+        await session.execute(delete(CreditBalance).where(CreditBalance.user_id.in_(user_ids)))
+        await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.execute(delete(GymClass).where(GymClass.id == fixture["class_id"]))
+        await session.commit()
+
+
+async def book_once(factory, strategy: str, user_id: UUID, class_id: UUID):
+    started = time.perf_counter()
+    outcome = "ok"
+    async with factory() as session:
+
+        async def work():
+            status = await book_class_atomic(session, user_id, str(class_id))
+            raise_for_booking_status(status)
+
+        try:
+            await run_booking_transaction(session, work, strategy=strategy)
+        except HTTPException as e:
+            outcome = "exhausted" if e.status_code == 503 else f"rejected:{e.detail}"
+        except Exception as e:  # Error inesperado: se reporta, no corta el benchmark
+            outcome = f"error:{type(e).__name__}"
+    return outcome, time.perf_counter() - started
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_round(factory, strategy: str, users: int, slots: int) -> Dict:
+    fixture = await setup_round(factory, users, slots)
+    retries_before = booking_stats.retries
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *[
+                book_once(factory, strategy, uid, fixture["class_id"])
+                for uid in fixture["user_ids"]
+            ]
+        )
+        elapsed = time.perf_counter() - started
+
+        async with factory() as session:
+            confirmed = await session.scalar(
+                select(func.count(Booking.id)).where(
+                    Booking.gym_class_id == fixture["class_id"],
+                    Booking.status == BookingStatus.CONFIRMED,
+                )
+            )
+            counter = await session.scalar(
+                select(GymClass.confirmed_count).where(GymClass.id == fixture["class_id"])
+            )
+    finally:
+        await teardown_round(factory, fixture)
+
+    latencies = [latency for _, latency in results]
+    outcomes = Counter(outcome for outcome, _ in results)
+    return {
+        "strategy": strategy,
+        "throughput_rps": len(results) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "retries": booking_stats.retries - retries_before,
+        "booked": outcomes.get("ok", 0),
+        "exhausted": outcomes.get("exhausted", 0),
+        "overbooked": max(0, confirmed - slots),
+        "counter_drift": counter - confirmed,
+        "outcomes": dict(outcomes),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=100, help="Reservas concurrentes")
+    parser.add_argument("--slots", type=int, default=8, help="Cupos de la clase")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--pool", type=int, default=20, help="Conexiones del pool")
+    parser.add_argument(
+        "--strategies", default=f"{PESSIMISTIC},{OPTIMISTIC}", help="Separadas por coma"
+    )
+    args = parser.parse_args()
+
+    await create_tables()
+    engine = create_async_engine(DATABASE_URL, pool_size=args.pool, max_overflow=0)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    header = (
+        f"{'strategy':<12} {'round':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'retries':>7} {'booked':>6} {'exhaust':>7} {'overbook':>8} {'drift':>5}"
+    )
+    print(f"users={args.users} slots={args.slots} pool={args.pool}")
+    print(header)
+    print("-" * len(header))
+    try:
+        for strategy in args.strategies.split(","):
+            for n in range(1, args.rounds + 1):
+                r = await run_round(factory, strategy.strip(), args.users, args.slots)
+                print(
+                    f"{r['strategy']:<12} {n:>5} {r['throughput_rps']:>8.1f} "
+                    f"{r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['retries']:>7} "
+                    f"{r['booked']:>6} {r['exhausted']:>7} {r['overbooked']:>8} "
+                    f"{r['counter_drift']:>5}"
+                )
+                unexpected = {
+                    k: v
+                    for k, v in r["outcomes"].items()
+                    if k not in ("ok", "exhausted") and "Clase llena" not in k
+                }
+                if unexpected:
+                    print(f"{'':<12} otros resultados: {unexpected}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""
+SERIALIZATION.PY
+----------------
+Benchmark del camino de serialización de los listados (ver app/serialization.py).
+
+Para cada listado (grilla, mis reservas, usuarios, novedades) monta dos endpoints en
+una app FastAPI de prueba con las mismas N filas sintéticas:
+- before: como antes (modelos pydantic/SQLModel + response_model o model_dump()).
+- after:  dicts armados desde columnas + FastJSONResponse (orjson, sin re-validar).
+
+Los invoca en proceso (httpx + ASGITransport, sin red ni DB), reporta CPU por request
+(time.process_time) y verifica que ambos devuelvan exactamente el mismo JSON.
+
+Uso (desde backend/):
+    python -m benchmarks.serialization --rows 500 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.schemas import GymClassRead, MyBookingRead
+from app.models import Announcement, BookingStatus, ProviderType, User
+from app.serialization import FastJSONResponse
+
+
+def grid_rows(n: int) -> List[Dict]:
+    start = datetime(2026, 3, 2, 7, 0)
+    rows = []
+    for i in range(n):
+        confirmed = i % 9
+        rows.append(
+            {
+                "id": str(uuid.uuid4()),
+                "name": "Pilates Reformer",
+                "instructor": "Instructora Ñandú",
+                "start_time": start + timedelta(hours=i),
+                "max_slots": 8,
+                "duration_minutes": 60,
+                "recurrence_group": str(uuid.uuid4()) if i % 2 else None,
+                "confirmed_count": confirmed,
+                "available_slots": 8 - confirmed,
+                "is_full": 8 - confirmed <= 0,
+            }
+        )
+    return rows
+
+
+def booking_rows(n: int) -> List[Dict]:
+    rows = []
+    for i, row in enumerate(grid_rows(n)):
+        status = BookingStatus.CONFIRMED if i % 3 else BookingStatus.CANCELLED
+        rows.append(
+            {
+                **row,
+                "recurrence_group": None,
+                "my_status": status == BookingStatus.CONFIRMED,
+                "booking_id": str(uuid.uuid4()),
+                "status": status,
+                "cancelled_at": None if i % 3 else row["start_time"] - timedelta(days=1),
+                "can_cancel": bool(i % 3) and i % 2 == 0,
+            }
+        )
+    return rows
+
+
+def users(n: int) -> List[User]:
+    return [
+        User(
+            email=f"alumno{i}@example.com",
+            full_name=f"Alumno {i} Peña",
+            dni=str(30000000 + i),
+            phone="+54 9 11 5555 5555",
+            provider=ProviderType.GOOGLE,
+            social_id=f"uid-{i}",
+            medical_certificate_url=f"static/uploads/cert_{i}.jpg" if i % 2 else None,
+            fcm_token=f"token-{i}" if i % 3 else None,
+            created_at=datetime(2025, 1, 1) + timedelta(minutes=i),
+        )
+        for i in range(n)
+    ]
+
+
+def announcements(n: int) -> List[Announcement]:
+    return [
+        Announcement(
+            title=f"Novedad {i}",
+            content="Feriado: el estudio permanece cerrado. ¡Nos vemos el lunes!",
+            image_url=f"https://api.example.com/static/uploads/news_{i}.jpg",
+            created_at=datetime(2026, 1, 1) + timedelta(hours=i),
+            expires_at=datetime(2026, 12, 31) if i % 2 else None,
+        )
+        for i in range(n)
+    ]
+
+
+def build_app(n: int) -> FastAPI:
+    app = FastAPI()
+    grid = grid_rows(n)
+    bookings = booking_rows(n)
+    user_objs = users(n)
+    user_rows = [u.model_dump() for u in user_objs]
+    news_objs = announcements(n)
+    news_rows = [a.model_dump() for a in news_objs]
+
+    @app.get("/grid/before", response_model=List[GymClassRead])
+    async def grid_before():
+        return [GymClassRead(**r, my_status=i % 4 == 0) for i, r in enumerate(grid)]
+
+    @app.get("/grid/after", response_model=List[GymClassRead])
+    async def grid_after():
+        return FastJSONResponse(
+            [{**r, "my_status": i % 4 == 0} for i, r in enumerate(grid)]
+        )
+
+    @app.get("/my-bookings/before", response_model=List[MyBookingRead])
+    async def bookings_before():
+        return [MyBookingRead(**r) for r in bookings]
+
+    @app.get("/my-bookings/after", response_model=List[MyBookingRead])
+    async def bookings_after():
+        return FastJSONResponse([dict(r) for r in bookings])
+
+    @app.get("/users/before")
+    async def users_before():
+        return [{**u.model_dump(), "credits_available": 4} for u in user_objs]
+
+    @app.get("/users/after")
+    async def users_after():
+        return FastJSONResponse([{**u, "credits_available": 4} for u in user_rows])
+
+    @app.get("/announcements/before", response_model=List[Announcement])
+    async def news_before():
+        return news_objs
+
+    @app.get("/announcements/after", response_model=List[Announcement])
+    async def news_after():
+        return FastJSONResponse([dict(a) for a in news_rows])
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int) -> Dict:
+    await client.get(path)  # Calentamiento
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+    return {
+        "cpu_ms": (time.process_time() - cpu_started) / requests * 1000,
+        "wall_ms": (time.perf_counter() - wall_started) / requests * 1000,
+        "bytes": len(response.content),
+        "body": response.content,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    app = build_app(args.rows)
+    transport = httpx.ASGITransport(app=app)
+    header = (
+        f"{'listado':<15} {'antes ms':>9} {'después ms':>11} {'x':>5} "
+        f"{'bytes':>8} {'mismo JSON':>11}"
+    )
+    print(f"rows={args.rows} requests={args.requests} (CPU por request)")
+    print(header)
+    print("-" * len(header))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in ("grid", "my-bookings", "users", "announcements"):
+            before = await measure(client, f"/{name}/before", args.requests)
+            after = await measure(client, f"/{name}/after", args.requests)
+            same = json.loads(before["body"]) == json.loads(after["body"])
+            print(
+                f"{name:<15} {before['cpu_ms']:>9.2f} {after['cpu_ms']:>11.2f} "
+                f"{before['cpu_ms'] / after['cpu_ms']:>5.1f} {after['bytes']:>8} "
+                f"{'sí' if same else 'NO':>11}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
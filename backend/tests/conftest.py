@@ -0,0 +1,55 @@
+import asyncio
+import os
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+"""
+CONFTEST.PY
+-----------
+Fixtures comunes de los tests de integración.
+
+Los tests que usan `db_session` corren contra un PostgreSQL real definido en
+TEST_DATABASE_URL (p. ej. postgresql+asyncpg://postgres@127.0.0.1:5432/pac_test) y
+se saltean si no está configurado. Cada test corre en una transacción que se
+descarta al terminar: la base queda como estaba.
+"""
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+if TEST_DATABASE_URL:
+    # app.database lee DATABASE_URL al importarse
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+
+@pytest.fixture(scope="session")
+def database_url() -> str:
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL no definido")
+
+    from app.database import create_tables, dispose_engine
+
+    async def setup():
+        try:
+            await create_tables()
+        finally:
+            await dispose_engine()
+
+    asyncio.run(setup())
+    return TEST_DATABASE_URL
+
+
+@pytest_asyncio.fixture
+async def db_session(database_url):
+    # NullPool: cada test tiene su propio event loop, no se comparten conexiones
+    engine = create_async_engine(database_url, poolclass=NullPool)
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        session = AsyncSession(bind=conn, expire_on_commit=False)
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await engine.dispose()
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timedelta
+from app.models import User, GymClass, ProviderType
+from app.booking import book_class_atomic, full_class_status
+from app.utils import add_credit, refresh_credit_balance
+
+"""
+TEST_BOOKING.PY
+---------------
+Con la clase marcada llena en la cola de admisión, full_class_status debe devolver el
+mismo status que pac_book_class (cada alumno recibe su propio error, no "Clase llena").
+"""
+
+
+async def new_user(session, name: str, credits: int = 0) -> User:
+    user = User(email=f"{name}@test.local", provider=ProviderType.LOCAL)
+    session.add(user)
+    await session.flush()
+    if credits:
+        await add_credit(session, user.id, credits)
+        await session.flush()
+    else:
+        await refresh_credit_balance(session, user.id)  # Proyección con saldo 0
+    return user
+
+
+@pytest.mark.asyncio
+async def test_full_class_status_matches_book_class(db_session):
+    now = datetime.now()
+    gym_class = GymClass(instructor="Test", start_time=now + timedelta(days=1), max_slots=1)
+    db_session.add(gym_class)
+    await db_session.flush()
+    class_id = str(gym_class.id)
+
+    booked = await new_user(db_session, "booked", credits=2)
+    assert await book_class_atomic(db_session, booked.id, class_id, now) == "ok"
+
+    waiting = {
+        "already_booked": booked,
+        "no_credits": await new_user(db_session, "broke"),
+        "full": await new_user(db_session, "late", credits=2),
+    }
+    for expected, user in waiting.items():
+        assert await full_class_status(db_session, user.id, class_id, now) == expected
+        assert await book_class_atomic(db_session, user.id, class_id, now) == expected
+
+    assert await full_class_status(db_session, booked.id, "no-es-un-uuid", now) == "not_found"
@@ -0,0 +1,87 @@
+import random
+import pytest
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Tuple
+from sqlmodel import select
+from app.models import User, Credit, CreditBalance, ProviderType
+from app.utils import compute_ledger_balances, refresh_credit_balances
+
+"""
+TEST_CREDIT_BALANCES.PY
+-----------------------
+El saldo calculado en SQL (SUM(CASE ...) agrupado por usuario) debe coincidir con las
+reglas del ledger evaluadas en Python fila por fila (implementación anterior).
+"""
+
+
+def python_balance(credits: Iterable[Credit], now: datetime) -> Tuple[int, Optional[datetime]]:
+    """Referencia: saldo crudo (sin piso) y próximo vencimiento recorriendo el ledger."""
+    balance = 0
+    next_expiry = None
+    for c in credits:
+        if c.amount < 0:
+            balance += c.amount
+        elif c.amount > 0 and (c.expires_at is None or c.expires_at > now):
+            balance += c.amount
+            if c.expires_at is not None and (next_expiry is None or c.expires_at < next_expiry):
+                next_expiry = c.expires_at
+    return balance, next_expiry
+
+
+def random_credit(rng: random.Random, user: User, now: datetime) -> Credit:
+    amount = rng.choice([-2, -1, 0, 1, 1, 4, 8, 12])
+    expires_at = rng.choice(
+        [
+            None,
+            now,  # Vence justo ahora: ya no cuenta
+            now - timedelta(days=rng.randint(1, 60)),
+            now + timedelta(days=rng.randint(1, 60)),
+        ]
+    )
+    return Credit(user_id=user.id, amount=amount, expires_at=expires_at)
+
+
+async def seed_ledger(session, now: datetime, users: int = 25, seed: int = 7):
+    rng = random.Random(seed)
+    created = [
+        User(email=f"ledger{i}@test.local", provider=ProviderType.LOCAL) for i in range(users)
+    ]
+    session.add_all(created)
+    await session.flush()
+
+    ledger = {u.id: [] for u in created}
+    for user in created[1:]:  # El primero queda sin movimientos
+        for _ in range(rng.randint(1, 30)):
+            credit = random_credit(rng, user, now)
+            ledger[user.id].append(credit)
+            session.add(credit)
+    await session.flush()
+    return ledger
+
+
+@pytest.mark.asyncio
+async def test_compute_ledger_balances_matches_python(db_session):
+    now = datetime.now().replace(microsecond=0)
+    ledger = await seed_ledger(db_session, now)
+
+    computed = await compute_ledger_balances(db_session, list(ledger), now)
+
+    assert computed == {uid: python_balance(credits, now) for uid, credits in ledger.items()}
+
+
+@pytest.mark.asyncio
+async def test_refresh_credit_balances_matches_python(db_session):
+    now = datetime.now().replace(microsecond=0)
+    ledger = await seed_ledger(db_session, now, seed=11)
+
+    refreshed = await refresh_credit_balances(db_session, list(ledger), now)
+
+    rows = await db_session.execute(
+        select(CreditBalance.user_id, CreditBalance.balance, CreditBalance.next_expiry_at)
+        .where(CreditBalance.user_id.in_(list(ledger)))
+    )
+    stored = {r.user_id: (r.balance, r.next_expiry_at) for r in rows}
+    expected = {uid: python_balance(credits, now) for uid, credits in ledger.items()}
+
+    assert refreshed == {uid: balance for uid, (balance, _) in expected.items()}
+    assert stored == expected
@@ -0,0 +1,130 @@
+import pytest
+from datetime import datetime, time, timedelta
+from sqlalchemy import select
+from app.api.adminEP import HOLIDAYS_2026
+from app.booking import auto_book_fixed_schedules, refund_fixed_schedules
+from app.models import (
+    Booking,
+    BookingStatus,
+    Credit,
+    DayOfWeek,
+    FixedSchedule,
+    GymClass,
+    ProviderType,
+    User,
+)
+
+"""
+TEST_FIXED_SCHEDULES.PY
+-----------------------
+Abonos fijos en clases nuevas, como en POST /gym-classes: una serie de lunes que
+incluye un feriado y una clase de domingo (los extremos de isodow). Se reserva a los
+abonos del mismo día y horario sin pisar una reserva previa, el contador de cada clase
+suma lo reservado y el feriado reembolsa un crédito sin vencimiento por abono.
+"""
+
+SLOT = time(5, 43)  # Horario que no usa nadie más en la base de test
+HOLIDAY = datetime(2026, 11, 23, 5, 43)  # Lunes feriado
+
+
+async def new_user(session, name: str, *slots) -> User:
+    user = User(email=f"fixed-{name}@test.local", provider=ProviderType.LOCAL)
+    session.add(user)
+    await session.flush()
+    for day_of_week, start_time in slots:
+        session.add(FixedSchedule(user_id=user.id, day_of_week=day_of_week, start_time=start_time))
+    await session.flush()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_auto_book_and_holiday_refund(db_session):
+    assert HOLIDAY.strftime("%Y-%m-%d") in HOLIDAYS_2026
+    now = datetime.now()
+
+    manual = await new_user(db_session, "manual", (DayOfWeek.MONDAY, SLOT))
+    monday = await new_user(db_session, "monday", (DayOfWeek.MONDAY, SLOT))
+    sunday = await new_user(db_session, "sunday", (DayOfWeek.SUNDAY, SLOT))
+    others = [
+        await new_user(db_session, "tuesday", (DayOfWeek.TUESDAY, SLOT)),
+        await new_user(db_session, "late", (DayOfWeek.MONDAY, time(6, 43))),
+    ]
+    users = [manual, monday, sunday, *others]
+
+    # Serie de lunes (la tercera cae en feriado) y un domingo en el medio
+    mondays = [
+        GymClass(instructor="Test", start_time=HOLIDAY + timedelta(weeks=week))
+        for week in range(-2, 2)
+    ]
+    sunday_class = GymClass(instructor="Test", start_time=HOLIDAY - timedelta(days=8))
+    classes = [*mondays, sunday_class]
+    db_session.add_all(classes)
+    await db_session.flush()
+
+    # Reserva manual previa en el segundo lunes (ya contada en el cupo)
+    already_booked = mondays[1]
+    already_booked.confirmed_count = 1
+    db_session.add(Booking(user_id=manual.id, gym_class_id=already_booked.id))
+    await db_session.flush()
+
+    holiday_ids = [
+        c.id for c in classes if c.start_time.strftime("%Y-%m-%d") in HOLIDAYS_2026
+    ]
+    assert holiday_ids == [mondays[2].id]
+    bookable_ids = [c.id for c in classes if c.id not in holiday_ids]
+
+    auto_booked = await auto_book_fixed_schedules(db_session, bookable_ids, now)
+    refunded = await refund_fixed_schedules(db_session, holiday_ids, now)
+
+    assert auto_booked == {
+        mondays[0].id: 2,
+        mondays[1].id: 1,  # Solo "monday": la de "manual" ya existía
+        mondays[3].id: 2,
+        sunday_class.id: 1,
+    }
+
+    bookings = (
+        await db_session.execute(
+            select(Booking.user_id, Booking.gym_class_id, Booking.status).where(
+                Booking.user_id.in_([u.id for u in users])
+            )
+        )
+    ).all()
+    booked = {(row.user_id, row.gym_class_id) for row in bookings}
+    assert len(bookings) == len(booked)  # Sin duplicados
+    booked_mondays = (mondays[0], mondays[1], mondays[3])
+    assert booked == {
+        *((user.id, c.id) for user in (manual, monday) for c in booked_mondays),
+        (sunday.id, sunday_class.id),
+    }
+    assert all(row.status == BookingStatus.CONFIRMED for row in bookings)
+
+    counts = dict(
+        (
+            await db_session.execute(
+                select(GymClass.id, GymClass.confirmed_count).where(
+                    GymClass.id.in_([c.id for c in classes])
+                )
+            )
+        ).all()
+    )
+    assert counts == {
+        mondays[0].id: 2,
+        mondays[1].id: 2,
+        mondays[2].id: 0,
+        mondays[3].id: 2,
+        sunday_class.id: 1,
+    }
+
+    # Feriado: un crédito sin vencimiento para cada abono del lunes, ninguno al resto
+    assert refunded == 2
+    credits = (
+        await db_session.execute(
+            select(Credit.user_id, Credit.amount, Credit.expires_at).where(
+                Credit.user_id.in_([u.id for u in users])
+            )
+        )
+    ).all()
+    assert sorted((row.user_id, row.amount, row.expires_at) for row in credits) == sorted(
+        [(manual.id, 1, None), (monday.id, 1, None)]
+    )
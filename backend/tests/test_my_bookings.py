@@ -0,0 +1,65 @@
+import json
+import pytest
+from datetime import datetime, timedelta
+from app.models import Booking, BookingStatus, GymClass, ProviderType, User
+
+"""
+TEST_MY_BOOKINGS.PY
+-------------------
+GET /my-bookings/history: las secciones coinciden con el resumen y las páginas de
+"past" cubren todo lo que no es "upcoming", sin repetir ni saltear reservas.
+"""
+
+
+async def seed_bookings(session) -> User:
+    user = User(email="history@test.local", provider=ProviderType.LOCAL)
+    session.add(user)
+    await session.flush()
+
+    now = datetime.now()
+    # Futuras confirmadas y canceladas, pasadas confirmadas y canceladas
+    for days, status in [
+        (1, BookingStatus.CONFIRMED),
+        (2, BookingStatus.CANCELLED),
+        (3, BookingStatus.CONFIRMED),
+        *[(-d, BookingStatus.CONFIRMED) for d in range(1, 6)],
+        (-6, BookingStatus.CANCELLED),
+        (-7, BookingStatus.CANCELLED),
+    ]:
+        gym_class = GymClass(instructor="Test", start_time=now + timedelta(days=days))
+        session.add(gym_class)
+        await session.flush()
+        session.add(Booking(user_id=user.id, gym_class_id=gym_class.id, status=status))
+    await session.flush()
+    return user
+
+
+@pytest.mark.asyncio
+async def test_history_sections_match_summary(db_session):
+    from app.api.clientEP import get_my_bookings_history
+
+    user = await seed_bookings(db_session)
+
+    first = json.loads(
+        (await get_my_bookings_history(None, 3, user, db_session)).body
+    )
+    summary, upcoming = first["summary"], first["upcoming"]
+    assert summary == {"upcoming": 2, "attended": 5, "cancelled": 3}
+    assert len(upcoming) == summary["upcoming"]
+    assert all(row["status"] == BookingStatus.CONFIRMED for row in upcoming)
+
+    past, page = [], first
+    while True:
+        past += page["past"]
+        if not page["next_cursor"]:
+            break
+        page = json.loads(
+            (await get_my_bookings_history(page["next_cursor"], 3, user, db_session)).body
+        )
+        assert page["summary"] is None and page["upcoming"] is None
+
+    assert len(past) == summary["attended"] + summary["cancelled"]
+    assert len({row["booking_id"] for row in past + upcoming}) == 10
+    assert [row["start_time"] for row in past] == sorted(
+        (row["start_time"] for row in past), reverse=True
+    )
@@ -0,0 +1,96 @@
+import pytest
+from datetime import date, datetime
+from sqlalchemy import delete, select, text
+from app.models import Booking, GymClass, ProviderType, User
+
+"""
+TEST_PARTITIONING.PY
+--------------------
+Archivo de meses viejos: las reservas pasan al archivo antes del DETACH y un mes que
+una clase con fecha pasada volvió a crear se suma al ya archivado. maintain_partitions
+hace commits propios, así que el test usa un mes de 2001 y lo borra al terminar.
+"""
+
+MONTH = date(2001, 1, 1)
+NAME = "gym_classes_p200101"
+
+
+def retention_for(month: date) -> int:
+    # Corte = mes siguiente a `month`: solo ese mes (y anteriores) se archiva
+    today = date.today()
+    return (today.year - month.year) * 12 + today.month - month.month - 1
+
+
+async def add_class_with_bookings(session, day: int, users) -> GymClass:
+    gym_class = GymClass(instructor="Test", start_time=datetime(2001, 1, day, 10))
+    session.add(gym_class)
+    await session.flush()
+    for user in users:
+        session.add(Booking(user_id=user.id, gym_class_id=gym_class.id))
+    await session.commit()
+    return gym_class
+
+
+async def archived(session, query: str, class_ids) -> int:
+    return await session.scalar(text(query), {"ids": list(class_ids)})
+
+
+@pytest.mark.asyncio
+async def test_archive_moves_bookings_and_merges_backdated_month(database_url, monkeypatch):
+    from app import partitioning
+    from app.database import async_session_factory, dispose_engine
+
+    monkeypatch.setattr(partitioning, "PARTITION_ARCHIVE_BATCH", 2)  # Varios lotes
+    try:
+        if partitioning.PARTITIONING_ENABLED:
+            await partitioning.convert_gym_classes()  # Opt-in; no-op si ya está particionada
+        async with async_session_factory() as session:
+            if not await partitioning.is_partitioned(await session.connection()):
+                pytest.skip("gym_classes no está particionada")
+
+            users = [
+                User(email=f"archive{i}@test.local", provider=ProviderType.LOCAL)
+                for i in range(3)
+            ]
+            session.add_all(users)
+            await session.flush()
+            first = await add_class_with_bookings(session, 10, users)
+
+            report = await partitioning.maintain_partitions(
+                retention_months=retention_for(MONTH)
+            )
+            assert report["errors"] == []
+            assert report["archived"] == [NAME]
+            assert report["archived_bookings"] == 3
+            assert NAME not in report["partitions"]
+            assert await session.scalar(select(GymClass.id).where(GymClass.id == first.id)) is None
+            assert await partitioning.class_starts(session, [first.id]) == {}
+            assert not (
+                await session.scalars(select(Booking).where(Booking.gym_class_id == first.id))
+            ).all()
+
+            # Clase con fecha pasada: recrea la partición del mes ya archivado
+            second = await add_class_with_bookings(session, 20, users[:1])
+            report = await partitioning.maintain_partitions(
+                retention_months=retention_for(MONTH)
+            )
+            assert report["errors"] == []
+            assert report["archived"] == [NAME]
+            assert report["archived_bookings"] == 1
+
+            ids = [first.id, second.id]
+            assert await archived(
+                session, f"SELECT count(*) FROM archive.{NAME} WHERE id = ANY(:ids)", ids
+            ) == 2
+            assert await archived(
+                session,
+                "SELECT count(*) FROM archive.bookings_p200101 WHERE gym_class_id = ANY(:ids)",
+                ids,
+            ) == 4
+    finally:
+        async with async_session_factory() as session:
+            await session.execute(text(f"DROP TABLE IF EXISTS archive.{NAME}"))
+            await session.execute(text("DROP TABLE IF EXISTS archive.bookings_p200101"))
+            await session.execute(delete(User).where(User.email.like("archive%@test.local")))
+            await session.commit()
+        await dispose_engine()
@@ -0,0 +1,240 @@
+import json
+import pytest
+from typing import Any, Dict, Iterator, List, Set
+from sqlalchemy import text
+
+"""
+TEST_QUERY_PLANS.PY
+-------------------
+Regresión de planes de ejecución de las queries calientes contra un dataset sembrado.
+
+Siembra usuarios, clases (historial + semanas futuras) y reservas DENTRO de la
+transacción del test, corre ANALYZE y EXPLAIN (FORMAT JSON) de cada query y verifica
+que el plan use el índice esperado (y, con gym_classes particionada, que la grilla toque
+a lo sumo 2 particiones). La transacción se descarta: la base queda como estaba.
+
+Tamaño del dataset: PLAN_SEED_USERS / PLAN_SEED_CLASSES.
+"""
+
+PLAN_SEED_USERS = 5000
+PLAN_SEED_CLASSES = 2000
+
+
+# ----------- DATASET -----------
+
+SEED_USERS = """
+INSERT INTO users (id, email, full_name, provider, social_id, is_admin, disabled,
+                   is_trial, has_given_feedback, is_deleted, fcm_token, created_at)
+SELECT gen_random_uuid(), 'plan_' || g || '@local.placeholder', 'plan ' || g, 'LOCAL',
+       'plan_' || g, false, false, false, false,
+       random() < 0.3,
+       CASE WHEN random() < 0.2 THEN 'plan_token_' || g END,
+       now()
+FROM generate_series(1, :users) g
+"""
+
+# Abonos fijos: la mayoría ya cancelados (historial)
+SEED_FIXED_SCHEDULES = """
+INSERT INTO fixed_schedules (id, day_of_week, start_time, user_id, cancelled_at)
+SELECT gen_random_uuid(),
+       (ARRAY['MONDAY','TUESDAY','WEDNESDAY','THURSDAY','FRIDAY','SATURDAY'])
+           [1 + floor(random() * 6)::int]::dayofweek,
+       make_time(7 + floor(random() * 14)::int, 0, 0),
+       id,
+       CASE WHEN random() < 0.8 THEN now() END
+FROM users
+WHERE email LIKE 'plan\\_%'
+ON CONFLICT DO NOTHING
+"""
+
+# Clases repartidas entre ~2 años de historial y 12 semanas hacia adelante, ~10%
+# canceladas (sin canceladas el índice parcial de la grilla empata con el completo)
+SEED_CLASSES = """
+INSERT INTO gym_classes (id, name, instructor, start_time, max_slots, duration_minutes,
+                         confirmed_count, recurrence, created_at, cancelled_at)
+SELECT gen_random_uuid(), 'plan_class', 'plan',
+       date_trunc('hour', now()) - interval '730 days'
+           + (g * (interval '814 days' / :classes)),
+       8, 60, 0, false, now(),
+       CASE WHEN random() < 0.1 THEN now() END
+FROM generate_series(1, :classes) g
+"""
+
+# 8 alumnos al azar por clase, ~80% CONFIRMED
+SEED_BOOKINGS = """
+INSERT INTO bookings (id, status, assisted, created_at, user_id, gym_class_id)
+SELECT gen_random_uuid(),
+       (CASE WHEN random() < 0.8 THEN 'CONFIRMED' ELSE 'CANCELLED' END)::bookingstatus,
+       false, now(), u.id, c.id
+FROM gym_classes c
+CROSS JOIN LATERAL (
+    SELECT id FROM users
+    WHERE email LIKE 'plan\\_%' AND c.id IS NOT NULL
+    ORDER BY random() LIMIT 8
+) u
+WHERE c.name = 'plan_class'
+ON CONFLICT DO NOTHING
+"""
+
+# Con gym_classes particionada el historial sembrado cae en la DEFAULT: se reubica en
+# particiones mensuales como lo haría el mantenimiento (no-op si no está particionada)
+SEED_PARTITIONS = "SELECT pac_ensure_class_partitions(current_date, current_date + 90)"
+
+SEED_COUNTS = """
+UPDATE gym_classes g SET confirmed_count = c.n
+FROM (
+    SELECT gym_class_id, count(*) AS n FROM bookings
+    WHERE status = 'CONFIRMED' GROUP BY gym_class_id
+) c
+WHERE g.id = c.gym_class_id AND g.name = 'plan_class'
+"""
+
+PICK_PARAMS = """
+SELECT
+    (SELECT user_id FROM bookings b JOIN users u ON u.id = b.user_id
+     WHERE u.email LIKE 'plan\\_%' GROUP BY user_id ORDER BY count(*) DESC LIMIT 1),
+    (SELECT id FROM gym_classes WHERE name = 'plan_class' AND start_time > now()
+     ORDER BY start_time LIMIT 1),
+    (SELECT start_time FROM fixed_schedules f JOIN users u ON u.id = f.user_id
+     WHERE u.email LIKE 'plan\\_%' AND f.cancelled_at IS NULL
+       AND f.day_of_week = 'MONDAY' LIMIT 1)
+"""
+
+
+# ----------- QUERIES -----------
+# Copias en SQL de las queries de los endpoints (mismos filtros y orden).
+
+PLAN_CHECKS: List[Dict[str, Any]] = [
+    {
+        # clientEP._load_grid_rows: ventana de 14 días
+        "name": "GET /gym-classes (grilla)",
+        "sql": """
+            SELECT * FROM gym_classes
+            WHERE start_time >= current_date AND start_time < current_date + 14
+              AND cancelled_at IS NULL
+            ORDER BY start_time, id
+        """,
+        "index": "ix_gym_classes_active_start",
+        # Particionada: 14 días caen en a lo sumo 2 meses, sin importar el historial.
+        # Con la poda basta: un seq scan sobre la partición del mes es el plan correcto.
+        "max_partitions": 2,
+    },
+    {
+        # clientEP.get_gym_classes: overlay de reservas propias
+        "name": "GET /gym-classes (overlay del usuario)",
+        "sql": """
+            SELECT gym_class_id FROM bookings
+            WHERE user_id = CAST(:user_id AS uuid) AND status = 'CONFIRMED'
+              AND gym_class_id IN (
+                  SELECT id FROM gym_classes
+                  WHERE start_time >= now() AND cancelled_at IS NULL
+              )
+        """,
+        "index": "ix_bookings_user_confirmed",
+    },
+    {
+        # adminEP.get_gym_class_detail / cancelaciones de una clase
+        "name": "GET /gym-classes/{id} (alumnos confirmados)",
+        "sql": """
+            SELECT * FROM bookings
+            WHERE gym_class_id = CAST(:class_id AS uuid) AND status = 'CONFIRMED'
+        """,
+        "index": "ix_bookings_class_status",
+    },
+    {
+        # adminEP auto-reserva al crear una clase
+        "name": "POST /gym-classes (abonos del horario)",
+        "sql": """
+            SELECT f.* FROM fixed_schedules f JOIN users u ON u.id = f.user_id
+            WHERE f.cancelled_at IS NULL AND f.day_of_week = 'MONDAY'
+              AND f.start_time = CAST(:slot_time AS time) AND u.is_deleted = false
+        """,
+        "index": "ix_fixed_schedules_active_slot",
+    },
+    {
+        # adminEP.get_users sin búsqueda
+        "name": "GET /users (listado)",
+        "sql": """
+            SELECT * FROM users WHERE is_deleted = false
+            ORDER BY full_name LIMIT 20
+        """,
+        "index": "ix_users_active_full_name",
+    },
+    {
+        # notifications.py: limpieza de un token que FCM rechazó
+        "name": "push (token inválido)",
+        "sql": "UPDATE users SET fcm_token = NULL WHERE fcm_token = 'plan_token_1'",
+        "index": "ix_users_fcm_token",
+    },
+]
+
+
+def _plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def used_indexes(plan: Any) -> Set[str]:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return {
+        node["Index Name"] for node in _plan_nodes(plan[0]["Plan"]) if "Index Name" in node
+    }
+
+
+def scanned_partitions(plan: Any) -> Set[str]:
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return {
+        node["Relation Name"]
+        for node in _plan_nodes(plan[0]["Plan"])
+        if node.get("Relation Name", "").startswith("gym_classes_")
+    }
+
+
+# En una tabla particionada el plan nombra el índice de cada partición: se suma el
+# índice declarado en el padre del que deriva (vacío si la tabla no está particionada)
+PARENT_INDEXES = """
+SELECT c.relname FROM pg_partition_ancestors(CAST(:name AS regclass)) a
+JOIN pg_class c ON c.oid = a.relid
+"""
+
+
+async def explain(session, sql: str, params: Dict[str, Any]) -> Any:
+    used = {k: v for k, v in params.items() if f":{k}" in sql}
+    return (await session.execute(text("EXPLAIN (FORMAT JSON) " + sql), used)).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_hot_queries_use_their_indexes(db_session):
+    await db_session.execute(text(SEED_USERS), {"users": PLAN_SEED_USERS})
+    await db_session.execute(text(SEED_FIXED_SCHEDULES))
+    await db_session.execute(text(SEED_CLASSES), {"classes": PLAN_SEED_CLASSES})
+    await db_session.execute(text(SEED_PARTITIONS))
+    await db_session.execute(text(SEED_BOOKINGS))
+    await db_session.execute(text(SEED_COUNTS))
+    for table in ("users", "gym_classes", "bookings", "fixed_schedules"):
+        await db_session.execute(text(f"ANALYZE {table}"))
+
+    user_id, class_id, slot_time = (await db_session.execute(text(PICK_PARAMS))).one()
+    params = {"user_id": user_id, "class_id": class_id, "slot_time": slot_time}
+
+    failures = []
+    for check in PLAN_CHECKS:
+        plan = await explain(db_session, check["sql"], params)
+        indexes = used_indexes(plan)
+        for name in list(indexes):
+            rows = await db_session.execute(text(PARENT_INDEXES), {"name": name})
+            indexes.update(rows.scalars().all())
+        partitions = scanned_partitions(plan)
+        pruned = bool(partitions) and len(partitions) <= check.get("max_partitions", 0)
+
+        if check["index"] not in indexes and not pruned:
+            failures.append(
+                f"{check['name']}: esperado {check['index']}, usados {sorted(indexes) or '-'}"
+            )
+        if len(partitions) > check.get("max_partitions", len(partitions)):
+            failures.append(f"{check['name']}: particiones {sorted(partitions)}")
+
+    assert not failures, "\n".join(failures)
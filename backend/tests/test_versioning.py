@@ -0,0 +1,103 @@
+import pytest
+from datetime import date, datetime
+from sqlalchemy import text
+from app.caching import mark_grid_dirty
+from app.models import ProviderType, Setting, User
+from app.versioning import GRID, GRID_DAY, SETTINGS, get_grid_versions, get_version, _sequence
+
+"""
+TEST_VERSIONING.PY
+------------------
+Versiones de recursos (ETags): el primer cambio tiene que mover la versión y el
+commit no vuelve hasta que la versión se incrementó. Un cambio de cupos en un día de la
+grilla mueve solo la versión de ese día, y el ETag de un rango solo cambia con sus días.
+"""
+
+
+@pytest.mark.asyncio
+async def test_first_bump_changes_version(db_session):
+    # Secuencia nueva dentro de la transacción del test (se descarta con el rollback)
+    await db_session.execute(text(f"CREATE SEQUENCE {_sequence('test_fresh')}"))
+
+    assert await get_version(db_session, "test_fresh") == 0
+    await db_session.execute(text(f"SELECT nextval('{_sequence('test_fresh')}')"))
+    assert await get_version(db_session, "test_fresh") == 1
+
+
+@pytest.mark.asyncio
+async def test_commit_bumps_version_before_returning(database_url):
+    from app.database import async_session_factory, dispose_engine
+
+    try:
+        async with async_session_factory() as session:
+            before = await get_version(session, SETTINGS)
+            setting = Setting(key="test_versioning", value="1")
+            session.add(setting)
+            await session.commit()
+            assert await get_version(session, SETTINGS) > before
+
+            await session.delete(setting)
+            await session.commit()
+    finally:
+        await dispose_engine()
+
+
+@pytest.mark.asyncio
+async def test_grid_change_bumps_only_its_day(database_url):
+    from app.database import async_session_factory, dispose_engine
+
+    changed, untouched = date(2001, 2, 1), date(2001, 2, 2)
+    try:
+        async with async_session_factory() as session:
+            grid_before, days_before = await get_grid_versions(session, changed, untouched)
+            await session.commit()
+
+            mark_grid_dirty(session, start_time=datetime(2001, 2, 1, 10))  # Como una reserva
+            await session.execute(text("SELECT 1"))
+            await session.commit()
+
+            grid_after, days_after = await get_grid_versions(session, changed, untouched)
+            assert grid_after == grid_before
+            assert days_after[changed] > days_before.get(changed, 0)
+            assert days_after.get(untouched) == days_before.get(untouched)
+            assert await get_version(session, GRID) == grid_after
+    finally:
+        async with async_session_factory() as session:
+            await session.execute(
+                text("DELETE FROM grid_day_versions WHERE day IN ('2001-02-01', '2001-02-02')")
+            )
+            await session.commit()
+        await dispose_engine()
+
+
+@pytest.mark.asyncio
+async def test_week_etag_only_changes_with_its_days(db_session):
+    from app.api.clientEP import get_gym_classes_week
+
+    user = User(email="etag@test.local", provider=ProviderType.LOCAL)
+    db_session.add(user)
+    await db_session.flush()
+
+    async def bump(day: str) -> None:
+        # Lo que hace versioning.bump_grid_days, dentro de la transacción del test
+        await db_session.execute(
+            text(
+                f"INSERT INTO grid_day_versions (day, version) "
+                f"VALUES ('{day}', nextval('{_sequence(GRID_DAY)}')) "
+                f"ON CONFLICT (day) DO UPDATE SET version = EXCLUDED.version"
+            )
+        )
+
+    week = "2001-03-05"  # Lunes
+    await bump("2001-03-07")
+    first = await get_gym_classes_week(week, None, user, db_session)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    await bump("2001-03-14")  # Otra semana
+    assert (await get_gym_classes_week(week, etag, user, db_session)).status_code == 304
+
+    await bump("2001-03-11")  # Domingo de la semana pedida
+    changed = await get_gym_classes_week(week, etag, user, db_session)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
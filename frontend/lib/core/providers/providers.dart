@@ -3,7 +3,7 @@
 // Capa de estado global usando Riverpod.
 //
 // Contenido:
-// 1. Configuración HTTP (Dio + Interceptor de Auth Firebase).
+// 1. Configuración HTTP (Dio + Interceptor de Auth: token de sesión o Firebase).
 // 2. Repositorios (inyección de dependencias).
 // 3. Providers de datos (usuarios, clases, reservas).
 // 4. Controllers (acciones: reservar, crear novedades, etc).
@@ -33,6 +33,7 @@ import '../../models/settings.dart';
 import 'package:flutter/foundation.dart'; // Import kIsWeb
 import 'package:firebase_auth/firebase_auth.dart' hide User;
 import '../services/notification_service.dart';
+import '../services/session_token_store.dart';
 
 import '../../core/constants/app_constants.dart';
 
@@ -45,21 +46,47 @@ final dioProvider = Provider<Dio>((ref) {
     receiveTimeout: const Duration(seconds: 15),
   ));
 
-  // Interceptor para añadir el token de Firebase a cada petición
+  Future<void> setFirebaseToken(RequestOptions options) async {
+    final user = FirebaseAuth.instance.currentUser;
+    if (user == null) return;
+    try {
+      final token = await user.getIdToken();
+      options.headers['Authorization'] = 'Bearer $token';
+    } catch (e) {
+      // Si falla obtener el token, continuar sin él
+      debugPrint('AUTH_INTERCEPTOR: Error getting token: $e');
+    }
+  }
+
+  // Interceptor de auth: token de sesión propio si está vigente (validación local en
+  // el backend), si no el ID-Token de Firebase (ver session_token_store.dart)
   dio.interceptors.add(
     InterceptorsWrapper(
       onRequest: (options, handler) async {
-        final user = FirebaseAuth.instance.currentUser;
-        if (user != null) {
+        final sessionToken = await SessionTokenStore.validToken();
+        if (sessionToken != null) {
+          options.headers['Authorization'] = 'Bearer $sessionToken';
+          options.extra['session_token'] = true;
+        } else {
+          await setFirebaseToken(options);
+        }
+        return handler.next(options);
+      },
+      onError: (error, handler) async {
+        final options = error.requestOptions;
+        // Token de sesión rechazado (revocado/expirado): un reintento con Firebase
+        if (error.response?.statusCode == 401 &&
+            options.extra['session_token'] == true) {
+          SessionTokenStore.clear();
+          options.extra.remove('session_token');
+          await setFirebaseToken(options);
           try {
-            final token = await user.getIdToken();
-            options.headers['Authorization'] = 'Bearer $token';
-          } catch (e) {
-            // Si falla obtener el token, continuar sin él
-            debugPrint('AUTH_INTERCEPTOR: Error getting token: $e');
+            return handler.resolve(await dio.fetch(options));
+          } on DioException catch (e) {
+            return handler.next(e);
           }
         }
-        return handler.next(options);
+        return handler.next(error);
       },
     ),
   );
@@ -144,12 +171,92 @@ final gymClassesProvider = FutureProvider.family<List<GymClass>, String>((
   return repo.getClasses(date: date);
 });
 
-/// Mis reservas.
-final myBookingsProvider = FutureProvider<List<Booking>>((ref) async {
-  final repo = ref.watch(bookingRepositoryProvider);
-  return repo.getMyBookings();
+/// Mis reservas: próximas (primera página) + pasadas/canceladas PAGINADAS por cursor.
+class MyBookingsState {
+  final List<Booking> upcoming;
+  final List<Booking> past;
+  final String? nextCursor;
+  final bool isLoading;
+  final bool hasLoaded; // Ya llegó la primera página
+  final Object? error;
+
+  const MyBookingsState({
+    this.upcoming = const [],
+    this.past = const [],
+    this.nextCursor,
+    this.isLoading = false,
+    this.hasLoaded = false,
+    this.error,
+  });
+
+  bool get hasMore => nextCursor != null;
+
+  MyBookingsState copyWith({
+    List<Booking>? upcoming,
+    List<Booking>? past,
+    String? nextCursor,
+    bool clearCursor = false,
+    bool? isLoading,
+    bool? hasLoaded,
+    Object? error,
+  }) {
+    return MyBookingsState(
+      upcoming: upcoming ?? this.upcoming,
+      past: past ?? this.past,
+      nextCursor: clearCursor ? null : (nextCursor ?? this.nextCursor),
+      isLoading: isLoading ?? this.isLoading,
+      hasLoaded: hasLoaded ?? this.hasLoaded,
+      error: error,
+    );
+  }
+}
+
+final myBookingsProvider =
+    StateNotifierProvider<MyBookingsController, MyBookingsState>((ref) {
+  return MyBookingsController(ref);
 });
 
+class MyBookingsController extends StateNotifier<MyBookingsState> {
+  final Ref _ref;
+
+  MyBookingsController(this._ref) : super(const MyBookingsState()) {
+    refresh();
+  }
+
+  Future<void> refresh() async {
+    state = state.copyWith(isLoading: true);
+    try {
+      final repo = _ref.read(bookingRepositoryProvider);
+      final page = await repo.getMyBookingsHistory();
+      state = MyBookingsState(
+        upcoming: page.upcoming ?? const [],
+        past: page.past,
+        nextCursor: page.nextCursor,
+        hasLoaded: true,
+      );
+    } catch (e) {
+      state = state.copyWith(isLoading: false, error: e);
+    }
+  }
+
+  Future<void> loadMore() async {
+    if (!state.hasMore || state.isLoading) return;
+    state = state.copyWith(isLoading: true);
+    try {
+      final repo = _ref.read(bookingRepositoryProvider);
+      final page = await repo.getMyBookingsHistory(cursor: state.nextCursor);
+      state = state.copyWith(
+        past: [...state.past, ...page.past],
+        nextCursor: page.nextCursor,
+        clearCursor: page.nextCursor == null,
+        isLoading: false,
+      );
+    } catch (e) {
+      state = state.copyWith(isLoading: false);
+    }
+  }
+}
+
 /// Buscador de usuarios con PAGINACIÓN
 class UserSearchState {
   final List<User> users;
@@ -3,15 +3,16 @@
 // Abstracción para operaciones de reservas del usuario.
 //
 // Métodos:
-// - `getMyBookings()`: Historial de reservas.
+// - `getMyBookingsHistory(cursor)`: Mis Clases (próximas + pasadas paginadas).
 // - `cancelBooking(id)`: Cancela reserva y devuelve info de reembolso.
 //
 import 'package:dio/dio.dart';
 import '../../models/booking.dart';
 import '../../models/cancel_response.dart';
+import '../../models/my_bookings_page.dart';
 
 abstract class BookingRepository {
-  Future<List<Booking>> getMyBookings();
+  Future<MyBookingsPage> getMyBookingsHistory({String? cursor});
   Future<CancelResponse> cancelBooking(String bookingId);
 }
 
@@ -44,9 +45,17 @@ class MockBookingRepository implements BookingRepository {
   ];
 
   @override
-  Future<List<Booking>> getMyBookings() async {
+  Future<MyBookingsPage> getMyBookingsHistory({String? cursor}) async {
     await Future.delayed(const Duration(milliseconds: 600));
-    return [..._mockDb];
+    final now = DateTime.now();
+    bool isUpcoming(Booking b) =>
+        b.status == BookingStatus.confirmed && b.startTime.isAfter(now);
+    return MyBookingsPage(
+      upcoming: _mockDb.where(isUpcoming).toList()
+        ..sort((a, b) => a.startTime.compareTo(b.startTime)),
+      past: _mockDb.where((b) => !isUpcoming(b)).toList()
+        ..sort((a, b) => b.startTime.compareTo(a.startTime)),
+    );
   }
 
   @override
@@ -73,27 +82,36 @@ class HttpBookingRepository implements BookingRepository {
   final Dio _dio;
   HttpBookingRepository(this._dio);
 
+  Booking _parseBooking(dynamic e) {
+    return Booking(
+      bookingId: e['booking_id'].toString(),
+      classId: e['id'].toString(),
+      name: e['name'],
+      instructor: e['instructor'],
+      startTime: DateTime.parse(e['start_time']),
+      status: BookingStatus.values.firstWhere(
+        (s) => s.name == e['status'],
+        orElse: () => BookingStatus.none,
+      ),
+      cancelledAt:
+          e['cancelled_at'] != null ? DateTime.parse(e['cancelled_at']) : null,
+    );
+  }
+
   @override
-  Future<List<Booking>> getMyBookings() async {
+  Future<MyBookingsPage> getMyBookingsHistory({String? cursor}) async {
     try {
-      final response = await _dio.get('/my-bookings');
-      final list = response.data as List;
-      return list.map((e) {
-        return Booking(
-          bookingId: e['booking_id'].toString(),
-          classId: e['id'].toString(),
-          name: e['name'],
-          instructor: e['instructor'],
-          startTime: DateTime.parse(e['start_time']),
-          status: BookingStatus.values.firstWhere(
-            (s) => s.name == e['status'],
-            orElse: () => BookingStatus.none,
-          ),
-          cancelledAt: e['cancelled_at'] != null
-              ? DateTime.parse(e['cancelled_at'])
-              : null,
-        );
-      }).toList();
+      final response = await _dio.get(
+        '/my-bookings/history',
+        queryParameters: {if (cursor != null) 'cursor': cursor},
+      );
+      final data = response.data as Map<String, dynamic>;
+      final upcoming = data['upcoming'] as List?;
+      return MyBookingsPage(
+        upcoming: upcoming?.map(_parseBooking).toList(),
+        past: (data['past'] as List).map(_parseBooking).toList(),
+        nextCursor: data['next_cursor'] as String?,
+      );
     } catch (e) {
       throw Exception('Error fetching bookings: $e');
     }
@@ -4,6 +4,7 @@ import 'package:flutter/foundation.dart';
 import 'package:google_sign_in/google_sign_in.dart';
 import '../../models/user.dart';
 import 'auth_repository.dart';
+import '../services/session_token_store.dart';
 
 class FirebaseAuthRepository implements AuthRepository {
   final firebase.FirebaseAuth _auth = firebase.FirebaseAuth.instance;
@@ -29,6 +30,7 @@ class FirebaseAuthRepository implements AuthRepository {
       final idToken = await firebaseUser.getIdToken();
       final response =
           await _dio.post('/auth/login', data: {'id_token': idToken});
+      SessionTokenStore.save(Map<String, dynamic>.from(response.data as Map));
       return User.fromJson(response.data);
     } catch (e) {
       debugPrint(
@@ -118,6 +120,7 @@ class FirebaseAuthRepository implements AuthRepository {
       debugPrint("[AUTH] Error clearing FCM token: $e");
     }
 
+    SessionTokenStore.clear();
     await _googleSignIn.signOut();
     await _auth.signOut();
   }
@@ -138,6 +141,7 @@ class FirebaseAuthRepository implements AuthRepository {
     } catch (e) {
       debugPrint("AUTH_DEBUG: Error disconnecting Google: $e");
     }
+    SessionTokenStore.clear();
     await _auth.signOut();
   }
 
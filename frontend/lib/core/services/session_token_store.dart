@@ -0,0 +1,80 @@
+// SESSION_TOKEN_STORE.DART
+// ------------------------
+// Token de sesión propio del backend (ver backend/app/auth/session_tokens.py).
+//
+// /auth/login devuelve `session_token` + `session_expires_at` (UTC). Mientras esté
+// vigente, el interceptor HTTP lo usa en lugar del ID-Token de Firebase: el backend lo
+// valida localmente (HMAC) sin consultar a Firebase. Cerca del vencimiento se renueva
+// con /auth/refresh; si no hay token (servidor sin SESSION_SECRET), fue rechazado o no
+// se pudo renovar, se vuelve al ID-Token de Firebase.
+//
+import 'package:dio/dio.dart';
+import 'package:flutter/foundation.dart';
+
+import '../constants/app_constants.dart';
+
+class SessionTokenStore {
+  // Margen para renovar antes de que el backend lo considere vencido
+  static const _refreshMargin = Duration(minutes: 2);
+
+  static String? _token;
+  static DateTime? _expiresAt;
+  static Future<void>? _refreshing;
+
+  /// Guarda el token de una respuesta de /auth/login o /auth/refresh (si viene).
+  static void save(Map<String, dynamic> data) {
+    final token = data['session_token'] as String?;
+    final expires = data['session_expires_at'] as String?;
+    if (token == null || expires == null) {
+      clear();
+      return;
+    }
+    _token = token;
+    // El backend envía UTC sin sufijo: se parsea explícitamente como UTC
+    _expiresAt = DateTime.parse(expires.endsWith('Z') ? expires : '${expires}Z');
+  }
+
+  static void clear() {
+    _token = null;
+    _expiresAt = null;
+  }
+
+  /// Token vigente (renovándolo si está por vencer) o null para usar Firebase.
+  static Future<String?> validToken() async {
+    final expiresAt = _expiresAt;
+    if (_token == null || expiresAt == null) return null;
+
+    final now = DateTime.now().toUtc();
+    if (!now.isBefore(expiresAt)) {
+      clear();
+      return null;
+    }
+    if (now.isAfter(expiresAt.subtract(_refreshMargin))) {
+      // Una sola renovación aunque haya varias requests en paralelo
+      _refreshing ??= _refresh().whenComplete(() => _refreshing = null);
+      await _refreshing;
+    }
+    return _token;
+  }
+
+  static Future<void> _refresh() async {
+    final token = _token;
+    if (token == null) return;
+    try {
+      // Dio propio: sin el interceptor de auth (evita recursión)
+      final dio = Dio(BaseOptions(
+        baseUrl: AppConstants.apiBaseUrl,
+        connectTimeout: const Duration(seconds: 15),
+        receiveTimeout: const Duration(seconds: 15),
+      ));
+      final response = await dio.post(
+        '/auth/refresh',
+        options: Options(headers: {'Authorization': 'Bearer $token'}),
+      );
+      save(Map<String, dynamic>.from(response.data as Map));
+    } catch (e) {
+      debugPrint('SESSION_TOKEN: Refresh failed, falling back to Firebase: $e');
+      clear();
+    }
+  }
+}
@@ -498,7 +498,7 @@ class _HomeScreenState extends ConsumerState<HomeScreen> {
       final selectedDateStr = DateFormat('yyyy-MM-dd').format(_selectedDate);
       ref.invalidate(gymClassesProvider(selectedDateStr));
       ref.invalidate(userProfileProvider);
-      ref.invalidate(myBookingsProvider);
+      ref.read(myBookingsProvider.notifier).refresh();
 
       // FEEDBACK TRIGGER - Verificar con datos frescos
       Future.delayed(const Duration(seconds: 10), () async {
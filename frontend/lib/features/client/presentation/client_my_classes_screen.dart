@@ -56,7 +56,7 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
 
   @override
   Widget build(BuildContext context) {
-    final bookingsAsync = ref.watch(myBookingsProvider);
+    final bookingsState = ref.watch(myBookingsProvider);
     final screenWidth = MediaQuery.of(context).size.width;
 
     return Scaffold(
@@ -98,55 +98,7 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
           ),
         ),
       ),
-      body: bookingsAsync.when(
-        data: (bookings) {
-          if (bookings.isEmpty) {
-            return const EmptyState(
-              icon: Icons.event_available,
-              title: 'No tienes reservas',
-              subtitle: 'Reserva tu primera clase desde la pantalla principal',
-            );
-          }
-
-          final now = DateTime.now();
-
-          // Próximas: confirmadas y futuras, ordenadas ascendente (más próxima primero)
-          final upcoming = bookings
-              .where((b) =>
-                  b.status == BookingStatus.confirmed &&
-                  b.startTime.isAfter(now))
-              .toList()
-            ..sort((a, b) => a.startTime.compareTo(b.startTime));
-
-          // Pasadas y canceladas, ordenadas descendente (más reciente primero)
-          final pastAndCancelled = bookings
-              .where((b) =>
-                  b.startTime.isBefore(now) ||
-                  b.status == BookingStatus.cancelled)
-              .toList()
-            ..sort((a, b) => b.startTime.compareTo(a.startTime));
-
-          return RefreshIndicator(
-            onRefresh: () async {
-              ref.invalidate(myBookingsProvider);
-            },
-            child: TabBarView(
-              controller: _tabController,
-              children: [
-                // Tab 1: Próximas
-                _buildUpcomingTab(upcoming, screenWidth),
-                // Tab 2: Pasadas y Canceladas
-                _buildPastAndCancelledTab(pastAndCancelled, screenWidth),
-              ],
-            ),
-          );
-        },
-        loading: () => const LoadingIndicator(message: 'Cargando reservas...'),
-        error: (error, _) => ErrorView(
-          message: 'Error al cargar las reservas',
-          onRetry: () => ref.invalidate(myBookingsProvider),
-        ),
-      ),
+      body: _buildBody(bookingsState, screenWidth),
       bottomNavigationBar: Container(
         decoration: BoxDecoration(
           boxShadow: [
@@ -216,6 +168,42 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
     );
   }
 
+  Widget _buildBody(MyBookingsState bookingsState, double screenWidth) {
+    if (!bookingsState.hasLoaded) {
+      if (bookingsState.error != null) {
+        return ErrorView(
+          message: 'Error al cargar las reservas',
+          onRetry: () => ref.read(myBookingsProvider.notifier).refresh(),
+        );
+      }
+      return const LoadingIndicator(message: 'Cargando reservas...');
+    }
+
+    if (bookingsState.upcoming.isEmpty && bookingsState.past.isEmpty) {
+      return const EmptyState(
+        icon: Icons.event_available,
+        title: 'No tienes reservas',
+        subtitle: 'Reserva tu primera clase desde la pantalla principal',
+      );
+    }
+
+    // Secciones armadas por el backend (/my-bookings/history):
+    // Próximas = confirmadas y futuras (ascendente); Pasadas y canceladas = el resto
+    // (descendente, paginado por cursor al llegar al final de la lista)
+    return RefreshIndicator(
+      onRefresh: () => ref.read(myBookingsProvider.notifier).refresh(),
+      child: TabBarView(
+        controller: _tabController,
+        children: [
+          // Tab 1: Próximas
+          _buildUpcomingTab(bookingsState.upcoming, screenWidth),
+          // Tab 2: Pasadas y Canceladas
+          _buildPastAndCancelledTab(bookingsState, screenWidth),
+        ],
+      ),
+    );
+  }
+
   Widget _buildUpcomingTab(List<Booking> upcoming, double screenWidth) {
     if (upcoming.isEmpty) {
       return Center(
@@ -267,7 +255,8 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
   }
 
   Widget _buildPastAndCancelledTab(
-      List<Booking> pastAndCancelled, double screenWidth) {
+      MyBookingsState bookingsState, double screenWidth) {
+    final pastAndCancelled = bookingsState.past;
     if (pastAndCancelled.isEmpty) {
       return Center(
         child: Column(
@@ -290,19 +279,37 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
       );
     }
 
-    return Center(
-      child: ConstrainedBox(
-        constraints: const BoxConstraints(maxWidth: 800),
-        child: ListView.builder(
-          padding: const EdgeInsets.fromLTRB(20, 20, 20, 90),
-          itemCount: pastAndCancelled.length,
-          itemBuilder: (context, index) {
-            return _BookingCard(
-              booking: pastAndCancelled[index],
-              isPast: true,
-              screenWidth: screenWidth,
-            );
-          },
+    return NotificationListener<ScrollNotification>(
+      onNotification: (scrollInfo) {
+        if (!bookingsState.isLoading &&
+            bookingsState.hasMore &&
+            scrollInfo.metrics.pixels >=
+                scrollInfo.metrics.maxScrollExtent - 200) {
+          ref.read(myBookingsProvider.notifier).loadMore();
+        }
+        return false;
+      },
+      child: Center(
+        child: ConstrainedBox(
+          constraints: const BoxConstraints(maxWidth: 800),
+          child: ListView.builder(
+            padding: const EdgeInsets.fromLTRB(20, 20, 20, 90),
+            itemCount:
+                pastAndCancelled.length + (bookingsState.hasMore ? 1 : 0),
+            itemBuilder: (context, index) {
+              if (index == pastAndCancelled.length) {
+                return const Padding(
+                  padding: EdgeInsets.all(16.0),
+                  child: Center(child: CircularProgressIndicator()),
+                );
+              }
+              return _BookingCard(
+                booking: pastAndCancelled[index],
+                isPast: true,
+                screenWidth: screenWidth,
+              );
+            },
+          ),
         ),
       ),
     );
@@ -414,7 +421,7 @@ class _MyClassesScreenState extends ConsumerState<MyClassesScreen>
       );
 
       // Refrescar datos
-      ref.invalidate(myBookingsProvider);
+      ref.read(myBookingsProvider.notifier).refresh();
       ref.invalidate(userProfileProvider);
       ref.invalidate(gymClassesProvider);
 
@@ -0,0 +1,12 @@
+import 'booking.dart';
+
+/// Página de GET /my-bookings/history.
+/// `upcoming` solo viene en la primera página; `past` (pasadas y canceladas) se
+/// pagina con `nextCursor` (null = no hay más).
+class MyBookingsPage {
+  final List<Booking>? upcoming;
+  final List<Booking> past;
+  final String? nextCursor;
+
+  MyBookingsPage({this.upcoming, required this.past, this.nextCursor});
+}